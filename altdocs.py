@@ -1 +0,0 @@
-ALTER TABLE documents ADD COLUMN archived INTEGER DEFAULT 0;
@@ -1,33 +1,269 @@
-from flask import Flask, render_template, send_file
+from flask import (
+    Flask, Response, render_template, send_file, send_from_directory, request, jsonify,
+    make_response, stream_with_context, abort
+)
+import re
+import json
+import time
+import hashlib
 import sqlite3
 import os
+import mimetypes
 from dotenv import load_dotenv
+from utils.db import connect, migrate
+from utils.file_ops import generate_preview
+from utils.roots import get_root, root_file
+from utils.metrics import collect, render_prometheus
+from utils.vectors import related
+from utils.archive import find_archived, find_member, read_member
+from utils.export import FORMATS as EXPORT_FORMATS, MIMETYPES as EXPORT_MIMETYPES, export
 
 app = Flask(__name__)
-DB_PATH = "database.db"
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EVENTS_POLL_SECONDS = 0.5
+EVENTS_HEARTBEAT_SECONDS = 15
+MAX_RELATED = 50
 
-load_dotenv()  # ✅ ensure .env is loaded for WATCH_FOLDER
+load_dotenv()  # ✅ ensure .env is loaded for WATCH_ROOTS / WATCH_FOLDER
+migrate()
 
-@app.route("/open/<filename>")
-def open_file(filename):
-    path = os.path.join(os.getenv("WATCH_FOLDER"), filename)
-    return send_file(path, as_attachment=False)
+@app.route("/open/<root>/<path:filename>")
+def open_file(root, filename):
+    watch_root = get_root(root)
+    if watch_root is None:
+        abort(404)
+    # Archived since the link was made: serve it out of its pack instead
+    if not os.path.isfile(root_file(root, filename)):
+        doc_id = find_archived(root, filename)
+        if doc_id is not None:
+            return archived_file(doc_id)
+    # send_from_directory refuses paths that climb out of the root
+    return send_from_directory(watch_root.path, filename, as_attachment=False)
 
-def fetch_documents():
-    conn = sqlite3.connect(DB_PATH)
+@app.route("/archive/<int:doc_id>")
+@app.route("/archive/<int:doc_id>/<kind>")
+def archived_file(doc_id, kind="file"):
+    if kind not in ("file", "thumb"):
+        abort(404)
+    conn = connect()
+    row = conn.execute("SELECT filename FROM documents WHERE id = ? AND archived = 1", (doc_id,)).fetchone()
+    member = find_member(doc_id, kind, conn=conn)
+    conn.close()
+    if row is None or member is None:
+        abort(404)
+    pack, offset, length, size, codec = member
+    # 🧊 Seek to the member and inflate it block by block; the pack is never read whole
+    mimetype = "image/jpeg" if kind == "thumb" else mimetypes.guess_type(row[0])[0] or "application/octet-stream"
+    resp = Response(read_member(pack, offset, length, codec), mimetype=mimetype,
+                    headers={"Content-Length": str(size)})
+    resp.cache_control.max_age = 86400
+    return resp
+
+@app.route("/preview/<int:doc_id>")
+def preview(doc_id):
+    conn = connect()
+    row = conn.execute(
+        "SELECT root, filename, hash, preview_path, archived_at FROM documents WHERE id = ?", (doc_id,)
+    ).fetchone()
+    conn.close()
+    if row is None:
+        return Response(status=404)
+    root, filename, file_hash, preview_path, archived_at = row
+    if archived_at:
+        # 🧊 Packed away: the file and preview are off disk, the archived thumbnail is what's left
+        return archived_file(doc_id, "thumb")
+
+    # 🖼 Rendered on first view, then served from disk
+    if not (preview_path and os.path.exists(preview_path)):
+        path = root_file(root, filename)
+        preview_path = generate_preview(path, file_hash) if path else ""
+    if not preview_path:
+        return Response(status=404)
+    resp = send_file(os.path.abspath(preview_path), mimetype="image/jpeg")
+    resp.cache_control.max_age = 86400
+    return resp
+
+def _fts_query(text):
+    # Quote every word so user input can't break FTS5 syntax; trailing * = prefix match
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words)
+
+def _parse_cursor(cursor):
+    # Cursor is "<date_added>|<id>" of the last row on the previous page
+    if not cursor or "|" not in cursor:
+        return None
+    date_added, _, doc_id = cursor.rpartition("|")
+    return (date_added, int(doc_id)) if doc_id.isdigit() else None
+
+def fetch_documents(cursor=None, limit=PAGE_SIZE, query=None):
+    where = ["d.archived = 0"]
+    params = []
+    source = "documents d"
+
+    if query:
+        match = _fts_query(query)
+        if not match:
+            return [], None
+        source = "documents_fts f JOIN documents d ON d.id = f.rowid"
+        where.append("documents_fts MATCH ?")
+        params.append(match)
+
+    after = _parse_cursor(cursor)
+    if after:
+        where.append("(d.date_added, d.id) < (?, ?)")
+        params.extend(after)
+
+    conn = connect()
     conn.row_factory = sqlite3.Row
-    docs = conn.execute("SELECT * FROM documents WHERE archived = 0 ORDER BY date_added DESC").fetchall()
+    docs = conn.execute(f"""
+        SELECT d.* FROM {source}
+        WHERE {" AND ".join(where)}
+        ORDER BY d.date_added DESC, d.id DESC
+        LIMIT ?
+    """, (*params, limit + 1)).fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = f"{docs[-1]['date_added']}|{docs[-1]['id']}"
+    return docs, next_cursor
+
+def current_change_seq():
+    conn = connect()
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
     conn.close()
-    return docs
+    return seq
+
+def _not_modified(seq):
+    # The listing only changes when the change feed moves, so seq + query string is a strong ETag
+    etag = hashlib.sha1(f"{seq}?{request.query_string.decode()}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        return etag, Response(status=304, headers={"ETag": f'"{etag}"'})
+    return etag, None
+
+def _page_args():
+    limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    return request.args.get("cursor"), limit, request.args.get("q", "").strip()
 
 @app.route("/")
 def index():
-    conn = sqlite3.connect(DB_PATH)
+    seq = current_change_seq()
+    etag, cached = _not_modified(seq)
+    if cached:
+        return cached
+    cursor, limit, query = _page_args()
+    docs, next_cursor = fetch_documents(cursor, limit, query)
+    resp = make_response(render_template(
+        "index.html", documents=docs, next_cursor=next_cursor, query=query, change_seq=seq
+    ))
+    resp.set_etag(etag)
+    return resp
+
+@app.route("/api/documents")
+def api_documents():
+    seq = current_change_seq()
+    etag, cached = _not_modified(seq)
+    if cached:
+        return cached
+    cursor, limit, query = _page_args()
+    docs, next_cursor = fetch_documents(cursor, limit, query)
+    resp = jsonify(documents=[dict(d) for d in docs], next_cursor=next_cursor, change_seq=seq)
+    resp.set_etag(etag)
+    return resp
+
+@app.route("/export.<fmt>")
+def export_catalog(fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    try:
+        chunks = export(fmt, category=request.args.get("category") or None,
+                        since=request.args.get("since") or None, until=request.args.get("until") or None,
+                        archived=request.args.get("archived", "live"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    # 📦 Rows are read and encoded a batch at a time while the response is going out
+    name = f"catalog-{time.strftime('%Y%m%d')}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+def fetch_changes(since, limit=200):
+    conn = connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("""
+        SELECT c.seq, c.op, c.doc_id, c.filename, d.id AS live_id, d.archived
+        FROM changes c LEFT JOIN documents d ON d.id = c.doc_id
+        WHERE c.seq > ? ORDER BY c.seq LIMIT ?
+    """, (since, limit)).fetchall()
+    docs = {}
+    live_ids = [r["doc_id"] for r in rows if r["live_id"] is not None]
+    if live_ids:
+        marks = ",".join("?" * len(live_ids))
+        docs = {d["id"]: d for d in conn.execute(f"SELECT * FROM documents WHERE id IN ({marks})", live_ids)}
+    conn.close()
+    return rows, docs
+
+@app.route("/events")
+def events():
+    since = request.headers.get("Last-Event-ID", request.args.get("since", 0), type=int)
+
+    def stream(last_seq):
+        idle = 0.0
+        while True:
+            rows, docs = fetch_changes(last_seq)
+            for row in rows:
+                last_seq = row["seq"]
+                doc = docs.get(row["doc_id"])
+                # Rows that are gone or archived just drop out of the page
+                if doc is None or doc["archived"]:
+                    payload = {"op": "delete", "id": row["doc_id"], "filename": row["filename"]}
+                else:
+                    payload = {
+                        "op": row["op"], "id": doc["id"], "filename": doc["filename"],
+                        "html": render_template("_doc.html", doc=doc)
+                    }
+                yield f"id: {last_seq}\nevent: {payload['op']}\ndata: {json.dumps(payload)}\n\n"
+            if rows:
+                idle = 0.0
+                continue
+            time.sleep(EVENTS_POLL_SECONDS)
+            idle += EVENTS_POLL_SECONDS
+            if idle >= EVENTS_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+
+    return Response(
+        stream_with_context(stream(since)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/related/<int:doc_id>")
+def related_documents(doc_id):
+    k = min(max(request.args.get("k", 10, type=int), 1), MAX_RELATED)
+    conn = connect()
     conn.row_factory = sqlite3.Row
-    docs = conn.execute("SELECT * FROM documents WHERE archived = 0 ORDER BY date_added DESC").fetchall()
+    if conn.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone() is None:
+        conn.close()
+        abort(404)
+    hits = related([doc_id], k)[doc_id]
+    rows = {}
+    if hits:
+        marks = ",".join("?" * len(hits))
+        rows = {r["id"]: r for r in conn.execute(f"""
+            SELECT id, root, filename, common_name, keyword, category FROM documents WHERE id IN ({marks})
+        """, [row for row, _ in hits])}
     conn.close()
-    return render_template("index.html", documents=docs)
+    return jsonify(id=doc_id, related=[
+        dict(rows[row], score=round(score, 4)) for row, score in hits if row in rows
+    ])
+
+@app.route("/metrics")
+def metrics():
+    # Every watcher/pipeline process drops a snapshot in METRICS_DIR; add them up
+    return Response(render_prometheus(collect()), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    app.run(debug=True, port=5000, threaded=True)
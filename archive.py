@@ -0,0 +1,60 @@
+import argparse
+from dotenv import load_dotenv
+from utils.db import connect, migrate
+from utils.archive import ARCHIVE_DIR, archive_documents, candidates, restore_document
+
+load_dotenv()
+
+def _size(n):
+    return f"{n / 1024 ** 2:.1f} MB" if n >= 1024 ** 2 else f"{n / 1024:.1f} KB"
+
+def _ratio(bytes_in, bytes_out):
+    return f"{_size(bytes_in)} → {_size(bytes_out)} ({bytes_out / bytes_in:.0%})" if bytes_in else "0 KB"
+
+def stats():
+    conn = connect()
+    live = conn.execute("SELECT COUNT(*) FROM documents WHERE archived = 0").fetchone()[0]
+    unpacked = conn.execute("SELECT COUNT(*) FROM documents WHERE archived = 1 AND archived_at IS NULL").fetchone()[0]
+    packed, size, length, packs = conn.execute(
+        "SELECT COUNT(DISTINCT doc_id), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0), COUNT(DISTINCT pack) "
+        "FROM archive_members"
+    ).fetchone()
+    conn.close()
+    print(f"📄 Live: {live}")
+    print(f"🧊 Archived: {packed} in {packs} pack(s) under {ARCHIVE_DIR}, "
+          f"{_ratio(size, length)}")
+    if unpacked:
+        print(f"⚠️ {unpacked} flagged archived but still on disk (archive.py --flagged packs them)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Move documents into the compressed cold-tier archive")
+    parser.add_argument("--ids", nargs="+", type=int, help="Archive these document ids")
+    parser.add_argument("--older-than", type=float, metavar="DAYS", help="Archive documents added more than DAYS ago")
+    parser.add_argument("--flagged", action="store_true", help="Pack rows already marked archived but still on disk")
+    parser.add_argument("--limit", type=int, help="Archive at most this many documents")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would be archived")
+    parser.add_argument("--restore", nargs="+", type=int, metavar="ID", help="Put archived documents back in place")
+    parser.add_argument("--stats", action="store_true", help="Show live/archived counts and pack sizes")
+    args = parser.parse_args()
+    migrate()
+
+    if args.stats:
+        stats()
+    elif args.restore:
+        for doc_id in args.restore:
+            try:
+                print(f"📤 Restored {restore_document(doc_id)}")
+            except (ValueError, OSError) as e:
+                print(f"❌ Could not restore {doc_id}: {e}")
+    elif args.ids or args.older_than is not None or args.flagged:
+        rows = candidates(args.older_than, args.ids, args.flagged, args.limit)
+        count, bytes_in, bytes_out = archive_documents(rows, args.dry_run)
+        if args.dry_run:
+            print(f"🧊 Would archive {count} documents ({_size(bytes_in)})")
+        else:
+            print(f"✅ Archived {count} documents: {_ratio(bytes_in, bytes_out)}")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
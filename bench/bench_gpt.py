@@ -0,0 +1,70 @@
+# Offline GPT client throughput under rate limits.
+# Run from the repo root: python -m bench.bench_gpt --requests 200 --rpm 600 --rate-429 0.05
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from bench.fake_llm_server import FakeLLMServer
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args, base_url):
+    from utils.gpt_client import AsyncGPTClient, HTTPTransport
+    client = AsyncGPTClient(
+        transport=HTTPTransport(base_url=base_url, api_key="fake"),
+        concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm,
+    )
+    latencies = []
+
+    async def one(i):
+        # Every dup_every-th request repeats an earlier one, to exercise coalescing
+        text = f"Invoice number {i % args.dup_every if args.dup_every else i} from Acme Utilities " * 20
+        start = time.perf_counter()
+        try:
+            await client.summarize(text)
+        except Exception:
+            return
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    return client.stats, latencies, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the async GPT client against a fake server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rate-429", type=float, default=0.05)
+    parser.add_argument("--dup-every", type=int, default=0, help="Reuse prompts modulo N (0 = all unique)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GPT_BACKOFF_BASE", "0.2")
+    server = FakeLLMServer(latency_ms=args.latency_ms, rate_429=args.rate_429, retry_after=0).start()
+    stats, latencies, elapsed = asyncio.run(run(args, server.base_url))
+    server.shutdown()
+
+    print(json.dumps({
+        "requests": args.requests,
+        "completed": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(statistics.mean(latencies) * 1000, 1),
+        } if latencies else None,
+        "client": stats,
+        "server": server.counters,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
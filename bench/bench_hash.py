@@ -0,0 +1,80 @@
+# Run from the repo root: python -m bench.bench_hash --size-mb 1024
+import os
+import sys
+import time
+import json
+import hashlib
+import shutil
+import argparse
+import tempfile
+import multiprocessing as mp
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def legacy_hash(filepath):
+    # The original hash_file: read the whole file into memory at once
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        buf = f.read()
+        hasher.update(buf)
+    return hasher.hexdigest()
+
+def _worker(mode, filepath, cache_db, out):
+    os.environ["CACHE_DB_PATH"] = cache_db
+    from utils.file_ops import hash_file, stream_hash
+
+    fn = {"legacy": legacy_hash, "streaming": stream_hash, "fingerprinted": hash_file}[mode]
+    if mode == "fingerprinted":
+        hash_file(filepath)  # warm the fingerprint table, like a previous sync would
+
+    start = time.perf_counter()
+    digest = fn(filepath)
+    elapsed = time.perf_counter() - start
+    out.put({"mode": mode, "digest": digest, "seconds": elapsed, "peak_rss_mb": peak_rss_mb()})
+
+def make_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare hash_file implementations")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--file", help="Hash an existing file instead of a generated one")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_hash_")
+    filepath = args.file or os.path.join(tmp, "sample.bin")
+    if not args.file:
+        print(f"🛠 Generating {args.size_mb} MB test file...")
+        make_file(filepath, args.size_mb)
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    cache_db = os.path.join(tmp, "cache.db")
+
+    # Each run gets a fresh interpreter so peak RSS isn't shared between modes
+    ctx = mp.get_context("spawn")
+    results = []
+    for mode in ("legacy", "streaming", "fingerprinted"):
+        out = ctx.Queue()
+        p = ctx.Process(target=_worker, args=(mode, filepath, cache_db, out))
+        p.start()
+        res = out.get()
+        p.join()
+        res["mb_per_s"] = round(size_mb / res["seconds"], 1) if res["seconds"] else None
+        res["seconds"] = round(res["seconds"], 4)
+        results.append(res)
+
+    digests = {r["digest"] for r in results}
+    print(json.dumps({"file_mb": round(size_mb, 1), "digests_match": len(digests) == 1, "results": results}, indent=2))
+    shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
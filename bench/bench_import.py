@@ -0,0 +1,78 @@
+# Cold-start benchmark: how long a fresh interpreter takes to import each entry point.
+# Run from the repo root: python -m bench.bench_import --repeat 5 --out imports.json
+# Compare two commits by diffing their JSON reports.
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ("handler", "watcher", "sync", "worker", "app")
+
+# The packages that made startup slow; reported so a regression names its culprit
+HEAVY = ("fitz", "pymupdf", "docx", "pptx", "bs4", "pdf2image", "pytesseract", "openai", "httpx", "PIL", "pandas")
+
+def import_once(module, env):
+    # -X importtime writes one line per module to stderr: "import time: self | cumulative | name"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=env["BENCH_WORKSPACE"], env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if us.isdigit():
+            cumulative[name] = int(us)
+    return cumulative
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of the entry points")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--modules", nargs="*", default=list(MODULES))
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    # Importing app migrates the DB and the rest read the watch-root settings, so give them a scratch workspace
+    workspace = tempfile.mkdtemp(prefix="bench_import_")
+    os.makedirs(os.path.join(workspace, "inbox"))
+    env = dict(os.environ,
+               BENCH_WORKSPACE=workspace,
+               PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               DB_PATH=os.path.join(workspace, "database.db"),
+               CACHE_DB_PATH=os.path.join(workspace, "cache.db"),
+               WATCH_FOLDER=os.path.join(workspace, "inbox"),
+               WATCH_ROOTS="",
+               METRICS_DIR=os.path.join(workspace, "metrics"),
+               JSON_LOG="")
+
+    report = {}
+    try:
+        import_once("app", env)             # first run migrates; keep it out of the numbers
+        for module in args.modules:
+            runs = [import_once(module, env) for _ in range(args.repeat)]
+            totals = [run[module] / 1000 for run in runs]
+            loaded = [name for name in HEAVY if name in runs[-1]]
+            report[module] = {
+                "median_ms": round(statistics.median(totals), 1),
+                "min_ms": round(min(totals), 1),
+                "max_ms": round(max(totals), 1),
+                "heavy_imported": {name: round(runs[-1][name] / 1000, 1) for name in loaded},
+            }
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# End-to-end ingestion benchmark: synthetic corpus → IngestPipeline → fake LLM → SQLite.
+# Run from the repo root: python -m bench.bench_ingest --per-type 20 --image-pdfs 5 --latency-ms 300 --out run.json
+# Compare two commits by diffing their JSON reports.
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import threading
+from bench.fake_llm_server import FakeLLMServer
+from bench.corpus import build_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize_ms(values):
+    if not values:
+        return None
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "mean": round(statistics.mean(values) * 1000, 2),
+        "max": round(max(values) * 1000, 2),
+        "total_s": round(sum(values), 3),
+    }
+
+def peak_rss_mb(children=False):
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def stage_corpus(source, dest):
+    # process_file renames what it ingests, so work on links, never the caller's files
+    os.makedirs(dest, exist_ok=True)
+    paths = []
+    for name in sorted(os.listdir(source)):
+        src = os.path.join(source, name)
+        if not os.path.isfile(src):
+            continue
+        dst = os.path.join(dest, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+        paths.append(dst)
+    return paths
+
+def timed(fn, bucket):
+    lock = threading.Lock()
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with lock:
+                bucket.append(elapsed)
+    return wrapper
+
+def run(args, workspace, files, base_url):
+    # Everything below reads its settings at import time, so configure first
+    os.environ.update({
+        "DB_PATH": os.path.join(workspace, "database.db"),
+        "CACHE_DB_PATH": os.path.join(workspace, "cache.db"),
+        "WATCH_FOLDER": os.path.dirname(files[0]),
+        "WATCH_ROOTS": "",
+        "GPT_TRANSPORT": "http",
+        "GPT_BASE_URL": base_url,
+        "OPENAI_API_KEY": "fake",
+        "GPT_BACKOFF_BASE": "0.2",
+        "GPT_RPM": str(args.rpm),
+    })
+    import handler
+    from utils.db import migrate
+    from utils.gpt_client import get_client
+    migrate()
+
+    timings = {"extract": [], "summarize": [], "finalize": [], "db_write": []}
+    handler.save_or_update_document = timed(handler.save_or_update_document, timings["db_write"])
+    handler.extract_stage = timed(handler.extract_stage, timings["extract"])
+    handler.summarize_stage = timed(handler.summarize_stage, timings["summarize"])
+    handler.finalize_stage = timed(handler.finalize_stage, timings["finalize"])
+
+    from pipeline import IngestPipeline     # picks up the wrapped stages
+    pipeline = IngestPipeline(cpu_workers=args.cpu_workers, gpt_workers=args.gpt_workers)
+
+    start = time.perf_counter()
+    pipeline.start()
+    for path in files:
+        pipeline.submit(path, source="bench", block=True)
+    pipeline.stop()
+    elapsed = time.perf_counter() - start
+
+    conn = sqlite3.connect(os.environ["DB_PATH"])
+    indexed = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    conn.close()
+    return timings, elapsed, indexed, dict(get_client().stats)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full ingestion pipeline offline")
+    parser.add_argument("--corpus", help="Existing corpus folder (default: generate one)")
+    parser.add_argument("--per-type", type=int, default=10)
+    parser.add_argument("--image-pdfs", type=int, default=3)
+    parser.add_argument("--log-gb", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=100_000)
+    parser.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--gpt-workers", type=int, default=16)
+    parser.add_argument("--out", help="Also write the JSON report here")
+    parser.add_argument("--keep", action="store_true", help="Keep the workspace for inspection")
+    args = parser.parse_args()
+
+    workspace = tempfile.mkdtemp(prefix="bench_ingest_")
+    source = args.corpus
+    corpus = None
+    if not source:
+        source = os.path.join(workspace, "corpus")
+        print(f"🛠 Generating corpus in {source}...", file=sys.stderr)
+        corpus = {k: len(v) for k, v in build_corpus(source, args.per_type, args.image_pdfs, args.log_gb).items()}
+    files = stage_corpus(source, os.path.join(workspace, "inbox"))
+    corpus_mb = sum(os.path.getsize(p) for p in files) / (1024 * 1024)
+
+    # Thumbnails land in ./static, so run inside the workspace
+    sys.path.insert(0, REPO_ROOT)
+    cwd = os.getcwd()
+    os.chdir(workspace)
+    server = FakeLLMServer(latency_ms=args.latency_ms, rate_429=args.rate_429, retry_after=0).start()
+    try:
+        timings, elapsed, indexed, client_stats = run(args, workspace, files, server.base_url)
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+
+    report = {
+        "files": len(files),
+        "corpus_mb": round(corpus_mb, 1),
+        "corpus": corpus,
+        "indexed": indexed,
+        "elapsed_s": round(elapsed, 2),
+        "files_per_s": round(len(files) / elapsed, 2) if elapsed else None,
+        "mb_per_s": round(corpus_mb / elapsed, 2) if elapsed else None,
+        "stages_ms": {name: summarize_ms(values) for name, values in timings.items()},
+        "peak_rss_mb": {
+            "main": peak_rss_mb(),
+            "largest_worker": peak_rss_mb(children=True),
+        },
+        "gpt_client": client_stats,
+        "llm_server": server.counters,
+        "settings": {
+            "latency_ms": args.latency_ms, "rate_429": args.rate_429,
+            "cpu_workers": args.cpu_workers, "gpt_workers": args.gpt_workers,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.keep:
+        print(f"📂 Workspace kept at {workspace}", file=sys.stderr)
+    else:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    # A run that lost files isn't a result worth comparing
+    if indexed != len(files):
+        print(f"❌ Only {indexed} of {len(files)} staged files were indexed", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Run from the repo root: python -m bench.bench_thumbnails --pdfs path/to/pdfs
+import os
+import json
+import time
+import glob
+import shutil
+import argparse
+import tempfile
+import statistics
+
+def make_pdfs(folder, count, pages):
+    import fitz
+    for i in range(count):
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Synthetic invoice {i} page {p + 1}", fontsize=20)
+            for line in range(40):
+                page.insert_text((72, 110 + line * 16), f"Line item {line}: widget x{line} ... ${line * 3}.99")
+        doc.save(os.path.join(folder, f"sample_{i:04d}.pdf"))
+        doc.close()
+
+def legacy_thumbnail(filepath, out_dir):
+    # The original pipeline: poppler at 300 dpi, then a 95% preview every time
+    from pdf2image import convert_from_path
+    filename = os.path.basename(filepath)
+    page = convert_from_path(filepath, dpi=300, first_page=1, last_page=1)[0]
+    small = page.copy()
+    small.thumbnail((200, 200))
+    small.save(os.path.join(out_dir, f"thumb_{filename}.jpg"), "JPEG", quality=85)
+    page.save(os.path.join(out_dir, f"preview_{filename}.jpg"), "JPEG", quality=95)
+
+def current_thumbnail(filepath, out_dir):
+    from utils import file_ops
+    file_ops.THUMB_DIR = out_dir
+    file_ops.generate_thumbnail(filepath, file_hash=os.path.basename(filepath))
+
+def run(label, fn, pdfs, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    timings = []
+    for path in pdfs:
+        start = time.perf_counter()
+        fn(path, out_dir)
+        timings.append(time.perf_counter() - start)
+    disk = sum(os.path.getsize(p) for p in glob.glob(os.path.join(out_dir, "*.jpg")))
+    return {
+        "impl": label,
+        "files": len(pdfs),
+        "total_s": round(sum(timings), 3),
+        "mean_ms": round(statistics.mean(timings) * 1000, 2),
+        "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1000, 2),
+        "jpeg_bytes_written": disk,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF thumbnail engines")
+    parser.add_argument("--pdfs", help="Folder of PDFs to use (default: generate a synthetic corpus)")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_thumbs_")
+    folder = args.pdfs
+    if not folder:
+        folder = os.path.join(tmp, "pdfs")
+        os.makedirs(folder)
+        make_pdfs(folder, args.count, args.pages)
+    pdfs = sorted(glob.glob(os.path.join(folder, "*.pdf")))
+
+    results = [
+        run("pdf2image_300dpi", legacy_thumbnail, pdfs, os.path.join(tmp, "legacy")),
+        run("pymupdf_direct", current_thumbnail, pdfs, os.path.join(tmp, "current")),
+    ]
+    results.append({"speedup": round(results[0]["total_s"] / max(results[1]["total_s"], 1e-9), 1)})
+    print(json.dumps(results, indent=2))
+    shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Synthetic corpus covering every extension the handler accepts.
+# Run from the repo root: python -m bench.corpus --out /tmp/corpus --per-type 20 --image-pdfs 5 --log-gb 2
+import os
+import json
+import random
+import argparse
+
+WORDS = (
+    "invoice receipt policy claim premium statement balance account payment due "
+    "patient clinic referral dosage lab result insurance coverage deductible lease "
+    "contract clause tenant landlord utility electric water meter usage travel "
+    "itinerary flight hotel booking refund tax return income deduction payroll "
+    "quarterly budget forecast vendor purchase order shipment warranty support ticket"
+).split()
+
+TEXT_TYPES = (".txt", ".md", ".log", ".json", ".xml", ".rtf", ".html", ".eml")
+
+def sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def paragraphs(rng, count, per=5):
+    return [" ".join(sentence(rng) for _ in range(per)) for _ in range(count)]
+
+def write_text(path, ext, rng, i):
+    # Each file gets its own seed-derived content, so nothing dedupes by accident
+    title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}"
+    body = paragraphs(rng, 8)
+    if ext in (".txt", ".log"):
+        text = "\n".join(body)
+    elif ext == ".md":
+        text = f"# {title}\n\n" + "\n\n".join(body)
+    elif ext == ".json":
+        text = json.dumps({"title": title, "sections": body}, indent=2)
+    elif ext == ".xml":
+        text = f"<doc><title>{title}</title>" + "".join(f"<p>{p}</p>" for p in body) + "</doc>"
+    elif ext == ".rtf":
+        text = "{\\rtf1\\ansi " + "\\par ".join(body) + "}"
+    elif ext == ".html":
+        text = f"<html><head><title>{title}</title></head><body>" + "".join(f"<p>{p}</p>" for p in body) + "</body></html>"
+    elif ext == ".eml":
+        text = (f"From: billing@example.com\nTo: you@example.com\nSubject: {title}\n"
+                f"Date: Mon, 1 Jan 2024 09:00:00 +0000\nContent-Type: text/plain; charset=utf-8\n\n" + "\n\n".join(body))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def write_pdf(path, rng, i, pages=3):
+    import fitz
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(72, 72, 540, 760), f"Document {i} page {p + 1}\n\n" + "\n\n".join(paragraphs(rng, 4)))
+    doc.save(path)
+    doc.close()
+
+def write_image_pdf(path, rng, i, pages=2):
+    # Scanned-style PDF: every page is a picture of text, no text layer, so OCR has to run
+    import io
+    import fitz
+    from PIL import Image, ImageDraw
+    doc = fitz.open()
+    for p in range(pages):
+        img = Image.new("L", (1275, 1650), color=255)      # letter at 150 dpi
+        draw = ImageDraw.Draw(img)
+        y = 100
+        for line in [f"Scanned document {i} page {p + 1}"] + [sentence(rng, 9) for _ in range(30)]:
+            draw.text((100, y), line, fill=0)
+            y += 45
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=buf.getvalue())
+    doc.save(path)
+    doc.close()
+
+def write_docx(path, rng, i):
+    from docx import Document
+    document = Document()
+    document.add_heading(f"Report {i}", level=1)
+    for p in paragraphs(rng, 8):
+        document.add_paragraph(p)
+    document.save(path)
+
+def write_pptx(path, rng, i, slides=4):
+    from pptx import Presentation
+    prs = Presentation()
+    for s in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Deck {i} slide {s + 1}"
+        slide.placeholders[1].text = "\n".join(sentence(rng) for _ in range(4))
+    prs.save(path)
+
+def write_big_log(path, size_bytes, rng):
+    # Built from a pre-made block so multi-GB files are disk-bound, not Python-bound
+    lines = [f"2024-01-01T00:00:{n % 60:02d}Z INFO worker-{n % 16} {sentence(rng, 10)}\n" for n in range(2000)]
+    block = "".join(lines).encode()
+    written = 0
+    with open(path, "wb") as f:
+        while written < size_bytes:
+            chunk = block[:size_bytes - written]
+            f.write(chunk)
+            written += len(chunk)
+
+def build_corpus(out, per_type=10, image_pdfs=3, log_gb=0.0, seed=1234):
+    os.makedirs(out, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = {}
+
+    def add(kind, path):
+        manifest.setdefault(kind, []).append(path)
+
+    for i in range(per_type):
+        for ext in TEXT_TYPES:
+            path = os.path.join(out, f"sample_{i:05d}{ext}")
+            write_text(path, ext, rng, i)
+            add(ext, path)
+        for ext, writer in ((".pdf", write_pdf), (".docx", write_docx), (".pptx", write_pptx)):
+            path = os.path.join(out, f"sample_{i:05d}{ext}")
+            writer(path, rng, i)
+            add(ext, path)
+    for i in range(image_pdfs):
+        path = os.path.join(out, f"scan_{i:05d}.pdf")
+        write_image_pdf(path, rng, i)
+        add("image_pdf", path)
+    if log_gb > 0:
+        path = os.path.join(out, "huge_00000.log")
+        write_big_log(path, int(log_gb * 1024 ** 3), rng)
+        add("huge_log", path)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ingestion corpus")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--per-type", type=int, default=10)
+    parser.add_argument("--image-pdfs", type=int, default=3)
+    parser.add_argument("--log-gb", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    manifest = build_corpus(args.out, args.per_type, args.image_pdfs, args.log_gb, args.seed)
+    print(json.dumps({kind: len(paths) for kind, paths in manifest.items()}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Stand-in for the chat-completions API so ingestion can be benchmarked offline.
+# Run from the repo root: python -m bench.fake_llm_server --port 8765 --latency-ms 800 --rate-429 0.1
+import re
+import json
+import zlib
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ["Finance", "Insurance", "Medical", "Utilities", "Legal", "Travel"]
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        server.count("requests")
+
+        if random.random() < server.rate_429:
+            server.count("rate_limited")
+            return self._send(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": str(server.retry_after)})
+
+        # Latency with a little jitter, like the real thing
+        time.sleep(max(0.0, random.gauss(server.latency, server.latency * 0.2)))
+
+        content = payload.get("messages", [{}])[-1].get("content", "")
+        words = re.findall(r"[A-Za-z]{4,}", content.split('"""')[1] if '"""' in content else content)
+        title = " ".join(w.capitalize() for w in words[:3]) or "Untitled"
+        # Titles repeat across the corpus, so tag the name with the prompt's checksum; no extension,
+        # so the pipeline keeps the file's own
+        result = {
+            "filename": f"{title.replace(' ', '_')}_{zlib.crc32(content.encode()):08x}",
+            "common_name": title,
+            "summary": f"Synthetic summary of {title}.",
+            "keyword": (words[0].lower() if words else "misc"),
+            "category": CATEGORIES[len(content) % len(CATEGORIES)],
+        }
+        prompt_tokens = len(content) // 4
+        self._send(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(result)}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 60,
+                      "total_tokens": prompt_tokens + 60},
+        })
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency_ms=500, rate_429=0.0, retry_after=1):
+        super().__init__(("127.0.0.1", port), FakeLLMHandler)
+        self.latency = latency_ms / 1000
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.counters = {"requests": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake chat-completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    server = FakeLLMServer(args.port, args.latency_ms, args.rate_429, args.retry_after)
+    print(f"🤖 Fake LLM listening on {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
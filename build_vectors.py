@@ -0,0 +1,43 @@
+import argparse
+from dotenv import load_dotenv
+from utils.db import connect, migrate
+from utils.vectors import VECTOR_PATH, store_vector, sync_vectors, term_counts
+
+load_dotenv()
+BUILD_BATCH = 500
+
+def build(only_missing=True, batch=BUILD_BATCH):
+    # Backfill from the search index's stored body, so nothing is re-extracted
+    migrate()
+    conn = connect()
+    after, built = 0, 0
+    while True:
+        rows = conn.execute("""
+            SELECT d.id, d.common_name, d.summary, d.keyword, f.body
+            FROM documents d JOIN documents_fts f ON f.rowid = d.id
+            WHERE d.id > ? AND NOT (? AND d.id IN (SELECT doc_id FROM vector_terms))
+            ORDER BY d.id LIMIT ?
+        """, (after, only_missing, batch)).fetchall()
+        if not rows:
+            break
+        after = rows[-1][0]
+        futures = []
+        for doc_id, common_name, summary, keyword, body in rows:
+            text = " ".join(part or "" for part in (common_name, summary, keyword, body))
+            futures.append(store_vector(doc_id, term_counts(text)))
+        for future in futures:
+            future.result()
+        built += len(futures)
+        print(f"🧭 Vectors up to id {after}: {built} written")
+    sync_vectors()
+    conn.close()
+    return built
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Build the related-documents vectors ({VECTOR_PATH})")
+    parser.add_argument("--all", action="store_true", help="Rewrite every vector, not just missing ones")
+    args = parser.parse_args()
+    print(f"✅ Wrote {build(only_missing=not args.all)} vectors")
+
+if __name__ == "__main__":
+    main()
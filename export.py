@@ -0,0 +1,51 @@
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+from utils.db import migrate
+from utils.export import ARCHIVED_STATES, EXPORT_BATCH_ROWS, FORMATS, export
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the document catalog to CSV, XLSX or Parquet")
+    parser.add_argument("out", help="File to write, or - for stdout")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the extension of OUT")
+    parser.add_argument("--category", help="Only this category")
+    parser.add_argument("--since", help="Added on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Added on or before this date (YYYY-MM-DD)")
+    parser.add_argument("--archived", choices=ARCHIVED_STATES, default="live")
+    parser.add_argument("--batch", type=int, default=EXPORT_BATCH_ROWS, help="Rows fetched per round trip")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"can't tell the format from {args.out!r}; pass --format")
+    migrate()
+    try:
+        chunks = export(fmt, category=args.category, since=args.since, until=args.until,
+                        archived=args.archived, batch=args.batch)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.out == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        return
+    # Written under a temp name so a failed export never leaves a half file behind
+    tmp = f"{args.out}.{os.getpid()}.tmp"
+    written = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(tmp, args.out)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    print(f"📦 Exported to {args.out} ({written / 1024 ** 2:.1f} MB)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,149 +1,443 @@
 import sys
 import os
-import sqlite3
 import time
 from datetime import datetime
+from functools import wraps
 from dotenv import load_dotenv
-from utils.extractors import extract_text_from_file
-from utils.gpt_client import summarize_with_gpt
-from utils.file_ops import generate_thumbnail, hash_file, rename_file
+from utils.gpt_client import summarize_with_gpt, SUMMARY_VERSION
+from utils.cache import get_cached_summary, store_summary, lookup_fingerprint
+from utils.document import ParsedDocument, TEXT_BUDGET
+from utils.file_ops import generate_thumbnail, thumbnail_paths, rename_file
+from utils.db import connect, get_writer
+from utils.roots import DEFAULT_ROOT, locate
+from utils.metrics import bind, inc, log_event, span, traced
+from utils.textstore import get_text, store_text
+from utils.neardup import signature, find_near_duplicate, put_signature
+from utils.vectors import term_counts, put_vector
+from utils.classifier import CLASSIFIER_VERSION, classify_locally
+from utils.formats import is_supported
 
-# Load environment and check watch folder
+# Migrations run from the entry points (app, watcher, worker, db_init), not on import
 load_dotenv()
-DB_PATH = "database.db"
-WATCH_FOLDER = os.getenv("WATCH_FOLDER")
 
-if not WATCH_FOLDER:
-    raise ValueError("❌ WATCH_FOLDER is not set in .env")
+def _stage(name):
+    # Times the stage and tags everything logged inside it with the file being processed
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(job, *args):
+            with bind(path=job["path"]), span(name):
+                return fn(job, *args)
+        return wrapper
+    return decorate
 
-if not os.path.exists(WATCH_FOLDER):
-    raise FileNotFoundError(f"❌ WATCH_FOLDER path does not exist: {WATCH_FOLDER}")
+def _outcome(job, outcome, error=None):
+    # Recorded on the job too, so the job queue knows whether to retry
+    job["outcome"] = outcome
+    if error is not None:
+        job["error"] = str(error)
+    inc("files_total", outcome=outcome)
+    log_event("file", outcome=outcome, error=job.get("error"))
 
-if not os.access(WATCH_FOLDER, os.R_OK | os.W_OK):
-    raise PermissionError(f"❌ WATCH_FOLDER is not readable or writable: {WATCH_FOLDER}")
+def _run(pool, fn, *args):
+    # 🧵 CPU-heavy helpers go to the process pool when the pipeline provides one
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args).result()
 
-VALID_EXTENSIONS = (
-    ".txt", ".pdf", ".docx", ".pptx", ".md",
-    ".log", ".json", ".xml", ".rtf", ".html", ".eml"
-)
+def _remember_stat(job):
+    # So the next startup sync can tell this file hasn't changed without opening it
+    get_writer().submit(_record_manifest, job["root"], job["filename"], *job["stat"])
 
-def process_file(filepath, source="watcher"):
+def wait_until_unlocked(filepath):
     for _ in range(5):
         try:
             with open(filepath, "rb"):
-                break
+                return True
         except PermissionError:
             print(f"⏳ File is locked, retrying: {filepath}")
             time.sleep(1)
-    else:
-        print(f"❌ File remained locked: {filepath}")
-        return
+    print(f"❌ File remained locked: {filepath}")
+    return False
 
+def classify_hash(file_hash, root, filename):
+    if is_indexed(file_hash, root, filename):
+        return "unchanged", None
+    dupe = find_duplicate(file_hash, root, filename)
+    if dupe:
+        return "duplicate", dupe
+    cached = get_cached_summary(file_hash, SUMMARY_VERSION)
+    if cached:
+        return "cached", cached
+    return None, None
+
+def prepare_document(filepath):
+    # Runs in the process pool: one read feeds the hash, thumbnail and text
+    with bind(path=filepath), span("prepare"):
+        return _prepare_document(filepath)
+
+def _prepare_document(filepath):
+    doc = ParsedDocument.load(filepath)
     try:
-        ext = os.path.splitext(filepath)[1].lower()
-        if ext not in VALID_EXTENSIONS:
+        root, filename = locate(filepath)
+        verdict, detail = classify_hash(doc.digest, root.name, filename)
+        if verdict not in ("duplicate", "unchanged"):
+            doc.thumbnail = generate_thumbnail(doc)
+            # Read now, while the file is still at this path: finalize renames it before
+            # saving, and a cached summary still needs the text for search and the vector
+            doc.text
+        return doc, verdict, detail
+    finally:
+        doc.close()
+
+@_stage("extract")
+def extract_stage(job, pool=None):
+    filepath = job["path"]
+    if not os.path.exists(filepath):
+        # Renamed or deleted since it was queued; whatever replaced it has its own job
+        _outcome(job, "missing")
+        return None
+    if not wait_until_unlocked(filepath):
+        _outcome(job, "locked", "file stayed locked")
+        return None
+
+    try:
+        if not is_supported(filepath):
             print(f"⚠️ Unsupported file type: {filepath}")
-            return
+            _outcome(job, "unsupported")
+            return None
+
+        root, filename = locate(filepath)
+        if root is None:
+            print(f"⚠️ Not inside any watch root: {filepath}")
+            _outcome(job, "outside_roots")
+            return None
+
+        print(f"\n📄 Processing ({job['source']}): {filepath}")
+        job["root"] = root.name
+        job["filename"] = filename
 
-        print(f"\n📄 Processing ({source}): {filepath}")
-        filename = os.path.basename(filepath)
-        file_size = os.path.getsize(filepath)
+        # ⚡ Unchanged file we've seen before: decide from the fingerprint without opening it.
+        # The stat is taken before any read, so a later edit shows up as a mismatch at the next sync.
+        st = os.stat(filepath)
+        job["stat"] = (st.st_size, st.st_mtime_ns)
+        known_hash = lookup_fingerprint(filepath, st)
+        if known_hash:
+            verdict, detail = classify_hash(known_hash, root.name, filename)
+            thumbnail = thumbnail_paths(known_hash)
+            if verdict == "unchanged":
+                print(f"✅ Already indexed, content unchanged: {filename}")
+                _remember_stat(job)
+                _outcome(job, "unchanged")
+                return None
+            if verdict == "duplicate":
+                print(f"⚠️ Duplicate content detected — already saved as: {detail}")
+                _outcome(job, "duplicate")
+                return None
+            if verdict == "cached" and os.path.exists(thumbnail[0]):
+                print(f"⚡ Cached GPT result for {filename}")
+                job.update(hash=known_hash, file_size=st.st_size, thumbnail=thumbnail, result=detail)
+                return job
 
-        text = extract_text_from_file(filepath)
-        if not text.strip():
+        # 🔑 Hash comes out of the same read, so duplicates and cached files skip extraction and GPT
+        doc, verdict, detail = _run(pool, prepare_document, filepath)
+        job.update(doc=doc, hash=doc.digest, file_size=doc.size, thumbnail=doc.thumbnail)
+
+        if verdict == "unchanged":
+            print(f"✅ Already indexed, content unchanged: {filename}")
+            _remember_stat(job)
+            _outcome(job, "unchanged")
+            return None
+        if verdict == "duplicate":
+            print(f"⚠️ Duplicate content detected — already saved as: {detail}")
+            _outcome(job, "duplicate")
+            return None
+        if verdict == "cached":
+            print(f"⚡ Cached GPT result for {filename}")
+            job["result"] = detail
+            return job
+
+        if not doc.text.strip():
             print(f"❌ No text extracted from {filename}")
-            return
+            _outcome(job, "empty")
+            return None
+
+        # 🪞 Rescans, re-exports and forwarded copies reuse the original's metadata instead of calling GPT
+        job["signature"] = signature(doc.text)
+        original, score = find_near_duplicate(job["signature"], root.name, filename)
+        if original is not None:
+            doc_id, dupe_root, dupe_name, common_name, summary, keyword, category, duplicate_of = original
+            print(f"🪞 Near-duplicate ({score:.0%}) of {dupe_root}/{dupe_name}, reusing its metadata")
+            job["duplicate_of"] = duplicate_of or doc_id
+            job["result"] = {"common_name": common_name, "summary": summary, "keyword": keyword, "category": category}
+            inc("gpt_calls_saved_total", reason="near_duplicate")
+            return job
 
-        chunks = chunk_text(text, max_tokens=3000)
-        result = summarize_with_gpt(chunks[0])
-        print(f"🤖 GPT Result: {result}")
+        # 🏷 Routine documents (statements, receipts) the local classifier is sure about skip GPT
+        local = classify_locally(doc.text)
+        if local is not None:
+            print(f"🏷 Classified locally ({local['confidence']:.0%}): {local['category']} / {local['keyword']}")
+            job["result"] = local
+            job["summary_version"] = f"local:{CLASSIFIER_VERSION}"
+            return job
 
-        new_name    = result.get("filename", filename)
-        common_name = result.get("common_name", os.path.splitext(filename)[0])
-        summary     = result.get("summary", "No summary provided.")
-        keyword     = result.get("keyword", "Uncategorized")
-        category    = result.get("category", "Unsorted")
+        # Only the first chunk goes to GPT; the generator never builds the rest
+        job["chunk"] = next(chunk_text(doc.text, max_tokens=3000))
+        return job
+
+    except Exception as e:
+        print(f"❌ Error processing file {filepath}: {e}")
+        _outcome(job, "failed", e)
+        return None
 
-        new_path   = rename_file(filepath, new_name)
+@_stage("summarize")
+def summarize_stage(job):
+    filename = job["filename"]
+    result = job.get("result")
+    if result is None:
+        try:
+            result = summarize_with_gpt(job.pop("chunk"))
+            print(f"🤖 GPT Result: {result}")
+        except Exception as e:
+            print(f"❌ Error processing file {job['path']}: {e}")
+            _outcome(job, "failed", e)
+            return None
+        store_summary(job["hash"], SUMMARY_VERSION, result)
+
+    basename = os.path.basename(filename)
+    job["new_name"]    = result.get("filename", basename)
+    job["common_name"] = result.get("common_name", os.path.splitext(basename)[0])
+    job["summary"]     = result.get("summary", "No summary provided.")
+    job["keyword"]     = result.get("keyword", "Uncategorized")
+    job["category"]    = result.get("category", "Unsorted")
+    return job
+
+@_stage("finalize")
+def finalize_stage(job):
+    try:
+        # Text before the rename; a lazy read afterwards would look at a path that's gone
+        doc = job.get("doc")
+        if doc is not None:
+            text = doc.text
+        else:
+            # Fingerprint hit without a parse: stored text, if any, still feeds search
+            text = (get_text(job["hash"]) or "")[:TEXT_BUDGET]
+
+        new_path   = rename_file(job["path"], job["new_name"])
         final_path = new_path
 
-        thumb_path, preview_path = generate_thumbnail(final_path)
-        file_hash = hash_file(final_path)
+        # Thumbnail was rendered during extraction, keyed by hash, so the rename doesn't matter
+        thumb_path, preview_path = job["thumbnail"]
+
+        # 🗜 Keep freshly extracted text so a prompt/model change never has to re-extract
+        if doc is not None and text and doc.text_source == "extracted":
+            store_text(job["hash"], text)
+
+        sig = job.get("signature")
+        if sig is None and text:
+            sig = signature(text)
+        # No text means nothing stored to go on; the stored vector stays as it was
+        counts = term_counts(" ".join((job["common_name"], job["summary"], job["keyword"], text))) if text else None
 
         save_or_update_document(
-            final_path, common_name, summary, keyword,
-            file_size, category, file_hash, thumb_path, preview_path
+            final_path, job["common_name"], job["summary"], job["keyword"],
+            job["file_size"], job["category"], job["hash"], thumb_path, preview_path, text,
+            signature=sig, duplicate_of=job.get("duplicate_of"), vector=counts,
+            summary_version=job.get("summary_version", SUMMARY_VERSION),
+            manifest=(job["filename"], *job["stat"])
         )
 
         print(f"✅ Indexed and saved: {final_path}")
+        _outcome(job, "indexed")
+        job["final_path"] = final_path
+        return job
 
     except Exception as e:
-        print(f"❌ Error processing file {filepath}: {e}")
+        print(f"❌ Error processing file {job['path']}: {e}")
+        _outcome(job, "failed", e)
+        return None
+
+def process_file(filepath, source="watcher", pool=None):
+    job = {"path": filepath, "source": source}
+    with bind(path=filepath), span("process_file", source=source):
+        job = extract_stage(job, pool)
+        if job is not None:
+            job = summarize_stage(job)
+        if job is not None:
+            job = finalize_stage(job)
+    return job["final_path"] if job is not None else None
 
 def chunk_text(text, max_tokens=3000):
     chunk_size = max_tokens * 4
-    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+    for i in range(0, len(text), chunk_size):
+        yield text[i:i+chunk_size]
 
-def save_or_update_document(filepath, common_name, summary, keyword, file_size, category, file_hash, thumb, preview):
+def is_indexed(file_hash, root, filename):
+    # Same name, same content, complete metadata — nothing to redo
+    if not file_hash:
+        return False
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-
-        # 🧠 Check if this exact hash is already in the DB under another filename
-        cur.execute("SELECT filename FROM documents WHERE hash = ?", (file_hash,))
-        dupe = cur.fetchone()
-        if dupe and dupe[0] != os.path.basename(filepath):
-            print(f"⚠️ Duplicate content detected — already saved as: {dupe[0]}")
-            conn.close()
-            return
-
-        # Check if filename already exists
-        cur.execute("SELECT 1 FROM documents WHERE filename = ?", (os.path.basename(filepath),))
-        exists = cur.fetchone()
-
-        if exists:
-            cur.execute("""
-                UPDATE documents SET
-                    common_name = ?,
-                    summary = ?,
-                    keyword = ?,
-                    file_size = ?,
-                    category = ?,
-                    hash = ?,
-                    thumbnail_path = ?,
-                    preview_path = ?,
-                    date_added = ?
-                WHERE filename = ?
-            """, (
-                common_name, summary, keyword, file_size, category,
-                file_hash, thumb, preview, datetime.now().isoformat(),
-                os.path.basename(filepath)
-            ))
-            print(f"🔄 Updated record: {filepath}")
-        else:
-            cur.execute("""
-                INSERT INTO documents 
-                (filename, common_name, summary, keyword, file_size, category, hash, thumbnail_path, preview_path, date_added)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                os.path.basename(filepath), common_name, summary, keyword,
-                file_size, category, file_hash, thumb, preview,
-                datetime.now().isoformat()
-            ))
-            print(f"🆕 Inserted new record: {filepath}")
-
-        conn.commit()
+        conn = connect()
+        row = conn.execute("""
+            SELECT 1 FROM documents
+            WHERE archived = 0 AND root = ? AND filename = ? AND hash = ? AND summary != '' AND thumbnail_path != ''
+        """, (root, filename, file_hash)).fetchone()
         conn.close()
+        return row is not None
     except Exception as e:
-        print(f"❌ Failed to save/update DB for {filepath}: {e}")
+        print(f"❌ Index lookup failed for {filename}: {e}")
+        return False
 
-def remove_from_db(filename):
+def find_duplicate(file_hash, root, filename):
+    if not file_hash:
+        return None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("DELETE FROM documents WHERE filename = ?", (filename,))
-        conn.commit()
+        conn = connect()
+        row = conn.execute(
+            "SELECT root, filename FROM documents WHERE hash = ? AND archived = 0", (file_hash,)
+        ).fetchone()
         conn.close()
-        print(f"🗑 Removed from DB: {filename}")
+    except Exception as e:
+        print(f"❌ Duplicate lookup failed for {filename}: {e}")
+        return None
+    if row and tuple(row) != (root, filename):
+        return f"{row[0]}/{row[1]}"
+    return None
+
+def _save_document(cur, filepath, common_name, summary, keyword, file_size, category, file_hash, thumb, preview,
+                   text="", summary_version=SUMMARY_VERSION, signature=None, duplicate_of=None, vector=None,
+                   manifest=None):
+    root, filename = locate(filepath)
+    if root is None:
+        raise ValueError(f"Not inside any watch root: {filepath}")
+    root = root.name
+
+    # 🧠 Check if this exact hash is already in the DB under another filename.
+    # Archived copies don't count: the same content coming back is indexed afresh.
+    cur.execute("SELECT root, filename FROM documents WHERE hash = ? AND archived = 0", (file_hash,))
+    dupe = cur.fetchone()
+    if dupe and tuple(dupe) != (root, filename):
+        print(f"⚠️ Duplicate content detected — already saved as: {dupe[0]}/{dupe[1]}")
+        return False
+
+    cur.execute("SELECT 1 FROM documents WHERE archived = 0 AND root = ? AND filename = ?", (root, filename))
+    exists = cur.fetchone()
+
+    cur.execute("""
+        INSERT INTO documents
+        (root, filename, common_name, summary, keyword, file_size, category, hash, thumbnail_path, preview_path,
+         date_added, summary_version, duplicate_of)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(root, filename) WHERE archived = 0 DO UPDATE SET
+            common_name = excluded.common_name,
+            summary = excluded.summary,
+            keyword = excluded.keyword,
+            file_size = excluded.file_size,
+            category = excluded.category,
+            hash = excluded.hash,
+            thumbnail_path = excluded.thumbnail_path,
+            preview_path = excluded.preview_path,
+            date_added = excluded.date_added,
+            summary_version = excluded.summary_version,
+            duplicate_of = excluded.duplicate_of
+    """, (
+        root, filename, common_name, summary, keyword, file_size, category,
+        file_hash, thumb, preview, datetime.now().isoformat(), summary_version, duplicate_of
+    ))
+    doc_id = cur.execute(
+        "SELECT id FROM documents WHERE archived = 0 AND root = ? AND filename = ?", (root, filename)
+    ).fetchone()[0]
+
+    # 🔎 Refresh the search index; keep the old body when this run had no extracted text (cache hit)
+    if not text:
+        row = cur.execute("SELECT body FROM documents_fts WHERE rowid = ?", (doc_id,)).fetchone()
+        text = row[0] if row else ""
+    cur.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+    cur.execute(
+        "INSERT INTO documents_fts (rowid, common_name, summary, keyword, category, body) VALUES (?, ?, ?, ?, ?, ?)",
+        (doc_id, common_name, summary, keyword, category, text)
+    )
+    if signature is not None:
+        put_signature(cur, doc_id, signature)
+    if vector is not None:
+        put_vector(cur, doc_id, vector)
+    if manifest is not None:
+        # Same transaction as the row, so a crash can't leave one without the other
+        original_name, size, mtime_ns = manifest
+        _record_manifest(cur, root, filename, size, mtime_ns, original_name)
+
+    print(f"🔄 Updated record: {filepath}" if exists else f"🆕 Inserted new record: {filepath}")
+    return True
+
+@traced("db_write")
+def save_or_update_document(filepath, common_name, summary, keyword, file_size, category, file_hash, thumb, preview,
+                            text="", signature=None, duplicate_of=None, vector=None, summary_version=SUMMARY_VERSION,
+                            manifest=None):
+    try:
+        return get_writer().call(
+            _save_document, filepath, common_name, summary, keyword,
+            file_size, category, file_hash, thumb, preview, text, summary_version, signature, duplicate_of, vector,
+            manifest
+        )
+    except Exception as e:
+        print(f"❌ Failed to save/update DB for {filepath}: {e}")
+        return False
+
+def _record_manifest(cur, root, filename, size, mtime_ns, original_name=None):
+    # Size/mtime as of the read, under the name the file ended up with
+    if original_name and original_name != filename:
+        cur.execute("DELETE FROM sync_manifest WHERE root = ? AND filename = ?", (root, original_name))
+    cur.execute(
+        "INSERT OR REPLACE INTO sync_manifest (root, filename, size, mtime_ns) VALUES (?, ?, ?, ?)",
+        (root, filename, size, mtime_ns)
+    )
+
+def _remove_document(cur, root, filename):
+    # documents_fts_delete trigger drops the search row along with it
+    # Archived rows live on in the packs; only the live row follows the file
+    cur.execute("DELETE FROM documents WHERE archived = 0 AND root = ? AND filename = ?", (root, filename))
+
+def remove_from_db(filename, root=DEFAULT_ROOT):
+    try:
+        get_writer().call(_remove_document, root, filename)
+        print(f"🗑 Removed from DB: {root}/{filename}")
     except Exception as e:
         print(f"❌ DB deletion error for {filename}: {e}")
+
+def _remove_folder(cur, root, folder):
+    # instr() rather than LIKE so "_" and "%" in folder names match literally
+    prefix = folder.rstrip("/") + "/"
+    cur.execute("DELETE FROM documents WHERE archived = 0 AND root = ? AND instr(filename, ?) = 1", (root, prefix))
+    cur.execute("DELETE FROM sync_manifest WHERE root = ? AND instr(filename, ?) = 1", (root, prefix))
+
+def remove_folder_from_db(folder, root=DEFAULT_ROOT):
+    # A whole subfolder deleted or moved out of the root in one event
+    try:
+        get_writer().call(_remove_folder, root, folder)
+        print(f"🗑 Removed folder from DB: {root}/{folder}")
+    except Exception as e:
+        print(f"❌ DB deletion error for folder {folder}: {e}")
+
+def _rename_document(cur, root, old_filename, new_filename):
+    cur.execute(
+        "UPDATE documents SET filename = ? WHERE archived = 0 AND root = ? AND filename = ?",
+        (new_filename, root, old_filename)
+    )
+    moved = cur.rowcount > 0
+    if moved:
+        # A rename keeps size and mtime, so the stat moves with the row
+        cur.execute(
+            "UPDATE OR REPLACE sync_manifest SET filename = ? WHERE root = ? AND filename = ?",
+            (new_filename, root, old_filename)
+        )
+    return moved
+
+def rename_in_db(old_filename, new_filename, root=DEFAULT_ROOT):
+    # A move doesn't change content, so carry the row over instead of reprocessing
+    try:
+        moved = get_writer().call(_rename_document, root, old_filename, new_filename)
+        if moved:
+            print(f"🔀 Renamed in DB: {root}/{old_filename} → {new_filename}")
+        return moved
+    except Exception as e:
+        print(f"❌ DB rename error for {old_filename}: {e}")
+        return False
@@ -0,0 +1,102 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from handler import extract_stage, summarize_stage, finalize_stage
+
+load_dotenv()
+
+CPU_WORKERS      = int(os.getenv("CPU_WORKERS", os.cpu_count() or 2))
+EXTRACT_WORKERS  = int(os.getenv("EXTRACT_WORKERS", CPU_WORKERS))
+GPT_WORKERS      = int(os.getenv("GPT_WORKERS", 8))
+FINALIZE_WORKERS = int(os.getenv("FINALIZE_WORKERS", 2))
+INTAKE_QUEUE_SIZE = int(os.getenv("INTAKE_QUEUE_SIZE", 10000))
+STAGE_QUEUE_SIZE  = int(os.getenv("STAGE_QUEUE_SIZE", 32))
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name, func, workers, maxsize):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next = None
+        self.on_done = None
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                break
+            try:
+                out = self.func(job)
+            except Exception as e:
+                print(f"❌ {self.name} stage failed for {job.get('path')}: {e}")
+                job.update(outcome="failed", error=f"{self.name}: {e}")
+                out = None
+            if out is not None and self.next is not None:
+                # ⏸ Blocks while the next stage is full, which throttles this one
+                self.next.queue.put(out)
+            elif self.on_done is not None:
+                # Dropped here or made it through the last stage: either way the job is over
+                self.on_done(job)
+
+
+class IngestPipeline:
+    def __init__(self, cpu_workers=CPU_WORKERS, extract_workers=EXTRACT_WORKERS,
+                 gpt_workers=GPT_WORKERS, finalize_workers=FINALIZE_WORKERS,
+                 intake_size=INTAKE_QUEUE_SIZE, stage_size=STAGE_QUEUE_SIZE):
+        self.pool = ProcessPoolExecutor(max_workers=cpu_workers)
+        self.extract = Stage("extract", lambda job: extract_stage(job, self.pool), extract_workers, intake_size)
+        self.summarize = Stage("gpt", summarize_stage, gpt_workers, stage_size)
+        self.finalize = Stage("finalize", finalize_stage, finalize_workers, stage_size)
+        self.extract.next = self.summarize
+        self.summarize.next = self.finalize
+        self.stages = [self.extract, self.summarize, self.finalize]
+        self.on_done = None
+
+    def start(self):
+        for stage in self.stages:
+            stage.on_done = self._done
+            stage.start()
+        print("🚀 Pipeline started: " + ", ".join(f"{s.name}×{s.workers}" for s in self.stages))
+
+    def _done(self, job):
+        if self.on_done is not None:
+            self.on_done(job)
+
+    def submit(self, filepath, source="watcher", block=False, job_id=None):
+        # 👀 The observer thread must never block here; the event queue's dispatcher may
+        try:
+            self.extract.queue.put({"path": filepath, "source": source, "job_id": job_id}, block=block)
+            return True
+        except queue.Full:
+            print(f"⚠️ Intake queue full, skipping {filepath} (startup sync will pick it up)")
+            return False
+
+    def depths(self):
+        return {s.name: s.queue.qsize() for s in self.stages}
+
+    def stop(self):
+        # Drain stage by stage so nothing in flight is lost
+        for stage in self.stages:
+            stage.stop()
+        self.pool.shutdown()
+        print("🛑 Pipeline stopped.")
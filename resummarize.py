@@ -0,0 +1,105 @@
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from handler import chunk_text
+from utils.db import connect, get_writer, migrate
+from utils.cache import store_summary
+from utils.gpt_client import SUMMARY_VERSION, get_client, run_async
+from utils.metrics import inc
+from utils.textstore import get_text, prune_texts
+
+load_dotenv()
+RESUMMARIZE_BATCH = 200
+
+def _stale_batch(conn, after, size, include_local=False):
+    # Keyset by id, so each batch is one index range no matter how far along we are.
+    # Rows the local classifier labelled stay local unless asked for; sending them
+    # to GPT would undo the savings the classifier is there for.
+    return conn.execute("""
+        SELECT id, hash FROM documents
+        WHERE id > ? AND archived = 0 AND (summary_version IS NULL OR summary_version != ?)
+          AND (? OR summary_version IS NULL OR summary_version NOT LIKE 'local:%')
+        ORDER BY id LIMIT ?
+    """, (after, SUMMARY_VERSION, include_local, size)).fetchall()
+
+def _apply_summary(cur, doc_id, result, version):
+    # Metadata only — the file keeps its name, and the FTS row keeps its body
+    cur.execute("""
+        UPDATE documents SET common_name = ?, summary = ?, keyword = ?, category = ?, summary_version = ?
+        WHERE id = ?
+    """, (result.get("common_name", ""), result.get("summary", "No summary provided."),
+          result.get("keyword", "Uncategorized"), result.get("category", "Unsorted"), version, doc_id))
+    row = cur.execute("SELECT body FROM documents_fts WHERE rowid = ?", (doc_id,)).fetchone()
+    cur.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+    cur.execute(
+        "INSERT INTO documents_fts (rowid, common_name, summary, keyword, category, body) VALUES (?, ?, ?, ?, ?, ?)",
+        (doc_id, result.get("common_name", ""), result.get("summary", ""), result.get("keyword", ""),
+         result.get("category", ""), row[0] if row else "")
+    )
+
+async def _summarize_all(chunks):
+    # The shared client applies the concurrency and rate limits
+    client = get_client()
+    return await asyncio.gather(*(client.summarize(chunk) for chunk in chunks), return_exceptions=True)
+
+def resummarize(limit=None, batch=RESUMMARIZE_BATCH, dry_run=False, include_local=False):
+    migrate()
+    conn = connect()
+    counts = {"done": 0, "no_text": 0, "failed": 0}
+    after = 0
+    while limit is None or counts["done"] < limit:
+        size = batch if limit is None else min(batch, limit - counts["done"])
+        rows = _stale_batch(conn, after, size, include_local)
+        if not rows:
+            break
+        after = rows[-1][0]
+
+        work = []
+        for doc_id, file_hash in rows:
+            text = get_text(file_hash, conn=conn)
+            if not text or not text.strip():
+                counts["no_text"] += 1      # extracted before the store existed; needs a re-index
+                continue
+            work.append((doc_id, file_hash, next(chunk_text(text, max_tokens=3000))))
+        if dry_run:
+            counts["done"] += len(work)
+            continue
+
+        results = run_async(_summarize_all([chunk for _, _, chunk in work]))
+        writes = []
+        for (doc_id, file_hash, _), result in zip(work, results):
+            if isinstance(result, BaseException):
+                print(f"❌ Re-summarize failed for document {doc_id}: {result}")
+                counts["failed"] += 1
+                continue
+            store_summary(file_hash, SUMMARY_VERSION, result)
+            writes.append(get_writer().submit(_apply_summary, doc_id, result, SUMMARY_VERSION))
+        for future in writes:
+            future.result()
+        counts["done"] += len(writes)
+        inc("resummarized_total", len(writes))
+        print(f"🤖 Re-summarized up to id {after}: {counts}")
+
+    conn.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Re-summarize documents from stored text with {SUMMARY_VERSION}")
+    parser.add_argument("--limit", type=int, help="Stop after this many documents")
+    parser.add_argument("--batch", type=int, default=RESUMMARIZE_BATCH, help="Documents per GPT batch")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be redone")
+    parser.add_argument("--include-local", action="store_true",
+                        help="Also send documents the local classifier labelled to GPT")
+    parser.add_argument("--prune-texts", action="store_true", help="Drop stored text no document uses any more")
+    args = parser.parse_args()
+
+    if args.prune_texts:
+        migrate()
+        print(f"🧹 Pruned {prune_texts()} stored texts")
+        return
+    counts = resummarize(args.limit, args.batch, args.dry_run, args.include_local)
+    verb = "Would re-summarize" if args.dry_run else "Re-summarized"
+    print(f"✅ {verb} {counts['done']} documents ({counts['no_text']} without stored text, {counts['failed']} failed)")
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,174 @@
 import os
-import sqlite3
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from handler import process_file
+from utils.db import connect, get_writer
+from utils.roots import load_roots, root_file
+from utils.formats import is_supported
 
 load_dotenv()
-WATCH_FOLDER = os.getenv("WATCH_FOLDER")
-DB_PATH = "database.db"
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", 8))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 2))
+CHANGES_RETENTION = int(os.getenv("CHANGES_RETENTION", 10000))
+PROGRESS_EVERY = 25
+LEGACY_STAT = (-1, -1)       # manifest marker written by migration 13, trusted once
 
-def run_startup_sync():
-    print("🔄 Starting folder/database sync...")
+def scan_folder(root, skip=()):
+    # 📂 scandir hands back stat info with the listing, no extra syscalls per file.
+    # Keys are paths relative to the root, with "/" separators like the catalog.
+    entries = {}
+    folders = [root.path]
+    while folders:
+        folder = folders.pop()
+        try:
+            it = os.scandir(folder)
+        except OSError as e:
+            print(f"⚠️ Cannot read folder {folder}: {e}")
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    # Another root nested inside this one is that root's business
+                    if root.recursive and entry.path not in skip:
+                        folders.append(entry.path)
+                elif entry.is_file() and is_supported(entry.name):
+                    st = entry.stat()
+                    rel = os.path.relpath(entry.path, root.path).replace(os.sep, "/")
+                    entries[rel] = (st.st_size, st.st_mtime_ns)
+    return entries
 
-    if not os.path.exists(WATCH_FOLDER):
-        print(f"❌ Folder not found: {WATCH_FOLDER}")
-        return
+def _upsert_manifest(cur, root, rows):
+    cur.executemany(
+        "INSERT OR REPLACE INTO sync_manifest (root, filename, size, mtime_ns) VALUES (?, ?, ?, ?)",
+        [(root, *row) for row in rows]
+    )
 
-    actual_files = {
-        f for f in os.listdir(WATCH_FOLDER)
-        if f.lower().endswith((".pdf", ".txt", ".docx", ".md", ".html", ".eml", ".pptx", ".log", ".xml", ".rtf"))
-    }
+def _delete_missing(cur, root, filenames):
+    payload = json.dumps(filenames)
+    cur.execute(
+        "DELETE FROM documents WHERE (archived = 0 OR archived_at IS NULL) AND root = ? "
+        "AND filename IN (SELECT value FROM json_each(?))",
+        (root, payload)
+    )
+    cur.execute(
+        "DELETE FROM sync_manifest WHERE root = ? AND filename IN (SELECT value FROM json_each(?))", (root, payload)
+    )
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT filename, thumbnail_path, summary FROM documents")
-    db_rows = cur.fetchall()
+def _prune_changes(cur, keep):
+    cur.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (keep,))
 
-    db_index = {row[0]: {"thumbnail": row[1], "summary": row[2]} for row in db_rows}
+def _format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
 
-    for file in actual_files:
-        full_path = os.path.join(WATCH_FOLDER, file)
+def _diff_root(root, writer, skip=()):
+    # → files under this root that need (re)processing; clears out the ones that are gone
+    actual_files = scan_folder(root, skip)
 
-        if file not in db_index:
-            print(f"🆕 File not in DB: {file}")
-            process_file(full_path, source="sync")
-        else:
-            needs_update = not db_index[file]["thumbnail"] or not db_index[file]["summary"]
-            if needs_update:
-                print(f"🔁 Incomplete metadata, reprocessing: {file}")
-                process_file(full_path, source="sync")
-            else:
-                print(f"✅ Already complete: {file}")
+    # Packed rows are off disk and out of this scan; only live and not-yet-packed rows are compared
+    conn = connect()
+    rows = conn.execute("""
+        SELECT d.filename, d.thumbnail_path, d.summary, m.size, m.mtime_ns
+        FROM documents d LEFT JOIN sync_manifest m ON m.root = d.root AND m.filename = d.filename
+        WHERE d.archived = 0 AND d.root = ?
+        UNION ALL
+        SELECT d.filename, d.thumbnail_path, d.summary, m.size, m.mtime_ns
+        FROM documents d LEFT JOIN sync_manifest m ON m.root = d.root AND m.filename = d.filename
+        WHERE d.archived = 1 AND d.archived_at IS NULL AND d.root = ?
+    """, (root.name, root.name)).fetchall()
+    conn.close()
+    db_index = {
+        row[0]: {"complete": bool(row[1]) and bool(row[2]), "stat": (row[3], row[4])}
+        for row in rows
+    }
 
-    # 🗑 Permanently delete DB entries for missing files
-    db_filenames = set(db_index.keys())
-    missing_files = db_filenames - actual_files
+    first_seen = []
+    to_process = []
+    for file, stat in actual_files.items():
+        known = db_index.get(file)
+        if known is None:
+            print(f"🆕 File not in DB: {root.name}/{file}")
+            to_process.append(file)
+        elif not known["complete"]:
+            print(f"🔁 Incomplete metadata, reprocessing: {root.name}/{file}")
+            to_process.append(file)
+        elif known["stat"] == LEGACY_STAT:
+            # Indexed before every ingest recorded its stat — trust it this once and remember it
+            first_seen.append((file, stat[0], stat[1]))
+        elif known["stat"] == (None, None):
+            # The pipeline records a stat for everything it saves; a row without one gets re-checked
+            print(f"🔁 No manifest entry, re-checking: {root.name}/{file}")
+            to_process.append(file)
+        elif known["stat"] != stat:
+            print(f"✏️ Changed on disk, reprocessing: {root.name}/{file}")
+            to_process.append(file)
 
+    # 🗑 Permanently delete DB entries for missing files, in one statement
+    missing_files = sorted(set(db_index) - set(actual_files))
     if missing_files:
-        print(f"🗑 Deleting {len(missing_files)} missing files from DB...")
-        for missing in missing_files:
-            cur.execute("DELETE FROM documents WHERE filename = ?", (missing,))
-            print(f"❌ Deleted from DB: {missing}")
-        conn.commit()
+        print(f"🗑 Deleting {len(missing_files)} missing files from DB ({root.name})...")
+        writer.call(_delete_missing, root.name, missing_files)
+    if first_seen:
+        writer.call(_upsert_manifest, root.name, first_seen)
 
-    conn.close()
-    print("✅ Sync complete.")
+    print(f"📋 {root.name}: {len(actual_files)} files on disk, {len(to_process)} to process, "
+          f"{len(actual_files) - len(to_process)} unchanged")
+    return [(root, file) for file in to_process]
+
+def run_startup_sync(roots=None, workers=SYNC_WORKERS, submit=None, cpu_workers=CPU_WORKERS):
+    print("🔄 Starting folder/database sync...")
+    started = time.perf_counter()
+
+    every_root = load_roots()
+    roots = roots or every_root
+    writer = get_writer()
+
+    to_process = []
+    for root in roots:
+        if not os.path.exists(root.path):
+            print(f"❌ Folder not found: {root.path}")
+            continue
+        nested = {r.path for r in every_root if r.path != root.path and r.path.startswith(root.path + os.sep)}
+        to_process.extend(_diff_root(root, writer, nested))
+    writer.call(_prune_changes, CHANGES_RETENTION)
+
+    total = len(to_process)
+    print(f"📋 {total} files to process across {len(roots)} root(s) ({time.perf_counter() - started:.2f}s)")
+
+    if total and submit is not None:
+        # Hand the work to a running pipeline instead of our own pools
+        for root, file in to_process:
+            submit(root_file(root.name, file))
+        print(f"📤 Queued {total} files for the pipeline")
+    elif total:
+        done = skipped = 0
+        batch_started = time.perf_counter()
+        # 🧵 Threads drive GPT/DB I/O, the process pool takes extraction and thumbnails
+        with ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(process_file, root_file(root.name, file), "sync", cpu_pool): (root.name, file)
+                for root, file in to_process
+            }
+            for future in as_completed(futures):
+                done += 1
+                root_name, file = futures[future]
+                try:
+                    final_path = future.result()
+                except Exception as e:
+                    print(f"❌ Sync failed for {root_name}/{file}: {e}")
+                    final_path = None
+                # finalize_stage has already recorded the manifest for what it saved
+                if not final_path:
+                    skipped += 1
+
+                if done % PROGRESS_EVERY == 0 or done == total:
+                    elapsed = time.perf_counter() - batch_started
+                    eta = elapsed / done * (total - done)
+                    print(f"⏱ Sync progress: {done}/{total} ({done * 100 // total}%), "
+                          f"{skipped} skipped, ETA {_format_eta(eta)}")
+
+    print(f"✅ Sync complete in {time.perf_counter() - started:.2f}s.")
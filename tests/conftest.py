@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import pytest
+
+# Every module reads its settings at import time, so the scratch workspace has to be
+# in the environment before anything from the repo is imported
+WORKSPACE = tempfile.mkdtemp(prefix="gpt_gazer_tests_")
+ROOT_NAMES = ("inbox", "shared")
+for _name in ROOT_NAMES:
+    os.makedirs(os.path.join(WORKSPACE, _name))
+with open(os.path.join(WORKSPACE, "roots.json"), "w", encoding="utf-8") as _f:
+    json.dump([{"name": n, "path": os.path.join(WORKSPACE, n), "recursive": False} for n in ROOT_NAMES], _f)
+
+os.environ.update({
+    "DB_PATH": os.path.join(WORKSPACE, "database.db"),
+    "CACHE_DB_PATH": os.path.join(WORKSPACE, "cache.db"),
+    "WATCH_ROOTS": os.path.join(WORKSPACE, "roots.json"),
+    "WATCH_FOLDER": "",
+    "ARCHIVE_DIR": os.path.join(WORKSPACE, "archive"),
+    "METRICS_DIR": os.path.join(WORKSPACE, "metrics"),
+    "JSON_LOG": "",
+    "OPENAI_API_KEY": "test",
+    "CLASSIFIER_ENABLED": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Thumbnails land under ./static, so keep them in the workspace too
+os.chdir(WORKSPACE)
+
+from utils.db import get_writer, migrate  # noqa: E402
+
+migrate()
+
+TABLES = ("documents", "sync_manifest", "jobs", "archive_members", "texts", "changes", "vector_terms", "vector_stats")
+
+
+def _clear(cur):
+    for table in TABLES:
+        cur.execute(f"DELETE FROM {table}")
+
+@pytest.fixture(autouse=True)
+def clean_workspace():
+    # Each test starts from an empty catalog and empty roots
+    get_writer().call(_clear)
+    for name in ROOT_NAMES + ("archive",):
+        folder = os.path.join(WORKSPACE, name)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+    yield
+
+@pytest.fixture
+def root_path():
+    def path(name, filename=""):
+        return os.path.join(WORKSPACE, name, filename)
+    return path
+
+@pytest.fixture
+def write_file(root_path):
+    def write(root, filename, text):
+        path = root_path(root, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+    return write
+
+@pytest.fixture
+def ingest():
+    # Runs a file through the real pipeline stages; the GPT result comes from the summary
+    # cache, so nothing goes over the network
+    import hashlib
+    import handler
+    from utils.cache import store_summary
+    from utils.gpt_client import SUMMARY_VERSION
+
+    def run(path, **result):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        store_summary(digest, SUMMARY_VERSION, {
+            "common_name": "Test document", "summary": "A test document.",
+            "keyword": "test", "category": "Testing", **result
+        })
+        return handler.process_file(path, source="test")
+    return run
@@ -0,0 +1,82 @@
+import os
+import pytest
+from utils.archive import (
+    archive_documents, candidates, find_archived, find_member, read_member, restore_document
+)
+from utils.db import connect
+
+TEXT = "Shipping manifest for the northern warehouse, pallet counts and carrier details.\n" * 200
+
+
+def _row(doc_id):
+    conn = connect()
+    row = conn.execute("SELECT archived, archived_at FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    conn.close()
+    return row
+
+def _doc_id(filename):
+    conn = connect()
+    row = conn.execute("SELECT id FROM documents WHERE filename = ?", (filename,)).fetchone()
+    conn.close()
+    return row[0]
+
+def test_archive_and_restore_round_trip(write_file, ingest):
+    path = ingest(write_file("inbox", "manifest.txt", TEXT))
+    doc_id = _doc_id("manifest.txt")
+
+    archived, bytes_in, bytes_out = archive_documents(candidates(ids=[doc_id]))
+    assert archived == 1
+    assert 0 < bytes_out < bytes_in
+    assert not os.path.exists(path)
+    assert _row(doc_id)[0] == 1 and _row(doc_id)[1]
+    assert find_archived("inbox", "manifest.txt") == doc_id
+    assert find_member(doc_id, "thumb") is not None
+
+    pack, offset, length, size, codec = find_member(doc_id)
+    data = b"".join(read_member(pack, offset, length, codec))
+    assert len(data) == size
+    assert data.decode("utf-8") == TEXT
+
+    assert restore_document(doc_id) == path
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == TEXT
+    assert _row(doc_id) == (0, None)
+    assert find_member(doc_id) is None
+
+def test_dry_run_leaves_everything_in_place(write_file, ingest):
+    path = ingest(write_file("inbox", "manifest.txt", TEXT))
+    doc_id = _doc_id("manifest.txt")
+    assert archive_documents(candidates(ids=[doc_id]), dry_run=True)[0] == 1
+    assert os.path.exists(path)
+    assert _row(doc_id) == (0, None)
+    assert os.listdir(os.environ["ARCHIVE_DIR"]) == []
+
+def test_restore_refuses_a_name_taken_by_a_live_document(write_file, ingest, root_path):
+    ingest(write_file("inbox", "manifest.txt", TEXT))
+    doc_id = _doc_id("manifest.txt")
+    archive_documents(candidates(ids=[doc_id]))
+
+    # A new file arrives under the same name while the old one is packed
+    path = ingest(write_file("inbox", "manifest.txt", TEXT + "revised\n"))
+    with pytest.raises(FileExistsError):
+        restore_document(doc_id)
+
+    # Even with the new file gone from disk, its live row still owns the name
+    os.remove(path)
+    with pytest.raises(ValueError):
+        restore_document(doc_id)
+    assert _row(doc_id)[0] == 1
+    assert os.listdir(root_path("inbox")) == []
+
+def test_sync_does_not_drop_packed_rows(write_file, ingest):
+    from sync import run_startup_sync
+    from utils.roots import get_root
+
+    ingest(write_file("inbox", "manifest.txt", TEXT))
+    doc_id = _doc_id("manifest.txt")
+    archive_documents(candidates(ids=[doc_id]))
+
+    queued = []
+    run_startup_sync(roots=[get_root("inbox")], submit=queued.append)
+    assert queued == []
+    assert _row(doc_id)[0] == 1
@@ -0,0 +1,74 @@
+import os
+import pytest
+from utils import classifier
+from utils.classifier import LocalClassifier, classify_locally, train
+from utils.db import connect, get_writer
+
+BILLING = "Electricity statement: meter reading, kilowatt usage, tariff charges and the amount due this month."
+MEDICAL = "Clinic visit notes: blood pressure, prescription refill, dosage instructions and the next appointment."
+
+
+def _add(cur, filename, category, keyword, body, file_hash):
+    cur.execute("""
+        INSERT INTO documents (root, filename, category, keyword, hash, summary, summary_version)
+        VALUES ('inbox', ?, ?, ?, ?, 's', 'v1')
+    """, (filename, category, keyword, file_hash))
+    cur.execute(
+        "INSERT INTO documents_fts (rowid, common_name, summary, keyword, category, body) VALUES (?, '', 's', ?, ?, ?)",
+        (cur.lastrowid, keyword, category, body)
+    )
+
+def _catalog(cur, per_label=6):
+    for i in range(per_label):
+        _add(cur, f"bill{i}.txt", "Utilities", "electricity", BILLING, f"b{i}")
+        _add(cur, f"visit{i}.txt", "Medical", "clinic", MEDICAL, f"m{i}")
+
+def _review(clf):
+    conn = connect()
+    try:
+        return classifier._review(clf, conn)
+    finally:
+        conn.close()
+
+@pytest.fixture
+def trained(monkeypatch):
+    monkeypatch.setattr(classifier, "CLASSIFIER_ENABLED", True)
+    monkeypatch.setattr(classifier, "CLASSIFIER_MIN_DOCS", 10)
+    get_writer().call(_catalog)
+    clf = LocalClassifier()
+    assert train(clf) == 12
+    # Stand in for the process-wide model, so nothing loads from disk or starts retraining
+    monkeypatch.setattr(classifier, "_clf", clf)
+    monkeypatch.setattr(classifier, "_clf_pid", os.getpid())
+    return clf
+
+def test_confident_prediction_skips_gpt(trained):
+    result = classify_locally(BILLING)
+    assert (result["category"], result["keyword"]) == ("Utilities", "electricity")
+    assert result["confidence"] >= classifier.CLASSIFIER_THRESHOLD
+
+def test_unsure_prediction_falls_back_to_gpt(trained):
+    # Half of each: neither label gets anywhere near the threshold
+    assert classify_locally(BILLING + " " + MEDICAL) is None
+
+def test_too_few_documents_means_no_shortcut(trained, monkeypatch):
+    monkeypatch.setattr(classifier, "CLASSIFIER_MIN_DOCS", 100)
+    assert classify_locally(BILLING) is None
+
+def test_renames_and_archiving_do_not_force_a_rebuild(trained):
+    get_writer().call(lambda cur: cur.execute("UPDATE documents SET filename = 'renamed.txt' WHERE filename = 'bill0.txt'"))
+    get_writer().call(lambda cur: cur.execute("UPDATE documents SET archived = 1 WHERE filename = 'visit0.txt'"))
+    assert _review(trained) == (False, [])
+
+def test_relabelled_document_forces_a_rebuild(trained):
+    get_writer().call(lambda cur: cur.execute("UPDATE documents SET keyword = 'power' WHERE filename = 'bill0.txt'"))
+    stale, _ = _review(trained)
+    assert stale
+    train(trained)
+    assert trained.trained_docs == 12
+    assert trained.models["keyword"].index.keys() == {"electricity", "clinic", "power"}
+
+def test_marks_survive_a_save(trained, tmp_path):
+    path = str(tmp_path / "classifier.npz")
+    trained.save(path)
+    assert LocalClassifier.load(path).marks == trained.marks
@@ -0,0 +1,50 @@
+import pytest
+from utils.db import MIGRATIONS, connect, get_writer, migrate
+
+
+def test_migrate_is_idempotent():
+    migrate()
+    conn = connect()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    assert version == MIGRATIONS[-1][0]
+
+def test_migrations_are_numbered_in_order():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+
+def _insert(cur, filename):
+    cur.execute(
+        "INSERT INTO documents (root, filename, summary, date_added) VALUES ('inbox', ?, 's', '2025-01-01')",
+        (filename,)
+    )
+
+def _fail(cur):
+    _insert(cur, "half-written.txt")
+    raise RuntimeError("boom")
+
+def test_failed_op_does_not_sink_its_batch():
+    writer = get_writer()
+    futures = [writer.submit(_insert, "a.txt"), writer.submit(_fail), writer.submit(_insert, "b.txt")]
+    futures[0].result()
+    futures[2].result()
+    with pytest.raises(RuntimeError):
+        futures[1].result()
+
+    conn = connect()
+    names = sorted(row[0] for row in conn.execute("SELECT filename FROM documents"))
+    conn.close()
+    assert names == ["a.txt", "b.txt"]
+
+def test_live_names_are_unique_but_archived_ones_can_repeat():
+    writer = get_writer()
+    writer.call(_insert, "same.txt")
+    with pytest.raises(Exception):
+        writer.call(_insert, "same.txt")
+    writer.call(lambda cur: cur.execute("UPDATE documents SET archived = 1 WHERE filename = 'same.txt'"))
+    writer.call(_insert, "same.txt")
+
+    conn = connect()
+    rows = conn.execute("SELECT archived FROM documents WHERE filename = 'same.txt' ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [(1,), (0,)]
@@ -0,0 +1,77 @@
+import io
+import csv
+import pytest
+from utils.db import get_writer
+from utils import export as export_module
+from utils.export import COLUMNS, export
+
+ROWS = [
+    # filename, category, date_added, archived
+    ("a.pdf", "Finance", "2025-03-01T09:00:00", 0),
+    ("b.pdf", "Finance", "2025-03-31T23:59:00", 0),
+    ("c.pdf", "Legal", "2025-03-15T12:00:00", 0),
+    ("d.pdf", "Finance", "2025-04-01T00:00:00", 0),
+    ("e.pdf", "Finance", "2025-03-10T08:00:00", 1),
+]
+
+
+@pytest.fixture(autouse=True)
+def catalog():
+    get_writer().call(lambda cur: cur.executemany("""
+        INSERT INTO documents (root, filename, category, date_added, archived, summary)
+        VALUES ('inbox', ?, ?, ?, ?, 'Summary, with "quotes"')
+    """, ROWS))
+
+def _csv(**filters):
+    data = b"".join(export("csv", batch=2, **filters)).decode("utf-8-sig")
+    rows = list(csv.DictReader(io.StringIO(data)))
+    return [row["filename"] for row in rows]
+
+def test_default_export_is_live_rows_in_id_order():
+    assert _csv() == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+
+def test_filters_combine():
+    assert _csv(category="Finance", since="2025-03-01", until="2025-03-31") == ["a.pdf", "b.pdf"]
+    assert _csv(category="Finance", since="2025-03-01", until="2025-03-31", archived="all") == ["a.pdf", "b.pdf", "e.pdf"]
+    assert _csv(archived="archived") == ["e.pdf"]
+
+def test_csv_header_and_quoting_survive():
+    data = b"".join(export("csv", category="Legal")).decode("utf-8-sig")
+    header, row = list(csv.reader(io.StringIO(data)))
+    assert tuple(header) == COLUMNS
+    assert row[COLUMNS.index("summary")] == 'Summary, with "quotes"'
+
+def test_bad_filters_fail_before_any_output():
+    with pytest.raises(ValueError):
+        export("csv", since="March")
+    with pytest.raises(ValueError):
+        export("csv", archived="maybe")
+    with pytest.raises(ValueError):
+        export("json")
+
+def test_parquet_round_trip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    pa = pytest.importorskip("pyarrow")
+    data = b"".join(export("parquet", batch=2, archived="all"))
+    table = pq.read_table(pa.BufferReader(data))
+    assert table.num_rows == len(ROWS)
+    assert table.column("archived").to_pylist() == [bool(row[3]) for row in ROWS]
+
+def test_xlsx_has_a_header_and_every_row():
+    pytest.importorskip("xlsxwriter")
+    import zipfile
+    data = b"".join(export("xlsx"))
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        sheet = z.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert '<dimension ref="A1:N5"/>' in sheet
+
+def test_oversized_xlsx_is_refused_before_streaming(monkeypatch):
+    from app import app
+    monkeypatch.setattr(export_module, "XLSX_MAX_ROWS", 4)      # header + 3 rows; there are 4 live ones
+    with pytest.raises(ValueError):
+        export("xlsx")
+    response = app.test_client().get("/export.xlsx")
+    assert response.status_code == 400
+    assert "Too many rows" in response.get_json()["error"]
+    # The count honours the filters, so a narrower export still goes through
+    export("xlsx", category="Finance")
@@ -0,0 +1,24 @@
+from utils import extractors
+from utils.document import ParsedDocument
+
+PAGE = """<html><head><title>Invoice &amp; Co</title><style>p { color: red }</style>
+<script>var note = "<p>not text</p>";</script></head>
+<body><h1>Bill</h1><p>Total: &euro;12 <b>due</b> now</p></body></html>
+"""
+
+
+def _doc(write_file, text):
+    return ParsedDocument.load(write_file("inbox", "page.html", text))
+
+def test_html_text_skips_markup_and_scripts(write_file):
+    text = extractors.extract_html(_doc(write_file, PAGE))
+    assert [line.strip() for line in text.splitlines() if line.strip()] == ["Invoice & Co", "Bill", "Total: €12", "due", "now"]
+
+def test_html_stops_reading_at_the_budget(write_file, monkeypatch):
+    doc = _doc(write_file, PAGE * 20000)
+    reads = []
+    chunks = extractors._text_chunks
+    monkeypatch.setattr(extractors, "_text_chunks", lambda doc: (reads.append(c) or c for c in chunks(doc)))
+    text = extractors.extract_html(doc, budget=500)
+    assert len(text) == 500
+    assert len(reads) == 1
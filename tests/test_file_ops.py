@@ -0,0 +1,46 @@
+import os
+import sys
+import subprocess
+from utils.db import connect
+from utils.file_ops import rename_file
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rename_never_replaces_an_existing_file(write_file):
+    taken = write_file("inbox", "Invoice.txt", "first")
+    path = write_file("inbox", "scan.txt", "second")
+
+    renamed = rename_file(path, "Invoice")
+    assert os.path.basename(renamed) == "Invoice (2).txt"
+    assert not os.path.exists(path)
+    with open(taken, encoding="utf-8") as f:
+        assert f.read() == "first"
+
+def test_rename_to_its_own_name_is_a_no_op(write_file):
+    path = write_file("inbox", "Invoice.txt", "first")
+    assert rename_file(path, "Invoice.txt") == path
+
+def test_documents_with_the_same_suggested_name_both_survive(write_file, ingest):
+    first = ingest(write_file("inbox", "scan001.txt", "Electricity bill for March."), filename="Same.txt")
+    second = ingest(write_file("inbox", "scan002.txt", "Water bill for April."), filename="Same.txt")
+    assert [os.path.basename(first), os.path.basename(second)] == ["Same.txt", "Same (2).txt"]
+
+    with open(first, encoding="utf-8") as f:
+        assert f.read() == "Electricity bill for March."
+    with open(second, encoding="utf-8") as f:
+        assert f.read() == "Water bill for April."
+
+    conn = connect()
+    rows = conn.execute("SELECT filename FROM documents ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [("Same.txt",), ("Same (2).txt",)]
+
+def test_rename_markers_are_seen_by_other_processes(write_file):
+    # The watcher that gets the echo events usually isn't the process that renamed
+    path = rename_file(write_file("inbox", "scan.txt", "first"), "Invoice")
+    check = "import sys; from utils.file_ops import is_own_rename; print(is_own_rename(sys.argv[1]))"
+    out = subprocess.run(
+        [sys.executable, "-c", check, path], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    assert out.strip() == "True"
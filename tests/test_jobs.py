@@ -0,0 +1,86 @@
+import time
+from utils import jobs
+from utils.db import connect, get_writer
+
+
+def _claim_at(owner, now, limit=10):
+    # Claim as if the clock read `now`, so backoff and lease expiry don't need real waiting
+    return get_writer().call(jobs._claim, owner, limit, now)
+
+def _state(job_id):
+    conn = connect()
+    row = conn.execute("SELECT state, attempts, outcome, not_before FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return row
+
+def test_enqueue_coalesces_waiting_jobs_for_a_path():
+    jobs.enqueue("/data/a.pdf").result()
+    jobs.enqueue("/data/a.pdf").result()
+    jobs.enqueue("/data/b.pdf").result()
+    assert jobs.job_counts() == {"pending": 2}
+
+def test_claimed_job_is_not_handed_out_twice():
+    jobs.enqueue("/data/a.pdf").result()
+    first = jobs.claim("w1", 5)
+    assert [path for _, path, _, _ in first] == ["/data/a.pdf"]
+    assert jobs.claim("w2", 5) == []
+
+def test_success_finishes_the_job():
+    jobs.enqueue("/data/a.pdf").result()
+    (job_id, _, _, attempts), = jobs.claim("w1")
+    assert attempts == 1
+    assert jobs.finish(job_id, "w1", "indexed") == "done"
+    assert _state(job_id)[:3] == ("done", 1, "indexed")
+
+def test_final_outcomes_are_not_retried():
+    jobs.enqueue("/data/a.pdf").result()
+    (job_id, *_), = jobs.claim("w1")
+    assert jobs.finish(job_id, "w1", "duplicate") == "done"
+
+def test_failure_backs_off_then_dead_letters(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    jobs.enqueue("/data/a.pdf").result()
+    now = time.time()
+
+    (job_id, *_), = _claim_at("w1", now)
+    assert jobs.finish(job_id, "w1", "failed", "GPT down") == "failed"
+    state, attempts, _, not_before = _state(job_id)
+    assert (state, attempts) == ("failed", 1)
+    assert not_before > now
+    # Still backing off
+    assert _claim_at("w1", now) == []
+
+    (retry_id, _, _, attempts), = _claim_at("w1", not_before + 1)
+    assert (retry_id, attempts) == (job_id, 2)
+    assert jobs.finish(job_id, "w1", "failed", "GPT down") == "dead"
+    assert [row[0] for row in jobs.dead_jobs()] == [job_id]
+
+    assert jobs.retry_dead() == 1
+    assert _state(job_id)[:2] == ("pending", 0)
+
+def test_expired_lease_goes_back_to_the_queue():
+    jobs.enqueue("/data/a.pdf").result()
+    now = time.time()
+    (job_id, *_), = _claim_at("lost-worker", now)
+
+    (reclaimed, _, _, attempts), = _claim_at("w2", now + jobs.JOB_LEASE_SECONDS + 1)
+    assert (reclaimed, attempts) == (job_id, 2)
+    # The old owner's late result is ignored
+    assert jobs.finish(job_id, "lost-worker", "indexed") is None
+    assert jobs.finish(job_id, "w2", "indexed") == "done"
+
+def test_newer_event_supersedes_a_failed_attempt():
+    jobs.enqueue("/data/a.pdf").result()
+    (job_id, *_), = jobs.claim("w1")
+    # File changed again while the first attempt was running
+    jobs.enqueue("/data/a.pdf").result()
+    assert jobs.finish(job_id, "w1", "failed", "locked") == "done"
+    assert jobs.job_counts() == {"done": 1, "pending": 1}
+
+def test_prune_only_drops_old_finished_jobs():
+    jobs.enqueue_many(["/data/a.pdf", "/data/b.pdf"]).result()
+    (job_id, *_), = jobs.claim("w1")
+    jobs.finish(job_id, "w1", "indexed")
+    assert jobs.prune_done(retention=3600) == 0
+    assert jobs.prune_done(retention=-1) == 1
+    assert jobs.job_counts() == {"pending": 1}
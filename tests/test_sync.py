@@ -0,0 +1,92 @@
+import os
+import handler
+from sync import run_startup_sync
+from utils.db import connect, get_writer
+from utils.roots import get_root
+
+TEXT = "Quarterly invoice for the cargo shipment, ledger totals and payment terms.\n" * 100
+
+
+def _sync(root="inbox"):
+    queued = []
+    run_startup_sync(roots=[get_root(root)], submit=queued.append)
+    return [os.path.basename(path) for path in queued]
+
+def _manifest():
+    conn = connect()
+    rows = dict(((root, filename), (size, mtime_ns)) for root, filename, size, mtime_ns in
+                conn.execute("SELECT root, filename, size, mtime_ns FROM sync_manifest"))
+    conn.close()
+    return rows
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+def test_pipeline_records_manifest_under_the_renamed_file(write_file, ingest):
+    path = ingest(write_file("inbox", "scan001.txt", TEXT), filename="Cargo_Invoice.txt")
+    assert os.path.basename(path) == "Cargo_Invoice.txt"
+    assert _manifest() == {("inbox", "Cargo_Invoice.txt"): _stat(path)}
+
+def test_cached_summary_still_indexes_text_after_rename(write_file, ingest):
+    # A cache hit with nothing in the text store must read the file before it's renamed
+    ingest(write_file("inbox", "scan001.txt", TEXT), filename="Cargo_Invoice.txt")
+    conn = connect()
+    body, = conn.execute(
+        "SELECT f.body FROM documents d JOIN documents_fts f ON f.rowid = d.id WHERE d.filename = 'Cargo_Invoice.txt'"
+    ).fetchone()
+    has_signature = conn.execute("SELECT COUNT(*) FROM minhash").fetchone()[0]
+    conn.close()
+    assert "cargo shipment" in body
+    assert has_signature == 1
+
+def test_sync_catches_edits_made_before_its_first_run(write_file, ingest):
+    path = ingest(write_file("inbox", "scan001.txt", TEXT), filename="Cargo_Invoice.txt")
+    # Edited while nothing was running, before any sync has seen the file
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("Amended total.\n")
+    assert _sync() == ["Cargo_Invoice.txt"]
+    # The stale stat is kept until the file is actually reprocessed
+    assert _manifest()[("inbox", "Cargo_Invoice.txt")] != _stat(path)
+
+def test_sync_skips_files_the_pipeline_ingested(write_file, ingest):
+    ingest(write_file("inbox", "scan001.txt", TEXT), filename="Cargo_Invoice.txt")
+    assert _sync() == []
+
+def test_unchanged_outcome_records_the_stat(write_file, ingest):
+    path = ingest(write_file("inbox", "report.txt", TEXT))
+    get_writer().call(lambda cur: cur.execute("DELETE FROM sync_manifest"))
+    assert _sync() == ["report.txt"]
+
+    assert handler.process_file(path, source="test") is None
+    get_writer().call(lambda cur: None)        # let the queued manifest write land
+    assert _manifest() == {("inbox", "report.txt"): _stat(path)}
+    assert _sync() == []
+
+def test_legacy_rows_are_trusted_once(write_file):
+    path = write_file("inbox", "old.txt", TEXT)
+    get_writer().call(lambda cur: cur.execute("""
+        INSERT INTO documents (root, filename, summary, thumbnail_path, hash, date_added)
+        VALUES ('inbox', 'old.txt', 'Indexed long ago.', 'thumb.jpg', 'abc', '2020-01-01')
+    """))
+    # What migration 13 leaves for rows that predate the manifest
+    get_writer().call(lambda cur: cur.execute(
+        "INSERT INTO sync_manifest (root, filename, size, mtime_ns) VALUES ('inbox', 'old.txt', -1, -1)"
+    ))
+
+    assert _sync() == []
+    assert _manifest() == {("inbox", "old.txt"): _stat(path)}
+
+    # Without any manifest entry the row is re-checked, not trusted
+    get_writer().call(lambda cur: cur.execute("DELETE FROM sync_manifest"))
+    assert _sync() == ["old.txt"]
+
+def test_missing_files_are_removed_from_the_catalog(write_file, ingest):
+    path = ingest(write_file("inbox", "gone.txt", TEXT))
+    os.remove(path)
+    assert _sync() == []
+    conn = connect()
+    left = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    conn.close()
+    assert left == 0
+    assert _manifest() == {}
@@ -0,0 +1,61 @@
+import pytest
+import handler
+from utils.db import connect, get_writer
+from utils.vectors import put_vector, term_counts, vector_for
+
+CARGO = "Quarterly invoice for the cargo shipment, ledger totals and payment terms. " * 40
+CARGO_AMENDED = CARGO + "Amended freight surcharge."
+GARDEN = "Planting schedule for tomatoes, basil and roses in the spring garden beds. " * 40
+RECIPE = "Bake the sourdough loaf at high heat after an overnight proof in the fridge. " * 40
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+def _id(filename):
+    conn = connect()
+    doc_id, = conn.execute("SELECT id FROM documents WHERE filename = ?", (filename,)).fetchone()
+    conn.close()
+    return doc_id
+
+def _related(client, doc_id):
+    response = client.get(f"/related/{doc_id}")
+    assert response.status_code == 200
+    return [hit["filename"] for hit in response.get_json()["related"]]
+
+def test_related_ranks_the_near_duplicate_first(write_file, ingest, client):
+    for name, text in (("garden.txt", GARDEN), ("cargo.txt", CARGO), ("recipe.txt", RECIPE), ("cargo-2.txt", CARGO_AMENDED)):
+        ingest(write_file("inbox", name, text))
+    assert _related(client, _id("cargo.txt"))[0] == "cargo-2.txt"
+
+def test_deleted_document_drops_out(write_file, ingest, client):
+    ingest(write_file("inbox", "cargo.txt", CARGO))
+    ingest(write_file("inbox", "cargo-2.txt", CARGO_AMENDED))
+    gone = _id("cargo-2.txt")
+    assert _related(client, _id("cargo.txt")) == ["cargo-2.txt"]
+
+    handler.remove_from_db("cargo-2.txt", "inbox")
+    assert _related(client, _id("cargo.txt")) == []
+    # The next vector write clears the matrix row as well
+    ingest(write_file("inbox", "garden.txt", GARDEN))
+    assert vector_for(gone) is None
+
+def _put_then_fail(cur, doc_id, counts):
+    put_vector(cur, doc_id, counts)
+    raise RuntimeError("save failed")
+
+def _stats():
+    conn = connect()
+    row = conn.execute("SELECT docs, df FROM vector_stats").fetchone()
+    conn.close()
+    return row
+
+def test_rolled_back_save_leaves_no_vector_behind():
+    doc_id = 10 ** 6
+    before = _stats()
+    with pytest.raises(RuntimeError):
+        get_writer().call(_put_then_fail, doc_id, term_counts(CARGO))
+    assert _stats() == before
+    assert vector_for(doc_id) is None
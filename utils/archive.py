@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import zlib
+import struct
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.db import DB_PATH, connect, get_writer
+from utils.file_ops import thumbnail_paths
+from utils.roots import root_file
+from utils.metrics import inc
+
+load_dotenv()
+ARCHIVE_DIR = os.path.abspath(os.getenv("ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archive"))
+ARCHIVE_PACK_MAX_BYTES = int(os.getenv("ARCHIVE_PACK_MAX_BYTES", 1024 ** 3))
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", 6))
+BLOCK_SIZE = 1024 * 1024
+
+# Every member starts with MAGIC, a header length and a JSON header naming what follows,
+# so a pack can be re-indexed from scratch if the database is ever lost
+MAGIC = b"GGPK"
+_HEADER = struct.Struct("<4sI")
+
+
+class PackWriter:
+    # Append-only. Each archiving run writes its own pack files, so runs never share one.
+    def __init__(self, folder=ARCHIVE_DIR, max_bytes=ARCHIVE_PACK_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.name = None
+        self.file = None
+        self.seq = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def _roll(self):
+        self.close()
+        self.seq += 1
+        self.name = f"pack-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{self.seq:03d}.pack"
+        self.file = open(os.path.join(self.folder, self.name), "xb")
+
+    def add(self, path, header):
+        # → (pack, offset of the compressed data, compressed length, original size)
+        if self.file is None or self.file.tell() >= self.max_bytes:
+            self._roll()
+        meta = json.dumps(header).encode("utf-8")
+        self.file.write(_HEADER.pack(MAGIC, len(meta)) + meta)
+        offset = self.file.tell()
+        compressor = zlib.compressobj(ARCHIVE_COMPRESSION_LEVEL)
+        size = 0
+        with open(path, "rb") as src:
+            while True:
+                block = src.read(BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                self.file.write(compressor.compress(block))
+        self.file.write(compressor.flush())
+        return self.name, offset, self.file.tell() - offset, size
+
+    def sync(self):
+        # The index may only point at bytes that are really on disk
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def read_member(pack, offset, length, codec="zlib"):
+    # Streams one member back out, a block at a time
+    if codec != "zlib":
+        raise ValueError(f"Unknown archive codec: {codec}")
+    decompressor = zlib.decompressobj()
+    with open(os.path.join(ARCHIVE_DIR, pack), "rb") as f:
+        f.seek(offset)
+        remaining = length
+        while remaining:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IOError(f"Pack {pack} is truncated at offset {offset}")
+            remaining -= len(block)
+            out = decompressor.decompress(block)
+            if out:
+                yield out
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+def find_member(doc_id, kind="file", conn=None):
+    own = conn is None
+    conn = conn or connect()
+    row = conn.execute(
+        "SELECT pack, offset, length, size, codec FROM archive_members WHERE doc_id = ? AND kind = ?", (doc_id, kind)
+    ).fetchone()
+    if own:
+        conn.close()
+    return row
+
+def find_archived(root, filename, conn=None):
+    # Newest archived row under this name, for links made before it was archived
+    own = conn is None
+    conn = conn or connect()
+    row = conn.execute("""
+        SELECT id FROM documents WHERE archived = 1 AND root = ? AND filename = ?
+        ORDER BY id DESC LIMIT 1
+    """, (root, filename)).fetchone()
+    if own:
+        conn.close()
+    return row[0] if row else None
+
+
+# ---------------------------------------------------------------------------
+# Writer ops
+# ---------------------------------------------------------------------------
+
+def _mark_archived(cur, doc_id, members, when):
+    cur.executemany("""
+        INSERT OR REPLACE INTO archive_members (doc_id, kind, pack, offset, length, size, codec)
+        VALUES (?, ?, ?, ?, ?, ?, 'zlib')
+    """, [(doc_id, kind, *member) for kind, member in members.items()])
+    cur.execute("UPDATE documents SET archived = 1, archived_at = ? WHERE id = ?", (when, doc_id))
+    # Same spot may fill with a new file later; the sync must see it as new
+    row = cur.execute("SELECT root, filename FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    cur.execute("DELETE FROM sync_manifest WHERE root = ? AND filename = ?", row)
+
+def _mark_restored(cur, doc_id):
+    root, filename = cur.execute("SELECT root, filename FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    if cur.execute("SELECT 1 FROM documents WHERE archived = 0 AND root = ? AND filename = ?", (root, filename)).fetchone():
+        raise ValueError(f"{root}/{filename} is already taken by a live document")
+    cur.execute("UPDATE documents SET archived = 0, archived_at = NULL WHERE id = ?", (doc_id,))
+    cur.execute("DELETE FROM archive_members WHERE doc_id = ?", (doc_id,))
+
+
+# ---------------------------------------------------------------------------
+# Archive / restore
+# ---------------------------------------------------------------------------
+
+def candidates(older_than_days=None, ids=None, flagged=False, limit=None):
+    # Rows to move into packs: by id, by age, or already flagged archived but still on disk
+    where, params = [], []
+    if ids:
+        where.append(f"id IN ({','.join('?' * len(ids))})")
+        params.extend(ids)
+    if older_than_days is not None:
+        where.append("date_added < ?")
+        params.append(datetime.fromtimestamp(time.time() - older_than_days * 86400).isoformat())
+    if flagged:
+        where.append("archived = 1 AND archived_at IS NULL")
+    else:
+        where.append("archived = 0")
+    conn = connect()
+    rows = conn.execute(f"""
+        SELECT id, root, filename, hash FROM documents WHERE {" AND ".join(where)} ORDER BY id
+        {"LIMIT ?" if limit else ""}
+    """, (*params, *([limit] if limit else []))).fetchall()
+    conn.close()
+    return rows
+
+def archive_documents(rows, dry_run=False):
+    writer = PackWriter()
+    archived, bytes_in, bytes_out = 0, 0, 0
+    try:
+        for doc_id, root, filename, file_hash in rows:
+            path = root_file(root, filename)
+            if not path or not os.path.isfile(path):
+                print(f"⚠️ Not on disk, skipping: {root}/{filename}")
+                continue
+            if dry_run:
+                archived += 1
+                bytes_in += os.path.getsize(path)
+                continue
+
+            header = {"doc_id": doc_id, "root": root, "filename": filename, "hash": file_hash}
+            members = {"file": writer.add(path, dict(header, kind="file"))}
+            thumb_path, preview_path = thumbnail_paths(file_hash) if file_hash else ("", "")
+            if thumb_path and os.path.exists(thumb_path):
+                members["thumb"] = writer.add(thumb_path, dict(header, kind="thumb"))
+            writer.sync()
+            get_writer().call(_mark_archived, doc_id, members,
+                              datetime.now().isoformat())
+
+            # Only now that the index is committed do the originals go
+            for leftover in (path, thumb_path, preview_path):
+                if leftover and os.path.exists(leftover):
+                    os.remove(leftover)
+            archived += 1
+            bytes_in += sum(m[3] for m in members.values())
+            bytes_out += sum(m[2] for m in members.values())
+            inc("archived_documents_total")
+            print(f"🧊 Archived {root}/{filename} → {members['file'][0]}")
+    finally:
+        writer.close()
+    return archived, bytes_in, bytes_out
+
+def restore_document(doc_id):
+    # Writes the file back where it was and makes the row live again
+    conn = connect()
+    row = conn.execute("SELECT root, filename, hash FROM documents WHERE id = ? AND archived = 1", (doc_id,)).fetchone()
+    member = find_member(doc_id, conn=conn)
+    thumb = find_member(doc_id, "thumb", conn=conn)
+    conn.close()
+    if row is None or member is None:
+        raise ValueError(f"Document {doc_id} is not in the archive")
+    root, filename, file_hash = row
+    path = root_file(root, filename)
+    if path is None:
+        raise ValueError(f"Watch root '{root}' is not configured here")
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+
+    if thumb is not None and file_hash:
+        _extract_to(thumb, thumbnail_paths(file_hash)[0])
+    tmp = _extract_to(member, f"{path}.{os.getpid()}.restore")
+    try:
+        # Row first, then the file appears; the watcher then finds it indexed and unchanged
+        get_writer().call(_mark_restored, doc_id)
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return path
+
+def _extract_to(member, path):
+    pack, offset, length, size, codec = member
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        for block in read_member(pack, offset, length, codec):
+            f.write(block)
+    return path
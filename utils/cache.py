@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import sqlite3
+from dotenv import load_dotenv
+from utils.metrics import inc
+
+load_dotenv()
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache.db")
+GPT_CACHE_MAX_ENTRIES = int(os.getenv("GPT_CACHE_MAX_ENTRIES", 50000))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 200000))
+
+def _connect():
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS gpt_cache (
+        hash TEXT NOT NULL,
+        version TEXT NOT NULL,
+        result TEXT NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (hash, version)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gpt_cache_last_used ON gpt_cache(last_used)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ocr_cache (
+        page_hash TEXT PRIMARY KEY,
+        text TEXT NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS file_fingerprints (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        hash TEXT NOT NULL
+    )
+    """)
+    return conn
+
+def get_cached_summary(file_hash, version):
+    if not file_hash:
+        return None
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT result FROM gpt_cache WHERE hash = ? AND version = ?", (file_hash, version)
+        ).fetchone()
+        if row:
+            # 🕒 Touch the entry so LRU eviction keeps it around
+            conn.execute(
+                "UPDATE gpt_cache SET last_used = ? WHERE hash = ? AND version = ?",
+                (time.time(), file_hash, version)
+            )
+            conn.commit()
+        conn.close()
+        inc("cache_requests_total", cache="gpt", result="hit" if row else "miss")
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"❌ GPT cache lookup failed: {e}")
+        return None
+
+def store_summary(file_hash, version, result):
+    if not file_hash:
+        return
+    try:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO gpt_cache (hash, version, result, last_used) VALUES (?, ?, ?, ?)",
+            (file_hash, version, json.dumps(result), time.time())
+        )
+        # 🧹 Drop least-recently-used entries beyond the size bound
+        conn.execute("""
+            DELETE FROM gpt_cache WHERE rowid IN (
+                SELECT rowid FROM gpt_cache ORDER BY last_used ASC
+                LIMIT max(0, (SELECT COUNT(*) FROM gpt_cache) - ?)
+            )
+        """, (GPT_CACHE_MAX_ENTRIES,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"❌ GPT cache write failed: {e}")
+
+def get_cached_ocr(page_hashes):
+    if not page_hashes:
+        return {}
+    try:
+        conn = _connect()
+        marks = ",".join("?" * len(page_hashes))
+        rows = conn.execute(
+            f"SELECT page_hash, text FROM ocr_cache WHERE page_hash IN ({marks})", list(page_hashes)
+        ).fetchall()
+        if rows:
+            conn.executemany(
+                "UPDATE ocr_cache SET last_used = ? WHERE page_hash = ?",
+                [(time.time(), row[0]) for row in rows]
+            )
+            conn.commit()
+        conn.close()
+        inc("cache_requests_total", len(rows), cache="ocr", result="hit")
+        inc("cache_requests_total", len(page_hashes) - len(rows), cache="ocr", result="miss")
+        return dict(rows)
+    except Exception as e:
+        print(f"❌ OCR cache lookup failed: {e}")
+        return {}
+
+def store_ocr(results):
+    if not results:
+        return
+    try:
+        conn = _connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO ocr_cache (page_hash, text, last_used) VALUES (?, ?, ?)",
+            [(page_hash, text, now) for page_hash, text in results.items()]
+        )
+        conn.execute("""
+            DELETE FROM ocr_cache WHERE rowid IN (
+                SELECT rowid FROM ocr_cache ORDER BY last_used ASC
+                LIMIT max(0, (SELECT COUNT(*) FROM ocr_cache) - ?)
+            )
+        """, (OCR_CACHE_MAX_ENTRIES,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"❌ OCR cache write failed: {e}")
+
+def lookup_fingerprint(filepath, st):
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT hash FROM file_fingerprints WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            (os.path.abspath(filepath), st.st_size, st.st_mtime_ns, st.st_ino)
+        ).fetchone()
+        conn.close()
+        inc("cache_requests_total", cache="fingerprint", result="hit" if row else "miss")
+        return row[0] if row else None
+    except Exception as e:
+        print(f"❌ Fingerprint lookup failed for {filepath}: {e}")
+        return None
+
+def store_fingerprint(filepath, st, file_hash):
+    try:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO file_fingerprints (path, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(filepath), st.st_size, st.st_mtime_ns, st.st_ino, file_hash)
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"❌ Fingerprint write failed for {filepath}: {e}")
+
+def rename_fingerprint(old_path, new_path):
+    # A rename keeps size, mtime and inode, so the stored hash stays valid
+    try:
+        conn = _connect()
+        conn.execute("DELETE FROM file_fingerprints WHERE path = ?", (os.path.abspath(new_path),))
+        conn.execute(
+            "UPDATE file_fingerprints SET path = ? WHERE path = ?",
+            (os.path.abspath(new_path), os.path.abspath(old_path))
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"❌ Fingerprint rename failed for {old_path}: {e}")
@@ -0,0 +1,309 @@
+import os
+import re
+import copy
+import json
+import time
+import zlib
+import threading
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+from utils.db import DB_PATH, connect
+from utils.metrics import inc, set_gauge
+
+load_dotenv()
+CLASSIFIER_ENABLED = os.getenv("CLASSIFIER_ENABLED", "1") == "1"
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", 0.95))    # both labels must be this sure
+CLASSIFIER_MIN_DOCS = int(os.getenv("CLASSIFIER_MIN_DOCS", 200))         # no shortcuts until trained on this many
+CLASSIFIER_MIN_SUPPORT = int(os.getenv("CLASSIFIER_MIN_SUPPORT", 5))     # a label seen fewer times is never predicted
+CLASSIFIER_MIN_COVERAGE = float(os.getenv("CLASSIFIER_MIN_COVERAGE", 0.6))  # share of the text in known vocabulary
+CLASSIFIER_RETRAIN_SECONDS = float(os.getenv("CLASSIFIER_RETRAIN_SECONDS", 600))
+CLASSIFIER_DIM = 1 << 14
+CLASSIFIER_PATH = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "classifier.npz")
+CLASSIFIER_VERSION = "nb1"
+
+# Each document counts as this many "words" whatever its length; naive Bayes is
+# wildly overconfident on long texts otherwise
+FEATURE_MASS = 10.0
+ALPHA = 0.1
+LABELS = ("category", "keyword")
+_WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def features(text):
+    # → (bucket indices, weights): hashed log counts, scaled to a fixed total
+    counts = Counter(zlib.crc32(w.encode("utf-8")) % CLASSIFIER_DIM for w in _WORD.findall(text.lower()))
+    if not counts:
+        return None
+    idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    weights = np.log1p(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    return idx, weights * (FEATURE_MASS / weights.sum())
+
+
+class NaiveBayes:
+    # Multinomial NB over hashed features — training only ever adds counts, so it's incremental by nature
+    def __init__(self):
+        self.classes = []
+        self.index = {}
+        self.counts = np.zeros((0, CLASSIFIER_DIM), dtype=np.float32)
+        self.docs = np.zeros(0, dtype=np.int64)
+        self._compiled = None
+
+    def add(self, label, idx, weights):
+        row = self.index.get(label)
+        if row is None:
+            row = self.index[label] = len(self.classes)
+            self.classes.append(label)
+            if row == len(self.counts):
+                # Grow by doubling; keyword labels can run into the hundreds
+                grown = max(8, 2 * row)
+                self.counts = np.vstack([self.counts, np.zeros((grown - row, CLASSIFIER_DIM), dtype=np.float32)])
+                self.docs = np.concatenate([self.docs, np.zeros(grown - row, dtype=np.int64)])
+        np.add.at(self.counts[row], idx, weights)
+        self.docs[row] += 1
+        self._compiled = None
+
+    def compile(self):
+        # Log-probabilities for the labels seen often enough to trust
+        eligible = np.nonzero(self.docs[:len(self.classes)] >= CLASSIFIER_MIN_SUPPORT)[0]
+        if not len(eligible):
+            self._compiled = (eligible, None, None, None)
+            return
+        counts = self.counts[eligible].astype(np.float64)
+        known = counts.sum(axis=0) > 0
+        counts += ALPHA
+        log_theta = np.log(counts / counts.sum(axis=1, keepdims=True)).astype(np.float32)
+        log_prior = np.log(self.docs[eligible] / self.docs[eligible].sum())
+        self._compiled = (eligible, log_prior, log_theta, known)
+
+    def predict(self, idx, weights):
+        # → (label, probability), or (None, 0.0) when nothing is trained yet
+        if self._compiled is None:
+            self.compile()
+        eligible, log_prior, log_theta, known = self._compiled
+        if log_theta is None:
+            return None, 0.0
+        # Text mostly made of words never seen in training: the smoothing alone would pick a winner
+        if weights[known[idx]].sum() < CLASSIFIER_MIN_COVERAGE * weights.sum():
+            return None, 0.0
+        scores = log_prior + log_theta[:, idx] @ weights
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return self.classes[eligible[best]], float(probs[best])
+
+
+class LocalClassifier:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.models = {label: NaiveBayes() for label in LABELS}
+        self.trained_docs = 0
+        self.last_id = 0        # new documents are picked up past this id
+        self.last_seq = 0       # change feed position as of the last training pass
+        self.marks = {}         # doc id → mark of the labels and content it was trained on
+
+    def train(self, rows):
+        for doc_id, category, keyword, file_hash, body in rows:
+            feats = features(body or "")
+            if feats is None:
+                continue
+            self.models["category"].add(category, *feats)
+            self.models["keyword"].add(keyword, *feats)
+            self.marks[doc_id] = _mark(category, keyword, file_hash)
+            self.trained_docs += 1
+
+    def predict(self, text):
+        feats = features(text)
+        if feats is None or self.trained_docs < CLASSIFIER_MIN_DOCS:
+            return None
+        return {label: model.predict(*feats) for label, model in self.models.items()}
+
+    def save(self, path=CLASSIFIER_PATH):
+        arrays = {"meta": np.array(json.dumps({
+            "version": CLASSIFIER_VERSION, "dim": CLASSIFIER_DIM,
+            "trained_docs": self.trained_docs, "last_id": self.last_id, "last_seq": self.last_seq,
+            "classes": {label: model.classes for label, model in self.models.items()},
+        }))}
+        arrays["trained_ids"] = np.fromiter(self.marks.keys(), dtype=np.int64, count=len(self.marks))
+        arrays["trained_marks"] = np.fromiter(self.marks.values(), dtype=np.uint32, count=len(self.marks))
+        for label, model in self.models.items():
+            arrays[f"{label}_counts"] = model.counts[:len(model.classes)]
+            arrays[f"{label}_docs"] = model.docs[:len(model.classes)]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CLASSIFIER_PATH):
+        clf = cls()
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta["version"] != CLASSIFIER_VERSION or meta["dim"] != CLASSIFIER_DIM:
+                    return clf          # different features; start over
+                for label, model in clf.models.items():
+                    model.classes = meta["classes"][label]
+                    model.index = {c: i for i, c in enumerate(model.classes)}
+                    model.counts = data[f"{label}_counts"]
+                    model.docs = data[f"{label}_docs"]
+                clf.trained_docs, clf.last_id = meta["trained_docs"], meta["last_id"]
+                clf.last_seq = meta["last_seq"]
+                clf.marks = dict(zip(data["trained_ids"].tolist(), data["trained_marks"].tolist()))
+        except (OSError, KeyError, ValueError):
+            return cls()                # missing, or saved without per-document marks; start over
+        return clf
+
+
+# ---------------------------------------------------------------------------
+# Training from the catalog — only GPT-labelled originals, so the classifier
+# never learns from its own guesses or from copied near-duplicate labels
+# ---------------------------------------------------------------------------
+
+_TRAINABLE = """
+    d.duplicate_of IS NULL AND f.body != ''
+    AND (d.summary_version IS NULL OR d.summary_version NOT LIKE 'local:%')
+    AND d.category != '' AND d.keyword != ''
+"""
+
+def _mark(category, keyword, file_hash):
+    return zlib.crc32(f"{category}\x1f{keyword}\x1f{file_hash or ''}".encode("utf-8"))
+
+def _training_rows(conn, after, limit=1000):
+    return conn.execute(f"""
+        SELECT d.id, d.category, d.keyword, d.hash, f.body
+        FROM documents d JOIN documents_fts f ON f.rowid = d.id
+        WHERE d.id > ? AND {_TRAINABLE}
+        ORDER BY d.id LIMIT ?
+    """, (after, limit)).fetchall()
+
+def _review(clf, conn, batch=500):
+    # → (stale, late rows). Counts can't be taken back out of naive Bayes, so a trained
+    # document whose labels or content changed, or that went away, means starting over.
+    # Renames, archiving and identical re-ingests leave the mark as it was; a document
+    # that only became trainable after its id was passed is simply added.
+    if not clf.last_id:
+        return False, []
+    first = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+    if first is not None and first > clf.last_seq + 1:
+        return True, []         # feed pruned past us; can't tell what changed
+    changed = [row[0] for row in conn.execute(
+        "SELECT DISTINCT doc_id FROM changes WHERE seq > ? AND doc_id <= ? AND op != 'insert'",
+        (clf.last_seq, clf.last_id)
+    )]
+    late = []
+    for start in range(0, len(changed), batch):
+        ids = changed[start:start + batch]
+        current = {row[0]: row for row in conn.execute(f"""
+            SELECT d.id, d.category, d.keyword, d.hash, f.body
+            FROM documents d JOIN documents_fts f ON f.rowid = d.id
+            WHERE d.id IN ({",".join("?" * len(ids))}) AND {_TRAINABLE}
+        """, ids)}
+        for doc_id in ids:
+            row = current.get(doc_id)
+            if doc_id in clf.marks:
+                if row is None or _mark(*row[1:4]) != clf.marks[doc_id]:
+                    return True, []
+            elif row is not None:
+                late.append(row)
+    return False, late
+
+def train(clf, conn=None):
+    # New documents are added by id; changes to ones already learned rebuild from scratch.
+    # Returns how many documents were added.
+    own = conn is None
+    conn = conn or connect()
+    added = 0
+    try:
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        stale, late = _review(clf, conn)
+        if stale:
+            print("🏷 Trained documents changed since the last pass, rebuilding the classifier")
+            clf.reset()
+        before = clf.trained_docs
+        clf.train(late)
+        added += clf.trained_docs - before
+        while True:
+            rows = _training_rows(conn, clf.last_id)
+            if not rows:
+                break
+            before = clf.trained_docs
+            clf.train(rows)
+            added += clf.trained_docs - before
+            clf.last_id = rows[-1][0]
+        clf.last_seq = seq
+    finally:
+        if own:
+            conn.close()
+    return added
+
+_clf = None
+_clf_pid = None
+_clf_lock = threading.Lock()
+
+def _retrain_forever():
+    global _clf
+    while True:
+        time.sleep(CLASSIFIER_RETRAIN_SECONDS)
+        try:
+            # Train a copy so predictions never see a half-updated model; another
+            # process may have saved a newer one in the meantime
+            fresh = LocalClassifier.load()
+            if fresh.last_id < _clf.last_id:
+                fresh = copy.deepcopy(_clf)
+            added = train(fresh)
+            if added:
+                fresh.save()
+                print(f"🏷 Classifier retrained: +{added} documents ({fresh.trained_docs} total)")
+            _clf = fresh
+            set_gauge("classifier_trained_docs", fresh.trained_docs)
+        except Exception as e:
+            print(f"⚠️ Classifier retrain failed: {e}")
+
+def get_classifier():
+    global _clf, _clf_pid
+    if _clf_pid == os.getpid():
+        return _clf
+    with _clf_lock:
+        if _clf_pid != os.getpid():
+            clf = LocalClassifier.load()
+            if train(clf):
+                clf.save()
+            _clf = clf
+            _clf_pid = os.getpid()
+            set_gauge("classifier_trained_docs", clf.trained_docs)
+            threading.Thread(target=_retrain_forever, name="classifier-retrain", daemon=True).start()
+    return _clf
+
+def _lead(text, limit=400):
+    # Opening of the document as a stand-in summary; routine documents say what they are up front
+    flat = " ".join(text.split())
+    if len(flat) <= limit:
+        return flat
+    cut = flat.rfind(". ", 0, limit)
+    return flat[:cut + 1] if cut > limit // 2 else flat[:limit].rsplit(" ", 1)[0] + "…"
+
+def classify_locally(text):
+    # → a GPT-shaped result dict when the classifier is sure of both labels, else None
+    if not CLASSIFIER_ENABLED or not text.strip():
+        return None
+    predicted = get_classifier().predict(text)
+    if predicted is None:
+        return None
+    (category, p_category), (keyword, p_keyword) = predicted["category"], predicted["keyword"]
+    if category is None or keyword is None or min(p_category, p_keyword) < CLASSIFIER_THRESHOLD:
+        inc("classifier_predictions_total", result="deferred")
+        return None
+
+    inc("classifier_predictions_total", result="used")
+    inc("gpt_calls_saved_total", reason="classifier")
+    title = next((line.strip() for line in text.splitlines() if line.strip()), keyword)
+    return {
+        "common_name": title[:80],
+        "summary": _lead(text),
+        "keyword": keyword,
+        "category": category,
+        "confidence": round(min(p_category, p_keyword), 4),
+    }
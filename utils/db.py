@@ -0,0 +1,424 @@
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from utils.metrics import inc, observe
+
+load_dotenv()
+DB_PATH = os.getenv("DB_PATH", "database.db")
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", 200))
+WRITER_MAX_DELAY = float(os.getenv("WRITER_MAX_DELAY", 0.05))
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")    # ✅ readers never block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Migrations — append new steps to MIGRATIONS, never edit an applied one
+# ---------------------------------------------------------------------------
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _m001_documents(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT,
+        common_name TEXT,
+        summary TEXT,
+        keyword TEXT,
+        file_size INTEGER,
+        category TEXT,
+        hash TEXT,
+        archived BOOLEAN DEFAULT 0,
+        thumbnail_path TEXT,
+        preview_path TEXT,
+        date_added TEXT
+    )
+    """)
+
+def _m002_archived(conn):
+    # Databases created before the archive flag existed (formerly altdocs.py)
+    if "archived" not in _columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN archived INTEGER DEFAULT 0")
+
+def _m003_indexes(conn):
+    # Older builds could store the same filename twice; keep the newest row
+    conn.execute("""
+        DELETE FROM documents WHERE id NOT IN (
+            SELECT MAX(id) FROM documents GROUP BY filename
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(hash, filename)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_listing ON documents(archived, date_added DESC)")
+
+def _m004_sync_manifest(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_manifest (
+        filename TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    )
+    """)
+
+def _m005_search(conn):
+    # Keyset pagination walks (date_added, id) so pages never use OFFSET
+    conn.execute("DROP INDEX IF EXISTS idx_documents_listing")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_listing ON documents(archived, date_added DESC, id DESC)")
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        common_name, summary, keyword, category, body,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """)
+    conn.execute("""
+        INSERT INTO documents_fts (rowid, common_name, summary, keyword, category, body)
+        SELECT id, common_name, summary, keyword, category, '' FROM documents
+    """)
+    # Deletes can come from the watcher, the sync or by hand — catch them all here
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM documents_fts WHERE rowid = old.id;
+    END
+    """)
+
+def _m006_changes(conn):
+    # 📰 Append-only change feed; seq only ever grows so clients can resume from it
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        doc_id INTEGER NOT NULL,
+        filename TEXT,
+        op TEXT NOT NULL,
+        ts TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    )
+    """)
+    for op, event, ref in (("insert", "INSERT", "new"), ("update", "UPDATE", "new"), ("delete", "DELETE", "old")):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS documents_changes_{op} AFTER {event} ON documents BEGIN
+            INSERT INTO changes (doc_id, filename, op) VALUES ({ref}.id, {ref}.filename, '{op}');
+        END
+        """)
+
+def _m007_roots(conn):
+    # 🌳 Several watch roots share one catalog: filenames are relative to their root
+    if "root" not in _columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN root TEXT NOT NULL DEFAULT 'default'")
+    conn.execute("DROP INDEX IF EXISTS idx_documents_filename")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_root_filename ON documents(root, filename)")
+
+    conn.execute("ALTER TABLE sync_manifest RENAME TO sync_manifest_old")
+    conn.execute("""
+    CREATE TABLE sync_manifest (
+        root TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        PRIMARY KEY (root, filename)
+    )
+    """)
+    conn.execute("""
+        INSERT INTO sync_manifest (root, filename, size, mtime_ns)
+        SELECT 'default', filename, size, mtime_ns FROM sync_manifest_old
+    """)
+    conn.execute("DROP TABLE sync_manifest_old")
+
+def _m008_jobs(conn):
+    # 📬 Durable work queue: survives crashes, shared by every worker process
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT NOT NULL,
+        source TEXT NOT NULL DEFAULT 'watcher',
+        state TEXT NOT NULL DEFAULT 'pending',     -- pending, running, done, failed (will retry), dead
+        attempts INTEGER NOT NULL DEFAULT 0,
+        not_before REAL NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires REAL,
+        outcome TEXT,
+        last_error TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    )
+    """)
+    # One waiting job per path, so bursts of events coalesce into it
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_waiting_path ON jobs(path) WHERE state IN ('pending', 'failed')")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(state, not_before, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(state, lease_expires)")
+
+def _m009_text_store(conn):
+    # 🗜 Extracted text kept compressed by content hash, so prompts/models can change
+    # without re-running PyMuPDF and Tesseract over everything
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS texts (
+        hash TEXT PRIMARY KEY,
+        extractor_version TEXT NOT NULL,
+        codec TEXT NOT NULL,
+        chars INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        created TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    )
+    """)
+    # Which model:prompt produced each summary; NULL = from before we tracked it
+    if "summary_version" not in _columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN summary_version TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_summary_version ON documents(summary_version, id)")
+
+def _m010_near_duplicates(conn):
+    # 🪞 MinHash signatures plus LSH band buckets, so a lookup only compares documents sharing a bucket
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS minhash (
+        doc_id INTEGER PRIMARY KEY,
+        sig BLOB NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS lsh_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        doc_id INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bands_bucket ON lsh_bands(band, bucket)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bands_doc ON lsh_bands(doc_id)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS documents_minhash_delete AFTER DELETE ON documents BEGIN
+        DELETE FROM minhash WHERE doc_id = old.id;
+        DELETE FROM lsh_bands WHERE doc_id = old.id;
+    END
+    """)
+    # The row whose metadata a near-duplicate reused
+    if "duplicate_of" not in _columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN duplicate_of INTEGER")
+
+def _m011_vector_stats(conn):
+    # 🧭 Document frequencies and doc count behind the related-documents vectors (the matrix itself is a file)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS vector_stats (
+        dim INTEGER PRIMARY KEY,
+        docs INTEGER NOT NULL,
+        df BLOB NOT NULL,
+        seq INTEGER NOT NULL
+    )
+    """)
+
+def _m012_archive(conn):
+    # 🧊 Cold tier: archived files sit in compressed packs; this is the offset index into them
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archive_members (
+        doc_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        pack TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        codec TEXT NOT NULL,
+        PRIMARY KEY (doc_id, kind)
+    )
+    """)
+    if "archived_at" not in _columns(conn, "documents"):
+        conn.execute("ALTER TABLE documents ADD COLUMN archived_at TEXT")
+    conn.execute("UPDATE documents SET archived = 0 WHERE archived IS NULL")
+    # Live rows only, so these stay the size of the hot set however big the archive gets.
+    # A name is unique among live rows; archived rows keep theirs for open_file.
+    conn.execute("DROP INDEX IF EXISTS idx_documents_root_filename")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_live_file ON documents(root, filename) WHERE archived = 0")
+    conn.execute("DROP INDEX IF EXISTS idx_documents_listing")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_documents_live_listing ON documents(date_added DESC, id DESC) WHERE archived = 0"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_archived ON documents(root, filename) WHERE archived = 1")
+    # Flagged before packs existed (archived_at unset): still on disk until archive.py --flagged packs them
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_documents_unpacked ON documents(root, filename) "
+        "WHERE archived = 1 AND archived_at IS NULL"
+    )
+
+def _m013_manifest_backfill(conn):
+    # Rows indexed before the manifest, or by watcher/job runs that never recorded one.
+    # The next sync trusts these markers once and stores the real stat; after that a
+    # row without a manifest entry is re-checked instead of trusted.
+    conn.execute("""
+        INSERT OR IGNORE INTO sync_manifest (root, filename, size, mtime_ns)
+        SELECT root, filename, -1, -1 FROM documents WHERE archived = 0 OR archived_at IS NULL
+    """)
+
+def _m014_vector_terms(conn):
+    # Term counts behind each vector row, so the stats can be kept in step without reading
+    # the matrix file. Stats start over; build_vectors.py refills rows indexed before this.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS vector_terms (
+        doc_id INTEGER PRIMARY KEY,
+        counts BLOB NOT NULL
+    )
+    """)
+    conn.execute("DELETE FROM vector_stats")
+
+def _m015_own_renames(conn):
+    # 🏷 Paths our own rename_file touched, so watchers in every process can ignore the echo events
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS own_renames (
+        path TEXT PRIMARY KEY,
+        expires REAL NOT NULL
+    )
+    """)
+
+MIGRATIONS = [
+    (1, "create documents table", _m001_documents),
+    (2, "add archived column", _m002_archived),
+    (3, "filename/hash/listing indexes", _m003_indexes),
+    (4, "sync manifest", _m004_sync_manifest),
+    (5, "keyset listing index and FTS5 search", _m005_search),
+    (6, "change feed", _m006_changes),
+    (7, "watch roots", _m007_roots),
+    (8, "job queue", _m008_jobs),
+    (9, "extracted text store", _m009_text_store),
+    (10, "near-duplicate index", _m010_near_duplicates),
+    (11, "related documents vectors", _m011_vector_stats),
+    (12, "cold-tier archive", _m012_archive),
+    (13, "sync manifest backfill", _m013_manifest_backfill),
+    (14, "vector term counts", _m014_vector_terms),
+    (15, "own rename markers", _m015_own_renames),
+]
+
+def migrate(path=DB_PATH):
+    conn = connect(path)
+    conn.isolation_level = None
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+            print(f"🧱 Applied migration {version}: {name}")
+        except Exception:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+    conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Single writer — every insert/update/delete goes through one connection that
+# groups concurrent callers into one transaction per batch
+# ---------------------------------------------------------------------------
+
+_STOP = object()
+_op = threading.local()
+
+def after_commit(fn, *args):
+    # From inside a writer op: run fn once the batch has committed; dropped if the op rolls back
+    _op.hooks.append((fn, args))
+
+class DBWriter:
+    def __init__(self, path=DB_PATH, batch_size=WRITER_BATCH_SIZE, max_delay=WRITER_MAX_DELAY):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.queue.put((fn, args, future))
+        return future
+
+    def call(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = connect(self.path)
+        conn.isolation_level = None
+        cur = conn.cursor()
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            results, hooks = [], []
+            started = time.perf_counter()
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                for fn, args, future in batch:
+                    # A savepoint per op so one bad write doesn't sink the batch
+                    cur.execute("SAVEPOINT op")
+                    _op.hooks = []
+                    try:
+                        results.append((future, fn(cur, *args), None))
+                        cur.execute("RELEASE op")
+                        hooks.extend(_op.hooks)
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO op")
+                        cur.execute("RELEASE op")
+                        results.append((future, None, e))
+                cur.execute("COMMIT")
+                observe("db_batch_seconds", time.perf_counter() - started)
+                inc("db_ops_total", len(batch))
+            except Exception as e:
+                if conn.in_transaction:
+                    cur.execute("ROLLBACK")
+                results = [(future, None, e) for _, _, future in batch]
+                hooks = []
+
+            # Before the futures resolve, so a caller sees the side effects of its own write
+            for fn, args in hooks:
+                try:
+                    fn(*args)
+                except Exception as e:
+                    print(f"❌ After-commit hook {getattr(fn, '__name__', fn)} failed: {e}")
+
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+        conn.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DBWriter()
+            atexit.register(_writer.close)
+        return _writer
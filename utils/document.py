@@ -0,0 +1,97 @@
+import os
+import hashlib
+from dotenv import load_dotenv
+from utils.cache import store_fingerprint
+from utils.extractors import extract_text
+from utils.formats import is_streamable
+from utils.textstore import get_text
+from utils.metrics import span
+
+load_dotenv()
+PREVIEW_LINE_COUNT = 25
+MAX_INMEMORY_BYTES = int(os.getenv("MAX_INMEMORY_BYTES", 32 * 1024 * 1024))    # per pool worker, so keep it small
+# Characters extracted per document. GPT only ever sees the first 3000; the rest is the
+# search body, and feeds the near-duplicate signature, the related-documents vector and
+# the local classifier. ~200k covers a long contract or report in full.
+TEXT_BUDGET = int(os.getenv("TEXT_BUDGET", 200000))
+STREAM_TEXT_THRESHOLD = int(os.getenv("STREAM_TEXT_THRESHOLD", 8 * 1024 * 1024))
+
+class ParsedDocument:
+    # One read of the file feeds the digest, the text, the preview and the page handles.
+    # Everything is parsed lazily and cached, so each consumer pays at most once.
+
+    def __init__(self, path, data, digest, size, budget=TEXT_BUDGET):
+        self.path = path
+        self.budget = budget
+        self.filename = os.path.basename(path)
+        self.ext = os.path.splitext(path)[1].lower()
+        self.size = size
+        self.digest = digest
+        self.data = data
+        self.thumbnail = ("", "")
+        self._text = None
+        self.text_source = None
+        self._pdf = None
+
+    @classmethod
+    def load(cls, path, budget=TEXT_BUDGET):
+        st = os.stat(path)
+        streamable = is_streamable(path) and st.st_size > STREAM_TEXT_THRESHOLD
+        if streamable or st.st_size > MAX_INMEMORY_BYTES:
+            # 🐘 Too big to hold: stream the hash and let parsers read from the path
+            from utils.file_ops import hash_file
+            return cls(path, None, hash_file(path), st.st_size, budget)
+
+        with span("read_hash"):
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+        after = os.stat(path)
+        if (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+            store_fingerprint(path, st, digest)
+        return cls(path, data, digest, len(data), budget)
+
+    @property
+    def pdf(self):
+        if self.ext != ".pdf":
+            return None
+        if self._pdf is None:
+            import fitz  # PyMuPDF
+            if self.data is not None:
+                self._pdf = fitz.open(stream=self.data, filetype="pdf")
+            else:
+                self._pdf = fitz.open(self.path)
+        return self._pdf
+
+    @property
+    def pages(self):
+        return list(self.pdf) if self.pdf is not None else []
+
+    @property
+    def text(self):
+        if self._text is None:
+            # Extracted before (by this extractor version)? Then skip the parsers and OCR
+            stored = get_text(self.digest)
+            if stored is not None:
+                self._text, self.text_source = stored[:self.budget], "store"
+            else:
+                self._text, self.text_source = extract_text(self, self.budget), "extracted"
+        return self._text
+
+    def preview_lines(self, n=PREVIEW_LINE_COUNT):
+        lines = [line for line in self.text.strip().splitlines() if line.strip()]
+        return lines[:n]
+
+    def close(self):
+        # Keep digest/text/preview, drop the heavy parts
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        self.data = None
+
+    def __getstate__(self):
+        # Crossing the process pool: only ship what later stages need
+        state = self.__dict__.copy()
+        state["_pdf"] = None
+        state["data"] = None
+        return state
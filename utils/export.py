@@ -0,0 +1,194 @@
+import os
+import csv
+import io
+import tempfile
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from utils.db import connect
+from utils.metrics import inc
+
+load_dotenv()
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 5000))
+FORMATS = ("csv", "xlsx", "parquet")
+ARCHIVED_STATES = ("live", "archived", "all")
+XLSX_MAX_ROWS = 1048576
+XLSX_TOO_MANY_ROWS = "Too many rows for one XLSX sheet; narrow the filters or use csv/parquet"
+
+# Catalog columns only; thumbnail/preview paths are local to this machine
+COLUMNS = (
+    "id", "root", "filename", "common_name", "summary", "keyword", "category",
+    "file_size", "hash", "date_added", "archived", "archived_at", "duplicate_of", "summary_version",
+)
+MIMETYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _parse_day(value, end=False):
+    # "2024-05-01" covers that whole day when it ends a range
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            return (day + timedelta(days=1) if end else day).isoformat()
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Not a date: {value!r} (use YYYY-MM-DD)")
+
+def build_query(category=None, since=None, until=None, archived="live", count=False):
+    if archived not in ARCHIVED_STATES:
+        raise ValueError(f"archived must be one of {', '.join(ARCHIVED_STATES)}")
+    where, params = [], []
+    if archived != "all":
+        where.append("archived = ?")
+        params.append(1 if archived == "archived" else 0)
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    since, until = _parse_day(since), _parse_day(until, end=True)
+    if since:
+        where.append("date_added >= ?")
+        params.append(since)
+    if until:
+        where.append("date_added < ?")
+        params.append(until)
+    sql = f"SELECT {'COUNT(*)' if count else ', '.join(COLUMNS)} FROM documents"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return (sql if count else sql + " ORDER BY id"), params
+
+def count_rows(**filters):
+    sql, params = build_query(count=True, **filters)
+    conn = connect()
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+def iter_batches(category=None, since=None, until=None, archived="live", batch=EXPORT_BATCH_ROWS):
+    # One read transaction for the whole export, so it's a consistent snapshot even while
+    # the watcher writes; rows come off the cursor a batch at a time, never all at once
+    sql, params = build_query(category, since, until, archived)
+    conn = connect()
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            inc("export_rows_total", len(rows))
+            yield rows
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Writers — each takes the batch iterator and yields bytes as they're ready
+# ---------------------------------------------------------------------------
+
+def stream_csv(batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM so Excel opens the UTF-8 right
+    buf.write("\ufeff")
+    writer.writerow(COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+class _Drain(io.RawIOBase):
+    # Write-only sink that hands pyarrow's output back to us between batches
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def take(self):
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {"id": pa.int64(), "file_size": pa.int64(), "archived": pa.bool_(), "duplicate_of": pa.int64()}
+    return pa.schema([(name, types.get(name, pa.string())) for name in COLUMNS])
+
+def stream_parquet(batches):
+    # One row group per batch; the footer goes out last
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _arrow_schema()
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in batches:
+            columns = list(zip(*rows))
+            columns[COLUMNS.index("archived")] = [bool(v) if v is not None else None
+                                                  for v in columns[COLUMNS.index("archived")]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+def stream_xlsx(batches):
+    # A workbook is a zip whose directory is only written at close(), so nothing can go out
+    # before the last row. constant_memory flushes each row to a temp file as it's written,
+    # and the finished workbook is then streamed off disk.
+    import xlsxwriter
+    with tempfile.TemporaryDirectory(prefix="export_") as tmp:
+        path = os.path.join(tmp, "export.xlsx")
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tmp,
+                                              "strings_to_numbers": False, "strings_to_formulas": False,
+                                              "strings_to_urls": False})
+        sheet = workbook.add_worksheet("documents")
+        sheet.write_row(0, 0, COLUMNS, workbook.add_format({"bold": True}))
+        sheet.freeze_panes(1, 0)
+        row_num = 1
+        for rows in batches:
+            if row_num + len(rows) > XLSX_MAX_ROWS:
+                # export() counted first; only rows added since then can get here
+                raise ValueError(XLSX_TOO_MANY_ROWS)
+            for row in rows:
+                sheet.write_row(row_num, 0, row)
+                row_num += 1
+        workbook.close()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                yield block
+
+WRITERS = {"csv": stream_csv, "xlsx": stream_xlsx, "parquet": stream_parquet}
+
+def export(fmt, **filters):
+    # → iterator of bytes; filters and the XLSX size limit are checked here, before the
+    # first byte goes out, so the caller can still answer with an error
+    if fmt not in WRITERS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    query_filters = {k: v for k, v in filters.items() if k != "batch"}
+    build_query(**query_filters)
+    if fmt == "xlsx" and count_rows(**query_filters) > XLSX_MAX_ROWS - 1:     # row 1 is the header
+        raise ValueError(XLSX_TOO_MANY_ROWS)
+    inc("exports_total", format=fmt)
+    return WRITERS[fmt](iter_batches(**filters))
@@ -1,85 +1,164 @@
-import os
-import fitz  # PyMuPDF
-from utils.ocr import ocr_image_from_pdf
-from docx import Document
-from pptx import Presentation
-from bs4 import BeautifulSoup  # For HTML parsing
+import io
 from email import policy
+from html.parser import HTMLParser
 from email.parser import BytesParser
+from utils.formats import get_extractor
+from utils.metrics import traced
 
-def extract_text_from_file(filepath):
-    ext = os.path.splitext(filepath)[1].lower()
-
-    if ext in [".txt", ".md", ".log"]:
-        try:
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        except Exception as e:
-            print(f"❌ Failed to read plain text/markdown: {e}")
-            return ""
-
-    elif ext == ".html":
-        try:
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                soup = BeautifulSoup(f, "html.parser")
-                return soup.get_text(separator="\n")
-        except Exception as e:
-            print(f"❌ Failed to read HTML: {e}")
-            return ""
-
-    elif ext == ".eml":
-        try:
-            with open(filepath, "rb") as f:
-                msg = BytesParser(policy=policy.default).parse(f)
-                body = msg.get_body(preferencelist=('plain'))
-                return "\n".join([
-                    f"From: {msg['From']}",
-                    f"To: {msg['To']}",
-                    f"Subject: {msg['Subject']}",
-                    f"Date: {msg['Date']}",
-                    f"\n{body.get_content() if body else '(No plain text body)'}"
-                ])
-        except Exception as e:
-            print(f"❌ Failed to read EML: {e}")
-            return ""
-
-    elif ext == ".pdf":
-        try:
-            doc = fitz.open(filepath)
-            text = "\n".join(page.get_text() for page in doc)
-            if text.strip():
-                return text
-            return ocr_image_from_pdf(filepath)
-        except Exception as e:
-            print(f"❌ PDF extraction failed, falling back to OCR: {e}")
-            return ocr_image_from_pdf(filepath)
-
-    elif ext == ".docx":
-        try:
-            doc = Document(filepath)
-            return "\n".join(p.text for p in doc.paragraphs)
-        except Exception as e:
-            print(f"❌ Failed to read DOCX: {e}")
-            return ""
-
-    elif ext == ".pptx":
-        try:
-            prs = Presentation(filepath)
-            return "\n".join(
-                shape.text for slide in prs.slides for shape in slide.shapes if hasattr(shape, "text")
-            )
-        except Exception as e:
-            print(f"❌ Failed to read PPTX: {e}")
-            return ""
-
-    elif ext in [".json", ".xml", ".rtf"]:
-        try:
-            with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        except Exception as e:
-            print(f"❌ Failed to read structured text: {e}")
-            return ""
+# 🔖 Bump whenever extraction output changes (parsers, OCR settings) so stored text is redone
+EXTRACTOR_VERSION = "1"
+
+def take(pieces, budget, sep="\n"):
+    # 🪣 Pull pieces until the character budget is full, then stop consuming the source
+    if budget is None:
+        return sep.join(pieces)
+    out = []
+    used = 0
+    for piece in pieces:
+        out.append(piece)
+        used += len(piece) + len(sep)
+        if used >= budget:
+            break
+    return sep.join(out)[:budget]
+
+def _text_lines(doc):
+    # Line-bounded reads: from the bytes we already hold, or straight off disk
+    if doc.data is not None:
+        yield from io.TextIOWrapper(io.BytesIO(doc.data), encoding="utf-8", errors="ignore")
+        return
+    with open(doc.path, "r", encoding="utf-8", errors="ignore") as f:
+        yield from f
+
+def _read_text(doc, budget):
+    return take((line.rstrip("\r\n") for line in _text_lines(doc)), budget)
+
+def _binary_source(doc):
+    # Parsers take a file-like object, so reuse the bytes we already read
+    return io.BytesIO(doc.data) if doc.data is not None else doc.path
+
+def _pptx_texts(prs):
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text
+
+def extract_plain(doc, budget=None):
+    # .txt/.md/.log and the structured formats we index as plain text (.json/.xml/.rtf)
+    try:
+        return _read_text(doc, budget)
+    except Exception as e:
+        print(f"❌ Failed to read {doc.ext} as text: {e}")
+        return ""
+
+class _HTMLText(HTMLParser):
+    # Text nodes as the markup is fed in; script/style bodies aren't text (same as bs4's get_text)
+    SKIP = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces = []
+        self.used = 0
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.pieces.append(data)
+            self.used += len(data)
 
+def _text_chunks(doc, size=64 * 1024):
+    # Fixed-size reads rather than lines, so one-line minified markup is still bounded
+    if doc.data is not None:
+        f = io.TextIOWrapper(io.BytesIO(doc.data), encoding="utf-8", errors="ignore")
     else:
-        print(f"⚠️ Unsupported file type: {ext}")
+        f = open(doc.path, "r", encoding="utf-8", errors="ignore")
+    with f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+def extract_html(doc, budget=None):
+    # Parsed incrementally, and the rest of the file is never read once the budget is full
+    try:
+        parser = _HTMLText()
+        for chunk in _text_chunks(doc):
+            parser.feed(chunk)
+            if budget is not None and parser.used >= budget:
+                break
+        parser.close()
+        return take("\n".join(parser.pieces).splitlines(), budget)
+    except Exception as e:
+        print(f"❌ Failed to read HTML: {e}")
+        return ""
+
+def extract_eml(doc, budget=None):
+    try:
+        if doc.data is not None:
+            msg = BytesParser(policy=policy.default).parsebytes(doc.data)
+        else:
+            with open(doc.path, "rb") as f:
+                msg = BytesParser(policy=policy.default).parse(f)
+        body = msg.get_body(preferencelist=('plain'))
+        text = "\n".join([
+            f"From: {msg['From']}",
+            f"To: {msg['To']}",
+            f"Subject: {msg['Subject']}",
+            f"Date: {msg['Date']}",
+            f"\n{body.get_content() if body else '(No plain text body)'}"
+        ])
+        return text[:budget] if budget else text
+    except Exception as e:
+        print(f"❌ Failed to read EML: {e}")
+        return ""
+
+def extract_pdf(doc, budget=None):
+    from utils.ocr import ocr_image_from_pdf, pdf_text_with_ocr
+    try:
+        return pdf_text_with_ocr(doc, budget=budget)
+    except Exception as e:
+        print(f"❌ PDF extraction failed, falling back to OCR: {e}")
+        return ocr_image_from_pdf(doc.path)
+
+def extract_docx(doc, budget=None):
+    try:
+        from docx import Document
+        document = Document(_binary_source(doc))
+        return take((p.text for p in document.paragraphs), budget)
+    except Exception as e:
+        print(f"❌ Failed to read DOCX: {e}")
+        return ""
+
+def extract_pptx(doc, budget=None):
+    try:
+        from pptx import Presentation
+        prs = Presentation(_binary_source(doc))
+        return take(_pptx_texts(prs), budget)
+    except Exception as e:
+        print(f"❌ Failed to read PPTX: {e}")
         return ""
+
+@traced("parse")
+def extract_text(doc, budget=None):
+    # Backends come from the format registry and load on first use
+    extractor = get_extractor(doc.ext)
+    if extractor is None:
+        print(f"⚠️ Unsupported file type: {doc.ext}")
+        return ""
+    return extractor(doc, budget)
+
+def extract_text_from_file(filepath, budget=None):
+    from utils.document import ParsedDocument
+    doc = ParsedDocument.load(filepath, budget=budget)
+    try:
+        return doc.text
+    finally:
+        doc.close()
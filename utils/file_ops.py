@@ -1,113 +1,214 @@
 import os
 import time
 import hashlib
-from pdf2image import convert_from_path
-from PIL import Image, ImageDraw, ImageFont
-from docx import Document
-from bs4 import BeautifulSoup
-from email import policy
-from email.parser import BytesParser
-
-def generate_thumbnail(filepath):
-    ext = os.path.splitext(filepath)[1].lower()
-    filename = os.path.basename(filepath)
-    thumb_path = f"static/thumbnails/thumb_{filename}.jpg"
-    preview_path = f"static/thumbnails/preview_{filename}.jpg"
+import threading
+from utils.cache import lookup_fingerprint, store_fingerprint, rename_fingerprint
+from utils.db import connect, get_writer
+from utils.document import ParsedDocument
+from utils.formats import get_thumbnailer
+from utils.metrics import traced
+
+HASH_BLOCK_SIZE = 1024 * 1024
+THUMB_DIR = "static/thumbnails"
+THUMB_SIZE = (200, 200)
+PREVIEW_DPI = int(os.getenv("PREVIEW_DPI", 150))
+OWN_RENAME_TTL = 30
+
+# Read connection for is_own_rename, one per watcher thread
+_marker_conns = threading.local()
+
+def thumbnail_paths(file_hash):
+    return (
+        f"{THUMB_DIR}/thumb_{file_hash}.jpg",
+        f"{THUMB_DIR}/preview_{file_hash}.jpg",
+    )
+
+def render_text(doc, box=None, dpi=None):
+    from PIL import Image, ImageDraw, ImageFont
+    preview_text = "\n".join(doc.preview_lines()) or "(Empty File)"
+    img = Image.new("RGB", (800, 1000), color="white")
+    draw = ImageDraw.Draw(img)
 
     try:
-        if ext == ".pdf":
-            pages = convert_from_path(filepath, dpi=300, first_page=1, last_page=1)
-            page = pages[0]
+        font = ImageFont.truetype("arial.ttf", size=16)
+    except:
+        font = ImageFont.load_default()
+
+    draw.multiline_text((20, 20), preview_text, fill="black", font=font, spacing=4)
+    if box:
+        img.thumbnail(box)
+    return img
+
+def render_pdf(doc, box=None, dpi=None):
+    # 🎯 Rasterize page 1 straight at the size we need instead of 300 dpi + shrink
+    import fitz  # PyMuPDF
+    from PIL import Image
+    page = doc.pdf[0]
+    if box:
+        zoom = min(box[0] / page.rect.width, box[1] / page.rect.height)
+    else:
+        zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def _save_jpeg(img, path, quality):
+    # Write then rename so a half-written JPEG is never served
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    img.save(tmp_path, "JPEG", quality=quality)
+    os.replace(tmp_path, path)
+
+def _as_document(source):
+    # Accept a ParsedDocument from the pipeline, or load one from a path
+    if isinstance(source, ParsedDocument):
+        return source, False
+    return ParsedDocument.load(source), True
+
+@traced("thumbnail")
+def generate_thumbnail(source, file_hash=None):
+    doc, owned = _as_document(source)
+    thumb_path, preview_path = thumbnail_paths(file_hash or doc.digest)
 
-            small = page.copy()
-            small.thumbnail((200, 200))
-            small.save(thumb_path, "JPEG", quality=85)
-
-            page.save(preview_path, "JPEG", quality=95)
-
-        else:
-            # Extract text content appropriately
-            lines = []
-
-            if ext in [".txt", ".md", ".log", ".json", ".xml", ".rtf"]:
-                with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                    lines = f.read().strip().splitlines()
-
-            elif ext == ".docx":
-                try:
-                    doc = Document(filepath)
-                    lines = [p.text for p in doc.paragraphs if p.text.strip()]
-                except Exception as e:
-                    print(f"❌ Failed to read DOCX for thumbnail: {e}")
-                    lines = ["(Unreadable Word document)"]
-
-            elif ext == ".html":
-                try:
-                    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                        soup = BeautifulSoup(f, "html.parser")
-                        lines = soup.get_text(separator="\n").splitlines()
-                except Exception as e:
-                    print(f"❌ Failed to parse HTML for thumbnail: {e}")
-                    lines = ["(Unreadable HTML document)"]
-
-            elif ext == ".eml":
-                try:
-                    with open(filepath, "rb") as f:
-                        msg = BytesParser(policy=policy.default).parse(f)
-                        body = msg.get_body(preferencelist=('plain'))
-                        content = body.get_content() if body else "(No plain text body)"
-                        lines = content.splitlines()
-                except Exception as e:
-                    print(f"❌ Failed to parse EML for thumbnail: {e}")
-                    lines = ["(Unreadable email)"]
-
-            preview_text = "\n".join(lines[:25]) or "(Empty File)"
-            img = Image.new("RGB", (800, 1000), color="white")
-            draw = ImageDraw.Draw(img)
+    try:
+        # 🔑 Keyed by content, so renames and re-syncs reuse the existing render
+        if os.path.exists(thumb_path):
+            return thumb_path, preview_path
 
-            try:
-                font = ImageFont.truetype("arial.ttf", size=16)
-            except:
-                font = ImageFont.load_default()
+        img = get_thumbnailer(doc.ext)(doc, box=THUMB_SIZE)
+        _save_jpeg(img, thumb_path, quality=85)
 
-            draw.multiline_text((20, 20), preview_text, fill="black", font=font, spacing=4)
+    except Exception as e:
+        print(f"❌ Thumbnail error for {doc.filename}: {e}")
+        return "", ""
+    finally:
+        if owned:
+            doc.close()
 
-            img.save(preview_path, "JPEG", quality=95)
+    # The full-size preview is rendered on first view by generate_preview
+    return thumb_path, preview_path
 
-            small = img.copy()
-            small.thumbnail((200, 200))
-            small.save(thumb_path, "JPEG", quality=85)
+def generate_preview(filepath, file_hash):
+    _, preview_path = thumbnail_paths(file_hash)
+    if os.path.exists(preview_path):
+        return preview_path
 
+    try:
+        doc = ParsedDocument.load(filepath)
+    except OSError as e:
+        # Moved or deleted since the row was written; the caller answers 404
+        print(f"❌ Preview error for {os.path.basename(filepath)}: {e}")
+        return ""
+    try:
+        img = get_thumbnailer(doc.ext)(doc, dpi=PREVIEW_DPI)
+        _save_jpeg(img, preview_path, quality=90)
+        return preview_path
     except Exception as e:
-        print(f"❌ Thumbnail error for {filename}: {e}")
-        return "", ""
+        print(f"❌ Preview error for {doc.filename}: {e}")
+        return ""
+    finally:
+        doc.close()
 
-    return thumb_path, preview_path
+@traced("hash")
+def stream_hash(filepath, block_size=HASH_BLOCK_SIZE):
+    # 📦 Fixed-size reads into one reused buffer keep memory flat for huge files
+    hasher = hashlib.sha256()
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(filepath, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
 
 def hash_file(filepath):
-    hasher = hashlib.sha256()
     try:
-        with open(filepath, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest()
+        st = os.stat(filepath)
+        cached = lookup_fingerprint(filepath, st)
+        if cached:
+            return cached
+
+        digest = stream_hash(filepath)
+
+        # Only trust the fingerprint if the file didn't change while we read it
+        after = os.stat(filepath)
+        if (after.st_size, after.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+            store_fingerprint(filepath, st, digest)
+        return digest
     except Exception as e:
         print(f"❌ Hashing error for {filepath}: {e}")
         return ""
 
+def _put_own_renames(cur, paths, now):
+    cur.execute("DELETE FROM own_renames WHERE expires < ?", (now,))
+    cur.executemany(
+        "INSERT OR REPLACE INTO own_renames (path, expires) VALUES (?, ?)",
+        [(path, now + OWN_RENAME_TTL) for path in paths]
+    )
+
+def _mark_own_rename(*paths):
+    # In the DB, not in memory: the rename may happen in a worker process while the
+    # watcher that sees its events runs in another. Committed before the rename itself.
+    get_writer().call(_put_own_renames, [os.path.abspath(p) for p in paths], time.time())
+
+def is_own_rename(path):
+    conn = getattr(_marker_conns, "conn", None)
+    if conn is None:
+        conn = _marker_conns.conn = connect()
+    return conn.execute(
+        "SELECT 1 FROM own_renames WHERE path = ? AND expires >= ?", (os.path.abspath(path), time.time())
+    ).fetchone() is not None
+
+def _candidates(folder, stem, ext):
+    yield os.path.join(folder, stem + ext)
+    n = 2
+    while True:
+        yield os.path.join(folder, f"{stem} ({n}){ext}")
+        n += 1
+
+def _move_no_clobber(src, dst):
+    # Never replaces dst: link fails if it exists, so two workers can't both win a name
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        # Filesystems without hard links: claim the name with a placeholder first
+        os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        try:
+            os.replace(src, dst)
+        except BaseException:
+            os.unlink(dst)
+            raise
+        return
+    os.unlink(src)
+
+@traced("rename")
 def rename_file(filepath, new_filename):
     folder = os.path.dirname(filepath)
     ext = os.path.splitext(filepath)[1]
-    if not new_filename.endswith(ext):
-        new_filename += ext
-    new_path = os.path.join(folder, new_filename)
+    stem = new_filename[:-len(ext)] if ext and new_filename.endswith(ext) else new_filename
 
-    if new_path == filepath:
+    if os.path.join(folder, stem + ext) == filepath:
         return filepath
 
     for attempt in range(5):
         try:
-            os.rename(filepath, new_path)
+            for new_path in _candidates(folder, stem, ext):
+                if new_path == filepath:
+                    return filepath
+                _mark_own_rename(filepath, new_path)
+                try:
+                    _move_no_clobber(filepath, new_path)
+                except FileExistsError:
+                    # Case-only rename on a case-insensitive filesystem: same file, not a clash
+                    if os.path.samefile(filepath, new_path):
+                        os.rename(filepath, new_path)
+                        break
+                    continue
+                break
+            rename_fingerprint(filepath, new_path)
             return new_path
         except PermissionError:
             print(f"⏳ File locked during rename, retrying: {filepath}")
@@ -0,0 +1,59 @@
+import os
+import importlib
+import threading
+from collections import namedtuple
+
+# 📇 The one list of file types we handle. Backends are "module:function" strings,
+# imported the first time a file of that type turns up, so importing this costs nothing.
+#   extractor(doc, budget) → text
+#   thumbnailer(doc, box=None, dpi=None) → PIL image
+#   streamable: plain text we can read line by line instead of holding in memory
+Format = namedtuple("Format", "extractor thumbnailer streamable")
+
+TEXT_THUMBNAIL = "utils.file_ops:render_text"
+PDF_THUMBNAIL = "utils.file_ops:render_pdf"
+
+FORMATS = {}
+
+def register(ext, extractor, thumbnailer=TEXT_THUMBNAIL, streamable=False):
+    # Call before the watcher/sync start so their filters see it
+    global VALID_EXTENSIONS
+    FORMATS[ext.lower()] = Format(extractor, thumbnailer, streamable)
+    VALID_EXTENSIONS = tuple(FORMATS)
+
+for _ext in (".txt", ".md", ".log", ".json", ".xml", ".rtf"):
+    register(_ext, "utils.extractors:extract_plain", streamable=True)
+register(".html", "utils.extractors:extract_html")
+register(".eml", "utils.extractors:extract_eml")
+register(".pdf", "utils.extractors:extract_pdf", thumbnailer=PDF_THUMBNAIL)
+register(".docx", "utils.extractors:extract_docx")
+register(".pptx", "utils.extractors:extract_pptx")
+
+def extension(path):
+    return os.path.splitext(path)[1].lower()
+
+def is_supported(path):
+    return extension(path) in FORMATS
+
+def is_streamable(path):
+    fmt = FORMATS.get(extension(path))
+    return fmt is not None and fmt.streamable
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def _resolve(target):
+    fn = _loaded.get(target)
+    if fn is None:
+        with _loaded_lock:
+            module, _, name = target.partition(":")
+            fn = _loaded[target] = getattr(importlib.import_module(module), name)
+    return fn
+
+def get_extractor(ext):
+    fmt = FORMATS.get(ext.lower())
+    return _resolve(fmt.extractor) if fmt else None
+
+def get_thumbnailer(ext):
+    fmt = FORMATS.get(ext.lower())
+    return _resolve(fmt.thumbnailer if fmt else TEXT_THUMBNAIL)
@@ -1,11 +1,35 @@
-import openai
 import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
 from dotenv import load_dotenv
+from utils.metrics import inc, observe, traced
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4")
+GPT_TRANSPORT = os.getenv("GPT_TRANSPORT", "openai")         # "openai" or "http"
+GPT_BASE_URL = os.getenv("GPT_BASE_URL", "https://api.openai.com/v1")
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", 60))
+GPT_CONCURRENCY = int(os.getenv("GPT_CONCURRENCY", 8))
+GPT_RPM = int(os.getenv("GPT_RPM", 500))
+GPT_TPM = int(os.getenv("GPT_TPM", 150000))
+# Processes calling GPT with this key (sharded watchers plus any worker.py runs); each gets
+# 1/N of GPT_RPM/GPT_TPM. 0 = what the launcher says, e.g. the watcher's shard count.
+GPT_PROCESSES = int(os.getenv("GPT_PROCESSES", 0))
+GPT_MAX_RETRIES = int(os.getenv("GPT_MAX_RETRIES", 6))
+GPT_BACKOFF_BASE = float(os.getenv("GPT_BACKOFF_BASE", 1.0))
+GPT_BACKOFF_MAX = float(os.getenv("GPT_BACKOFF_MAX", 60.0))
+GPT_MAX_COMPLETION_TOKENS = 400
 
-def summarize_with_gpt(text_chunk):
+# 🔖 Bump whenever the prompt below changes so cached results are not reused
+PROMPT_VERSION = "1"
+SUMMARY_VERSION = f"{GPT_MODEL}:{PROMPT_VERSION}"
+
+def build_messages(text_chunk):
     prompt = f"""
 You are a file assistant. Based on the document content, provide:
 - A suggested filename (e.g., Verizon_Receipt.pdf)
@@ -20,16 +44,222 @@ Content:
 \"\"\"
 Respond in JSON format with keys: filename, common_name, summary, keyword, category.
 """
+    return [
+        {"role": "system", "content": "You are a helpful file summarization assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None, rate_limited=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+
+
+# ---------------------------------------------------------------------------
+# Transports — anything with `async def complete(payload) -> response dict`
+# ---------------------------------------------------------------------------
+
+class OpenAITransport:
+    # openai (and httpx below) are imported by the transport in use, not by everyone importing this
+    def __init__(self):
+        import openai
+        openai.api_key = OPENAI_API_KEY
+        self.openai = openai
+
+    async def complete(self, payload):
+        openai = self.openai
+        try:
+            return await openai.ChatCompletion.acreate(request_timeout=GPT_TIMEOUT, **payload)
+        except openai.error.RateLimitError as e:
+            raise RetryableError(str(e), rate_limited=True)
+        except (openai.error.Timeout, openai.error.APIConnectionError,
+                openai.error.ServiceUnavailableError, openai.error.APIError) as e:
+            raise RetryableError(str(e))
+
+
+class HTTPTransport:
+    # Plain chat-completions over HTTP: works against the real API or a local stub server
+    def __init__(self, base_url=GPT_BASE_URL, api_key=None, timeout=GPT_TIMEOUT):
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        import httpx
+        key = api_key or OPENAI_API_KEY
+        self.headers = {"Authorization": f"Bearer {key}"} if key else {}
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def complete(self, payload):
+        import httpx
+        try:
+            resp = await self.client.post(self.url, json=payload, headers=self.headers)
+        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+            raise RetryableError(f"{type(e).__name__}: {e}")
+        if resp.status_code == 429 or resp.status_code >= 500:
+            retry_after = resp.headers.get("Retry-After")
+            raise RetryableError(
+                f"HTTP {resp.status_code}",
+                retry_after=float(retry_after) if retry_after else None,
+                rate_limited=resp.status_code == 429,
+            )
+        resp.raise_for_status()
+        return resp.json()
+
+
+def default_transport():
+    if GPT_TRANSPORT == "http":
+        return HTTPTransport()
+    return OpenAITransport()
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful file summarization assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.4
-    )
+    async def acquire(self, amount=1):
+        # A single request bigger than the bucket would wait forever; cap it
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
 
-    import json
-    return json.loads(response["choices"][0]["message"]["content"])
 
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class AsyncGPTClient:
+    def __init__(self, transport=None, model=GPT_MODEL, concurrency=GPT_CONCURRENCY,
+                 rpm=GPT_RPM, tpm=GPT_TPM, max_retries=GPT_MAX_RETRIES):
+        self.transport = transport or default_transport()
+        self.model = model
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.inflight = {}
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "failed": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _payload(self, text_chunk):
+        return {
+            "model": self.model,
+            "messages": build_messages(text_chunk),
+            "temperature": 0.4,
+            "max_tokens": GPT_MAX_COMPLETION_TOKENS,
+        }
+
+    async def summarize(self, text_chunk):
+        payload = self._payload(text_chunk)
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+        # 🤝 Identical request already on the wire: wait for its answer instead
+        if key in self.inflight:
+            self.stats["coalesced"] += 1
+            inc("gpt_requests_total", outcome="coalesced")
+            return await asyncio.shield(self.inflight[key])
+
+        task = asyncio.ensure_future(self._request(payload))
+        self.inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self.inflight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+    async def _request(self, payload):
+        estimate = sum(len(m["content"]) for m in payload["messages"]) // 4 + payload["max_tokens"]
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimate)
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    started = time.perf_counter()
+                    response = await asyncio.wait_for(self.transport.complete(payload), GPT_TIMEOUT)
+                    observe("gpt_request_seconds", time.perf_counter() - started)
+            except (RetryableError, asyncio.TimeoutError) as e:
+                rate_limited = getattr(e, "rate_limited", False)
+                if rate_limited:
+                    self.stats["rate_limited"] += 1
+                inc("gpt_requests_total", outcome="rate_limited" if rate_limited else "error")
+                if attempt == self.max_retries:
+                    self.stats["failed"] += 1
+                    inc("gpt_requests_total", outcome="failed")
+                    raise
+                # ⏳ Full-jitter exponential backoff, unless the server told us how long
+                delay = getattr(e, "retry_after", None) or random.uniform(
+                    0, min(GPT_BACKOFF_MAX, GPT_BACKOFF_BASE * 2 ** attempt)
+                )
+                self.stats["retries"] += 1
+                print(f"⏳ GPT {'rate limited' if rate_limited else 'error'} ({e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = response.get("usage") or {}
+            self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            inc("gpt_requests_total", outcome="ok")
+            inc("gpt_tokens_total", usage.get("prompt_tokens", 0), kind="prompt")
+            inc("gpt_tokens_total", usage.get("completion_tokens", 0), kind="completion")
+            return json.loads(response["choices"][0]["message"]["content"])
+
+
+# ---------------------------------------------------------------------------
+# Blocking entry point for the pipeline threads — one shared client and loop
+# per process, so rate limits and coalescing apply across every caller in it.
+# The account limits are split evenly between processes; see GPT_PROCESSES.
+# ---------------------------------------------------------------------------
+
+_loop = None
+_client = None
+_client_lock = threading.Lock()
+_processes = 1
+
+def share_rate_limits(processes):
+    # For launchers that start several GPT-calling processes; call before the first request
+    global _processes
+    _processes = max(1, processes)
+
+def process_rate_limits():
+    n = GPT_PROCESSES or _processes
+    return max(1, GPT_RPM // n), max(1, GPT_TPM // n)
+
+def get_client():
+    global _loop, _client
+    with _client_lock:
+        if _client is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gpt-client", daemon=True).start()
+            _client = asyncio.run_coroutine_threadsafe(_make_client(), _loop).result()
+        return _client
+
+async def _make_client():
+    rpm, tpm = process_rate_limits()
+    return AsyncGPTClient(rpm=rpm, tpm=tpm)
+
+def run_async(coro):
+    get_client()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+@traced("gpt")
+def summarize_with_gpt(text_chunk):
+    return run_async(get_client().summarize(text_chunk))
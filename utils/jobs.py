@@ -0,0 +1,256 @@
+import os
+import time
+import random
+import socket
+import threading
+from dotenv import load_dotenv
+from utils.db import connect, get_writer
+from utils.metrics import inc, set_gauge
+
+load_dotenv()
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", 30))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 3600))
+JOB_PREFETCH = int(os.getenv("JOB_PREFETCH", 32))          # jobs one worker holds at a time
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 7 * 86400))
+
+# Outcomes worth another try; everything else is final (duplicate, unchanged, empty...)
+RETRYABLE_OUTCOMES = ("failed", "locked")
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ---------------------------------------------------------------------------
+# Writer ops — all state changes go through the single DB writer
+# ---------------------------------------------------------------------------
+
+def _enqueue(cur, paths, source, now):
+    # A path already waiting (or backing off) just becomes due now instead of queuing twice
+    cur.executemany("""
+        INSERT INTO jobs (path, source, state, not_before, created, updated)
+        VALUES (?, ?, 'pending', ?, ?, ?)
+        ON CONFLICT(path) WHERE state IN ('pending', 'failed') DO UPDATE SET
+            state = 'pending',
+            not_before = MIN(not_before, excluded.not_before),
+            updated = excluded.updated
+    """, [(path, source, now, now, now) for path in paths])
+
+def _reclaim_expired(cur, now):
+    # Owner died or hung: its leases ran out, so the work goes back in the queue
+    cur.execute("""
+        UPDATE jobs SET
+            state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'failed' END,
+            last_error = 'lease expired (worker lost)',
+            lease_owner = NULL, lease_expires = NULL, not_before = ?, updated = ?
+        WHERE state = 'running' AND lease_expires < ?
+          AND NOT EXISTS (SELECT 1 FROM jobs w WHERE w.path = jobs.path AND w.state IN ('pending', 'failed'))
+    """, (JOB_MAX_ATTEMPTS, now, now, now))
+    # Same path queued again meanwhile: that newer job supersedes this one
+    cur.execute("""
+        UPDATE jobs SET state = 'done', outcome = 'superseded', lease_owner = NULL, updated = ?
+        WHERE state = 'running' AND lease_expires < ?
+    """, (now, now))
+
+def _claim(cur, owner, limit, now):
+    _reclaim_expired(cur, now)
+    # One statement picks and marks the jobs, so two workers can never take the same one.
+    # Paths already running elsewhere wait, so a file is never processed twice at once.
+    return cur.execute("""
+        UPDATE jobs SET
+            state = 'running', lease_owner = ?, lease_expires = ?,
+            attempts = attempts + 1, updated = ?
+        WHERE id IN (
+            SELECT id FROM jobs
+            WHERE state IN ('pending', 'failed') AND not_before <= ?
+              AND path NOT IN (SELECT path FROM jobs WHERE state = 'running')
+            ORDER BY not_before, id
+            LIMIT ?
+        )
+        RETURNING id, path, source, attempts
+    """, (owner, now + JOB_LEASE_SECONDS, now, now, limit)).fetchall()
+
+def _heartbeat(cur, owner, ids, now):
+    cur.executemany(
+        "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND lease_owner = ? AND state = 'running'",
+        [(now + JOB_LEASE_SECONDS, now, job_id, owner) for job_id in ids]
+    )
+
+def _finish(cur, job_id, owner, outcome, error, now):
+    row = cur.execute(
+        "SELECT attempts FROM jobs WHERE id = ? AND lease_owner = ? AND state = 'running'", (job_id, owner)
+    ).fetchone()
+    if row is None:
+        return None         # lease was lost and someone else owns it now
+    attempts = row[0]
+
+    if outcome not in RETRYABLE_OUTCOMES:
+        state, not_before = "done", now
+    elif attempts >= JOB_MAX_ATTEMPTS:
+        state, not_before = "dead", now
+    else:
+        # ⏳ Exponential backoff with jitter so a flapping share doesn't get hammered
+        delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        state, not_before = "failed", now + delay
+
+    # A newer event for this path may already be waiting; let that one carry on instead
+    if state == "failed" and cur.execute(
+        "SELECT 1 FROM jobs WHERE path = (SELECT path FROM jobs WHERE id = ?) AND state IN ('pending', 'failed')",
+        (job_id,)
+    ).fetchone():
+        state = "done"
+
+    cur.execute("""
+        UPDATE jobs SET state = ?, outcome = ?, last_error = ?, not_before = ?,
+               lease_owner = NULL, lease_expires = NULL, updated = ?
+        WHERE id = ?
+    """, (state, outcome, error, not_before, now, job_id))
+    return state
+
+def _retry_dead(cur, ids, now):
+    only = f"AND id IN ({','.join('?' * len(ids))})" if ids else ""
+    # Skip paths that already have a job waiting; that one covers it
+    cur.execute(f"""
+        UPDATE jobs SET state = 'pending', attempts = 0, not_before = ?, updated = ?
+        WHERE state = 'dead' {only}
+          AND NOT EXISTS (SELECT 1 FROM jobs w WHERE w.path = jobs.path AND w.state IN ('pending', 'failed'))
+    """, (now, now, *ids))
+    return cur.rowcount
+
+def _prune(cur, older_than):
+    cur.execute("DELETE FROM jobs WHERE state = 'done' AND updated < ?", (older_than,))
+    return cur.rowcount
+
+
+# ---------------------------------------------------------------------------
+# Public helpers
+# ---------------------------------------------------------------------------
+
+def enqueue(path, source="watcher"):
+    return enqueue_many([path], source)
+
+def enqueue_many(paths, source="watcher"):
+    if not paths:
+        return None
+    future = get_writer().submit(_enqueue, [os.path.abspath(p) for p in paths], source, time.time())
+    inc("jobs_enqueued_total", len(paths), source=source)
+    return future
+
+def claim(owner, limit=1):
+    return get_writer().call(_claim, owner, limit, time.time())
+
+def heartbeat(owner, ids):
+    if ids:
+        get_writer().call(_heartbeat, owner, list(ids), time.time())
+
+def finish(job_id, owner, outcome, error=None):
+    state = get_writer().call(_finish, job_id, owner, outcome, error, time.time())
+    if state:
+        inc("jobs_finished_total", state=state)
+    return state
+
+def retry_dead(ids=None):
+    return get_writer().call(_retry_dead, list(ids or []), time.time())
+
+def prune_done(retention=JOB_RETENTION_SECONDS):
+    return get_writer().call(_prune, time.time() - retention)
+
+def job_counts():
+    conn = connect()
+    counts = dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+    conn.close()
+    return counts
+
+def dead_jobs(limit=100):
+    conn = connect()
+    rows = conn.execute("""
+        SELECT id, path, attempts, outcome, last_error, updated FROM jobs
+        WHERE state = 'dead' ORDER BY updated DESC LIMIT ?
+    """, (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# JobRunner — claims jobs, feeds them to an IngestPipeline and records results
+# ---------------------------------------------------------------------------
+
+class JobRunner:
+    def __init__(self, pipeline, prefetch=JOB_PREFETCH, poll=JOB_POLL_SECONDS):
+        self.pipeline = pipeline
+        self.prefetch = prefetch
+        self.poll = poll
+        self.owner = worker_id()
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(prefetch)
+        self.stopped = threading.Event()
+        self.threads = []
+        pipeline.on_done = self._done
+
+    def start(self):
+        for target, name in ((self._claim_loop, "job-claim"), (self._heartbeat_loop, "job-heartbeat")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self.threads.append(t)
+        print(f"📬 Job runner {self.owner} started (prefetch {self.prefetch})")
+
+    def stop(self):
+        # Stop claiming; the pipeline drain that follows finishes whatever we hold
+        self.stopped.set()
+        for t in self.threads:
+            t.join()
+
+    def _claim_loop(self):
+        while not self.stopped.is_set():
+            # Wait for a free slot so we never lease more than we can work on
+            if not self.slots.acquire(timeout=self.poll):
+                continue
+            free = 1
+            while free < self.prefetch and self.slots.acquire(blocking=False):
+                free += 1
+            try:
+                jobs = claim(self.owner, free)
+            except Exception as e:
+                print(f"❌ Job claim failed: {e}")
+                jobs = []
+            for _ in range(free - len(jobs)):
+                self.slots.release()
+            if not jobs:
+                self.stopped.wait(self.poll)
+                continue
+
+            with self.lock:
+                self.inflight.update(job_id for job_id, *_ in jobs)
+            for job_id, path, source, attempts in jobs:
+                if attempts > 1:
+                    print(f"🔁 Retrying job {job_id} (attempt {attempts}): {path}")
+                if not self.pipeline.submit(path, source=source, block=True, job_id=job_id):
+                    self._done({"job_id": job_id, "outcome": "failed", "error": "pipeline refused job"})
+
+    def _heartbeat_loop(self):
+        while not self.stopped.wait(JOB_LEASE_SECONDS / 3):
+            with self.lock:
+                ids = list(self.inflight)
+            try:
+                heartbeat(self.owner, ids)
+                set_gauge("jobs_inflight", len(ids))
+            except Exception as e:
+                print(f"❌ Job heartbeat failed: {e}")
+
+    def _done(self, job):
+        job_id = job.get("job_id")
+        if job_id is None:
+            return
+        outcome = job.get("outcome") or ("indexed" if job.get("final_path") else "failed")
+        try:
+            state = finish(job_id, self.owner, outcome, job.get("error"))
+            if state == "dead":
+                print(f"☠️ Job {job_id} moved to dead-letter after repeated failures: {job.get('path')}")
+        except Exception as e:
+            print(f"❌ Could not record result for job {job_id}: {e}")
+        with self.lock:
+            self.inflight.discard(job_id)
+        self.slots.release()
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import multiprocessing.util
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from dotenv import load_dotenv
+
+load_dotenv()
+# Defaults sit next to the database (utils.db imports us, so read DB_PATH directly): every
+# process sharing a catalog shares one registry, whatever directory it was started from.
+# Resolved once, so a later chdir can't scatter snapshots around.
+DATA_DIR = os.path.dirname(os.path.abspath(os.getenv("DB_PATH", "database.db")))
+# One snapshot file per process
+METRICS_DIR = os.path.abspath(os.getenv("METRICS_DIR", os.path.join(DATA_DIR, "metrics")))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", 60))
+JSON_LOG = os.getenv("JSON_LOG", os.path.join(DATA_DIR, "logs", "events.jsonl"))   # "" turns structured logs off
+JSON_LOG = JSON_LOG and os.path.abspath(JSON_LOG)
+PROFILE_SPANS = {s for s in os.getenv("PROFILE_SPANS", "").split(",") if s}
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))    # keep samples only from spans this slow
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 10))
+PROFILE_DIR = os.path.abspath(os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "logs")))
+
+PREFIX = "gpt_gazer_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+# ---------------------------------------------------------------------------
+# Per-process registry — counters, gauges and fixed-bucket histograms
+# ---------------------------------------------------------------------------
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+                    break
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "ts": time.time(),
+                "counters": [[n, dict(l), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, dict(l), v] for (n, l), v in self.gauges.items()],
+                "histograms": [[n, dict(l), dict(h, buckets=list(h["buckets"]))] for (n, l), h in self.histograms.items()],
+            }
+
+registry = Registry()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+def _flush():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp, path)
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            _flush()
+            _profiler_flush()
+        except OSError as e:
+            print(f"⚠️ Metrics flush failed: {e}")
+
+def _ensure_flusher():
+    # Started on first use, so pool workers that never record anything stay quiet.
+    # Checked against the pid because forked children inherit the flag but not the thread.
+    global _flusher
+    if _flusher == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher != os.getpid():
+            _flusher = os.getpid()
+            threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+            atexit.register(_flush)
+            # Pool workers leave through os._exit, which skips atexit but runs these
+            multiprocessing.util.Finalize(None, _flush, exitpriority=10)
+
+def inc(name, amount=1, **labels):
+    _ensure_flusher()
+    registry.inc(PREFIX + name, amount, **labels)
+
+def set_gauge(name, value, **labels):
+    _ensure_flusher()
+    registry.set(PREFIX + name, value, **labels)
+
+def observe(name, value, **labels):
+    _ensure_flusher()
+    registry.observe(PREFIX + name, value, **labels)
+
+
+# ---------------------------------------------------------------------------
+# Structured logs and spans
+# ---------------------------------------------------------------------------
+
+_context = threading.local()
+_log_lock = threading.Lock()
+_log_file = None
+
+def log_event(event, **fields):
+    global _log_file
+    if not JSON_LOG:
+        return
+    record = {"ts": round(time.time(), 6), "event": event, "pid": os.getpid(),
+              "thread": threading.current_thread().name}
+    record.update(getattr(_context, "fields", {}))
+    record.update(fields)
+    line = json.dumps(record, default=str) + "\n"
+    with _log_lock:
+        if _log_file is None:
+            os.makedirs(os.path.dirname(JSON_LOG) or ".", exist_ok=True)
+            _log_file = open(JSON_LOG, "a", encoding="utf-8", buffering=1)
+        _log_file.write(line)
+
+@contextmanager
+def bind(**fields):
+    # Tag every event logged on this thread inside the block, e.g. with the file path
+    previous = getattr(_context, "fields", {})
+    _context.fields = dict(previous, **fields)
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+@contextmanager
+def span(name, **fields):
+    profiled = name in PROFILE_SPANS and _profiler_enter(name)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiled:
+            _profiler_exit(elapsed)
+        observe("span_seconds", elapsed, span=name)
+        log_event("span", span=name, ms=round(elapsed * 1000, 3), error=error, **fields)
+
+def traced(name):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---------------------------------------------------------------------------
+# Sampling profiler — PROFILE_SPANS=ocr,gpt samples only threads inside those
+# spans and writes folded stacks (flamegraph.pl / speedscope) to PROFILE_DIR
+# ---------------------------------------------------------------------------
+
+_profiled = {}            # thread ident → (span name, samples taken during this span)
+_profile = Counter()
+_profile_lock = threading.Lock()
+_sampler = None
+
+def _profiler_enter(name):
+    global _sampler
+    with _profile_lock:
+        # Nested profiled spans: the outermost one owns the thread's samples
+        if threading.get_ident() in _profiled:
+            return False
+        _profiled[threading.get_ident()] = (name, Counter())
+        if _sampler != os.getpid():
+            _sampler = os.getpid()
+            threading.Thread(target=_sample_forever, name="profiler", daemon=True).start()
+    _ensure_flusher()
+    return True
+
+def _profiler_exit(elapsed):
+    with _profile_lock:
+        name, samples = _profiled.pop(threading.get_ident(), (None, None))
+        # Fast calls are noise when hunting a slow path
+        if samples and elapsed * 1000 >= PROFILE_SLOW_MS:
+            _profile.update(samples)
+
+def _stack(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+def _sample_forever():
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        frames = sys._current_frames()
+        with _profile_lock:
+            for ident, (name, samples) in _profiled.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[f"{name};{_stack(frame)}"] += 1
+
+def _profiler_flush():
+    with _profile_lock:
+        if not _profile:
+            return
+        lines = [f"{stack} {count}\n" for stack, count in _profile.most_common()]
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"profile-{os.getpid()}.folded"), "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def _reset_after_fork():
+    # A forked pool worker starts from zero, or its first snapshot would repeat the parent's
+    global registry, _log_lock, _log_file, _profile_lock, _profiled, _profile
+    registry = Registry()
+    _log_lock = threading.Lock()
+    _log_file = None
+    _profile_lock = threading.Lock()
+    _profiled = {}
+    _profile = Counter()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---------------------------------------------------------------------------
+# Collection and Prometheus text format, used by app.py's /metrics
+# ---------------------------------------------------------------------------
+
+def collect(folder=METRICS_DIR, stale=METRICS_STALE_SECONDS):
+    # Sum every live process's snapshot; our own comes straight from memory
+    snapshots = [registry.snapshot()]
+    now = time.time()
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            if not name.endswith(".json") or name == f"{os.getpid()}.json":
+                continue
+            path = os.path.join(folder, name)
+            try:
+                if now - os.path.getmtime(path) > stale:
+                    os.remove(path)        # that process is gone
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    merged = Registry()
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(sorted(labels.items())))
+            merged.counters[key] = merged.counters.get(key, 0) + value
+        for name, labels, value in snap["gauges"]:
+            key = (name, tuple(sorted(labels.items())))
+            merged.gauges[key] = merged.gauges.get(key, 0) + value
+        for name, labels, hist in snap["histograms"]:
+            key = (name, tuple(sorted(labels.items())))
+            into = merged.histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            into["buckets"] = [a + b for a, b in zip(into["buckets"], hist["buckets"])]
+            into["sum"] += hist["sum"]
+            into["count"] += hist["count"]
+    merged.processes = len(snapshots)
+    return merged
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+def render_prometheus(merged):
+    lines = []
+
+    def block(kind, series):
+        seen = set()
+        for (name, labels), value in sorted(series.items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            running = 0
+            for bound, count in zip(BUCKETS, value["buckets"]):
+                running += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {running}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+
+    block("counter", merged.counters)
+    block("gauge", merged.gauges)
+    block("histogram", merged.histograms)
+    lines.append(f"# TYPE {PREFIX}metrics_processes gauge")
+    lines.append(f"{PREFIX}metrics_processes {merged.processes}")
+    return "\n".join(lines) + "\n"
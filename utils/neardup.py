@@ -0,0 +1,110 @@
+import os
+import re
+import zlib
+import hashlib
+import numpy as np
+from dotenv import load_dotenv
+from utils.db import connect
+from utils.metrics import inc
+
+load_dotenv()
+NEARDUP_THRESHOLD = float(os.getenv("NEARDUP_THRESHOLD", 0.9))   # estimated Jaccard to count as the same document
+NEARDUP_MIN_WORDS = int(os.getenv("NEARDUP_MIN_WORDS", 50))      # shorter texts are too generic to compare
+NEARDUP_MAX_CANDIDATES = 50
+
+# 128 permutations in 16 bands of 8 rows: pairs above ~0.7 similarity almost always
+# share a bucket, pairs below ~0.4 almost never do. Changing these means a re-index.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(0x6770)     # fixed seed: signatures must match across processes and runs
+_A = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text):
+    # Word 5-grams on normalized text, so re-exports and rescans with new whitespace still match
+    words = _WORD.findall(text.lower())
+    if len(words) < NEARDUP_MIN_WORDS:
+        return None
+    grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+def signature(text):
+    # → uint32 MinHash signature, or None when there isn't enough text to judge
+    hashes = _shingles(text or "")
+    if hashes is None:
+        return None
+    sig = np.full(NUM_PERM, _MERSENNE, dtype=np.uint64)
+    # In slices, so a huge log never builds a shingles × 128 matrix; 31-bit a/b × 32-bit hashes fit in uint64
+    for i in range(0, len(hashes), 8192):
+        permuted = (hashes[i:i + 8192, None] * _A + _B) % _MERSENNE
+        np.minimum(sig, permuted.min(axis=0), out=sig)
+    return (sig & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+def band_keys(sig):
+    # One signed 64-bit bucket per band, ready for an INTEGER column
+    rows = sig.reshape(BANDS, ROWS)
+    return [
+        (band, int.from_bytes(hashlib.blake2b(rows[band].tobytes(), digest_size=8).digest(), "big", signed=True))
+        for band in range(BANDS)
+    ]
+
+def similarity(a, b):
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+# ---------------------------------------------------------------------------
+# Writer op and lookup
+# ---------------------------------------------------------------------------
+
+def put_signature(cur, doc_id, sig):
+    # Writer op: runs inside the caller's transaction, next to the document row it belongs to
+    cur.execute("DELETE FROM lsh_bands WHERE doc_id = ?", (doc_id,))
+    cur.execute("INSERT OR REPLACE INTO minhash (doc_id, sig) VALUES (?, ?)", (doc_id, sig.tobytes()))
+    cur.executemany(
+        "INSERT INTO lsh_bands (band, bucket, doc_id) VALUES (?, ?, ?)",
+        [(band, bucket, doc_id) for band, bucket in band_keys(sig)]
+    )
+
+def find_near_duplicate(sig, root, filename, conn=None):
+    # → (document row, similarity) for the closest live document, or (None, 0.0)
+    if sig is None:
+        return None, 0.0
+    own = conn is None
+    conn = conn or connect()
+    try:
+        keys = band_keys(sig)
+        # Only documents sharing at least one band bucket are compared at all.
+        # Spelled as ORs because SQLite probes the index per pair that way; a row-value IN scans.
+        buckets = " OR ".join(["(band = ? AND bucket = ?)"] * len(keys))
+        candidates = conn.execute(f"""
+            SELECT m.doc_id, m.sig FROM minhash m
+            JOIN documents d ON d.id = m.doc_id
+            WHERE m.doc_id IN (SELECT doc_id FROM lsh_bands WHERE {buckets})
+              AND d.archived = 0 AND NOT (d.root = ? AND d.filename = ?)
+            LIMIT ?
+        """, (*[v for key in keys for v in key], root, filename, NEARDUP_MAX_CANDIDATES)).fetchall()
+
+        best_id, best = None, 0.0
+        for doc_id, blob in candidates:
+            score = similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+            if score > best:
+                best_id, best = doc_id, score
+        if best_id is None or best < NEARDUP_THRESHOLD:
+            inc("neardup_lookups_total", result="miss")
+            return None, best
+
+        row = conn.execute("""
+            SELECT id, root, filename, common_name, summary, keyword, category, duplicate_of
+            FROM documents WHERE id = ?
+        """, (best_id,)).fetchone()
+        inc("neardup_lookups_total", result="hit")
+        return row, best
+    finally:
+        if own:
+            conn.close()
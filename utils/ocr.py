@@ -1,20 +1,143 @@
-from pdf2image import convert_from_path
-import pytesseract
-from PIL import Image
 import os
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from utils.cache import get_cached_ocr, store_ocr
+from utils.metrics import traced, inc
 
-# ✅ Optional: explicitly set the path to the Tesseract binary
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+load_dotenv()
+OCR_DPI = int(os.getenv("OCR_DPI", 300))                 # ✅ Higher DPI = better OCR accuracy
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", 3))       # ✅ Image pages OCR'd per document
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 2))
+OCR_CONFIG = "--psm 3"
+MIN_TEXT_LAYER_CHARS = 20
+
+WINDOWS_TESSERACT_PATHS = (
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+)
+
+def find_tesseract():
+    # TESSERACT_CMD wins, then PATH, then the usual Windows install folders
+    cmd = os.getenv("TESSERACT_CMD") or shutil.which("tesseract")
+    if not cmd and os.name == "nt":
+        cmd = next((p for p in WINDOWS_TESSERACT_PATHS if os.path.exists(p)), None)
+    return cmd
+
+_tesseract_cmd = find_tesseract()
+if not _tesseract_cmd:
+    print("⚠️ Tesseract not found — set TESSERACT_CMD or add it to PATH to enable OCR")
+
+def _open_pdf(source):
+    # Accept a ParsedDocument (reuse its open handle) or a path
+    if hasattr(source, "pdf"):
+        return source.pdf, False
+    import fitz  # PyMuPDF
+    return fitz.open(source), True
+
+def has_text_layer(page):
+    return len(page.get_text().strip()) >= MIN_TEXT_LAYER_CHARS
+
+def page_content_hash(pdf, page):
+    # Hash the page's drawing commands and embedded images, no rendering needed
+    hasher = hashlib.sha256(f"{OCR_DPI}|{OCR_CONFIG}|".encode())
+    hasher.update(page.read_contents())
+    for image in page.get_images(full=True):
+        hasher.update(pdf.xref_stream_raw(image[0]) or b"")
+    return hasher.hexdigest()
+
+def _render(page):
+    import fitz  # PyMuPDF
+    from PIL import Image
+    zoom = OCR_DPI / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def _tesseract(image):
+    # pytesseract shells out to the tesseract binary, so each call is its own process.
+    # Imported here: it drags in pandas, which alone costs a third of a second at startup.
+    import pytesseract
+    if _tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = _tesseract_cmd
+    return pytesseract.image_to_string(image, config=OCR_CONFIG)
+
+@traced("ocr")
+def ocr_pages(pdf, page_numbers):
+    pages = {n: pdf[n] for n in page_numbers}
+    hashes = {n: page_content_hash(pdf, page) for n, page in pages.items()}
+    cached = get_cached_ocr(set(hashes.values()))
+    results = {n: cached[h] for n, h in hashes.items() if h in cached}
+    todo = [n for n in page_numbers if n not in results]
+
+    if todo:
+        print(f"🧠 Running OCR on {len(todo)} page(s)")
+        inc("ocr_pages_total", len(todo))
+        fresh = {}
+        # Render one page at a time (PyMuPDF isn't thread-safe) and keep at most
+        # OCR_WORKERS rendered pages alive while Tesseract works through them
+        with ThreadPoolExecutor(max_workers=OCR_WORKERS) as pool:
+            futures = []
+            for n in todo:
+                if len(futures) >= OCR_WORKERS:
+                    done_n, future = futures.pop(0)
+                    results[done_n] = fresh[hashes[done_n]] = future.result()
+                futures.append((n, pool.submit(_tesseract, _render(pages[n]))))
+            for n, future in futures:
+                results[n] = fresh[hashes[n]] = future.result()
+        store_ocr(fresh)
+
+    return results
+
+def pdf_text_with_ocr(source, max_ocr_pages=OCR_MAX_PAGES, budget=None):
+    # Mixed PDFs: keep the text layer where it exists, OCR only the image pages.
+    # Pages are read one at a time and we stop once the text budget is full.
+    pdf, owned = _open_pdf(source)
+    try:
+        texts = []
+        image_pages = []
+        used = 0
+        for n, page in enumerate(pdf):
+            if budget is not None and used >= budget:
+                break
+            if has_text_layer(page) or not page.get_images():
+                text = page.get_text()
+                texts.append(text)
+                used += len(text)
+            else:
+                texts.append(None)
+                if len(image_pages) < max_ocr_pages:
+                    image_pages.append(n)
+
+        ocr_text = {}
+        if image_pages:
+            try:
+                ocr_text = ocr_pages(pdf, image_pages)
+            except Exception as e:
+                print(f"❌ OCR error: {e}")
+
+        parts = []
+        for n, text in enumerate(texts):
+            if text is not None:
+                parts.append(text)
+            elif n in ocr_text:
+                parts.append(f"\n--- Page {n+1} ---\n{ocr_text[n]}")
+        text = "\n".join(parts).strip()
+        return text[:budget] if budget is not None else text
+    finally:
+        if owned:
+            pdf.close()
 
 def ocr_image_from_pdf(filepath):
+    # OCR the first pages regardless of any text layer
     try:
-        pages = convert_from_path(filepath, dpi=300)  # ✅ Higher DPI = better OCR accuracy
-        text = ""
-        print(f"🧠 Running OCR on: {filepath}")
-        for i, page in enumerate(pages[:3]):  # ✅ Limit to first 3 pages
-            page_text = pytesseract.image_to_string(page, config="--psm 3")
-            text += f"\n--- Page {i+1} ---\n{page_text}"
-        return text.strip()
+        import fitz  # PyMuPDF
+        pdf = fitz.open(filepath)
+        try:
+            results = ocr_pages(pdf, list(range(min(OCR_MAX_PAGES, pdf.page_count))))
+        finally:
+            pdf.close()
+        return "".join(f"\n--- Page {n+1} ---\n{text}" for n, text in sorted(results.items())).strip()
     except Exception as e:
         print(f"❌ OCR error: {e}")
         return ""
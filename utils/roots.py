@@ -0,0 +1,81 @@
+import os
+import json
+from collections import namedtuple
+from dotenv import load_dotenv
+
+load_dotenv()
+WATCH_ROOTS = os.getenv("WATCH_ROOTS")          # path to a JSON list of roots
+DEFAULT_ROOT = "default"
+
+# name is what the catalog stores; path is where it lives on this machine
+Root = namedtuple("Root", "name path recursive")
+
+_roots = None
+
+def _from_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    roots = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        path = entry["path"]
+        name = entry.get("name") or os.path.basename(os.path.normpath(path))
+        roots.append(Root(name, os.path.abspath(path), bool(entry.get("recursive", True))))
+    return roots
+
+def load_roots():
+    # WATCH_ROOTS lists every share to index; a lone WATCH_FOLDER still works as before
+    global _roots
+    if _roots is not None:
+        return _roots
+
+    if WATCH_ROOTS:
+        roots = _from_config(WATCH_ROOTS)
+    else:
+        folder = os.getenv("WATCH_FOLDER")
+        if not folder:
+            raise ValueError("❌ Neither WATCH_ROOTS nor WATCH_FOLDER is set in .env")
+        roots = [Root(DEFAULT_ROOT, os.path.abspath(folder), False)]
+
+    names = [r.name for r in roots]
+    if len(set(names)) != len(names):
+        raise ValueError(f"❌ Root names must be unique: {names}")
+    for root in roots:
+        if not os.path.exists(root.path):
+            raise FileNotFoundError(f"❌ Watch root '{root.name}' does not exist: {root.path}")
+        if not os.access(root.path, os.R_OK | os.W_OK):
+            raise PermissionError(f"❌ Watch root '{root.name}' is not readable or writable: {root.path}")
+
+    _roots = roots
+    return roots
+
+def get_root(name):
+    for root in load_roots():
+        if root.name == name:
+            return root
+    return None
+
+def locate(path, roots=None):
+    # → (root, relative filename with "/" separators), or (None, None) if nothing covers it
+    path = os.path.abspath(path)
+    best = None
+    for root in roots or load_roots():
+        try:
+            rel = os.path.relpath(path, root.path)
+        except ValueError:       # different drive on Windows
+            continue
+        if rel == "." or rel.startswith(".."):
+            continue
+        if not root.recursive and os.sep in rel:
+            continue
+        # Nested roots: the deepest one owns the file
+        if best is None or len(root.path) > len(best[0].path):
+            best = (root, rel.replace(os.sep, "/"))
+    return best or (None, None)
+
+def root_file(root_name, filename):
+    root = get_root(root_name)
+    if root is None:
+        return None
+    return os.path.join(root.path, *filename.split("/"))
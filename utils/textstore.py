@@ -0,0 +1,59 @@
+import os
+import zlib
+from dotenv import load_dotenv
+from utils.db import connect, get_writer
+from utils.extractors import EXTRACTOR_VERSION
+from utils.metrics import inc
+
+load_dotenv()
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", 6))
+
+def compress_text(text):
+    # Done by the caller's thread, never inside the DB writer
+    return "zlib", zlib.compress(text.encode("utf-8"), TEXT_COMPRESSION_LEVEL)
+
+def decompress_text(codec, data):
+    if codec != "zlib":
+        raise ValueError(f"Unknown text codec: {codec}")
+    return zlib.decompress(data).decode("utf-8")
+
+def _put_text(cur, file_hash, codec, blob, chars, version=EXTRACTOR_VERSION):
+    # Same content, same extractor → same text, so an existing current entry stays as is
+    cur.execute("""
+        INSERT INTO texts (hash, extractor_version, codec, chars, data) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(hash) DO UPDATE SET
+            extractor_version = excluded.extractor_version,
+            codec = excluded.codec, chars = excluded.chars, data = excluded.data,
+            created = strftime('%Y-%m-%dT%H:%M:%f', 'now')
+        WHERE texts.extractor_version != excluded.extractor_version
+    """, (file_hash, version, codec, chars, blob))
+
+def _prune_texts(cur):
+    # Text whose content no document has any more
+    cur.execute("DELETE FROM texts WHERE hash NOT IN (SELECT hash FROM documents WHERE hash IS NOT NULL)")
+    return cur.rowcount
+
+def store_text(file_hash, text):
+    # Compressed here, written by the DB writer in the background; returns its future
+    codec, blob = compress_text(text)
+    return get_writer().submit(_put_text, file_hash, codec, blob, len(text))
+
+def prune_texts():
+    return get_writer().call(_prune_texts)
+
+def get_text(file_hash, version=EXTRACTOR_VERSION, conn=None):
+    if not file_hash:
+        return None
+    own = conn is None
+    try:
+        conn = conn or connect()
+        row = conn.execute(
+            "SELECT codec, data FROM texts WHERE hash = ? AND extractor_version = ?", (file_hash, version)
+        ).fetchone()
+        if own:
+            conn.close()
+    except Exception as e:
+        print(f"❌ Text store lookup failed: {e}")
+        return None
+    inc("cache_requests_total", cache="text", result="hit" if row else "miss")
+    return decompress_text(*row) if row else None
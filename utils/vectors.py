@@ -0,0 +1,228 @@
+import os
+import re
+import zlib
+import threading
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+from utils.db import DB_PATH, after_commit, connect, get_writer
+from utils.metrics import inc
+
+load_dotenv()
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", 512))
+VECTOR_BLOCK_ROWS = int(os.getenv("VECTOR_BLOCK_ROWS", 16384))    # rows multiplied per step when scanning
+VECTOR_GROW_ROWS = 4096
+# Row N of the matrix is document id N; the dimension is in the name so changing it starts a fresh file
+VECTOR_PATH = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), f"vectors-{VECTOR_DIM}.f32")
+
+_WORD = re.compile(r"\w{2,}")
+_ROW_BYTES = VECTOR_DIM * 4
+
+
+def term_counts(text):
+    # Hashed bag of words: crc32 picks the bucket, one more bit picks the sign so collisions cancel out
+    counts = Counter()
+    for word in _WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        counts[h % VECTOR_DIM] += 1 if h & 0x80000000 else -1
+    return {bucket: tf for bucket, tf in counts.items() if tf}
+
+def _weigh(counts, df, docs):
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    if not counts:
+        return vec
+    buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+    idf = np.log((1 + docs) / (1 + df[buckets])) + 1
+    vec[buckets] = np.sign(tf) * (1 + np.log(np.abs(tf))) * idf
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+# ---------------------------------------------------------------------------
+# Writer ops — the stats and each row's term counts live in SQL and roll back
+# with the caller's transaction; the matrix file is only written after commit
+# ---------------------------------------------------------------------------
+
+def _stats(cur):
+    row = cur.execute("SELECT docs, df, seq FROM vector_stats WHERE dim = ?", (VECTOR_DIM,)).fetchone()
+    if row is None:
+        seq = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        return 0, np.zeros(VECTOR_DIM, dtype=np.int64), seq
+    return row[0], np.frombuffer(row[1], dtype=np.int64).copy(), row[2]
+
+def _save_stats(cur, docs, df, seq):
+    cur.execute("""
+        INSERT INTO vector_stats (dim, docs, df, seq) VALUES (?, ?, ?, ?)
+        ON CONFLICT(dim) DO UPDATE SET docs = excluded.docs, df = excluded.df, seq = excluded.seq
+    """, (VECTOR_DIM, docs, df.tobytes(), seq))
+
+def _forget(cur, doc_id, df):
+    # Takes a row's terms back out of the document frequencies
+    row = cur.execute("SELECT counts FROM vector_terms WHERE doc_id = ?", (doc_id,)).fetchone()
+    if row is None:
+        return False
+    buckets = np.frombuffer(row[0], dtype=np.int32).reshape(-1, 2)[:, 0]
+    df[buckets] -= 1
+    cur.execute("DELETE FROM vector_terms WHERE doc_id = ?", (doc_id,))
+    return True
+
+def _apply_deletes(cur, docs, df, seq, rows):
+    # Deletes come from the watcher, the sync or by hand; the change feed sees them all
+    first = cur.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+    if first is not None and first > seq + 1:
+        # Feed was pruned past us — sweep for rows whose document is gone
+        gone = [row[0] for row in cur.execute(
+            "SELECT doc_id FROM vector_terms WHERE doc_id NOT IN (SELECT id FROM documents)"
+        )]
+    else:
+        gone = [row[0] for row in cur.execute(
+            "SELECT DISTINCT doc_id FROM changes WHERE seq > ? AND op = 'delete'", (seq,)
+        )]
+    for doc_id in gone:
+        if not cur.execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone() and _forget(cur, doc_id, df):
+            docs -= 1
+            rows[doc_id] = None
+    return docs, cur.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+def _open_matrix():
+    return open(VECTOR_PATH, "r+b" if os.path.exists(VECTOR_PATH) else "w+b")
+
+def _write_rows(rows):
+    # After commit: {doc_id: vector, or None to clear the row}
+    with _open_matrix() as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        for doc_id, vec in sorted(rows.items()):
+            if vec is None:
+                if (doc_id + 1) * _ROW_BYTES > size:
+                    continue
+                data = bytes(_ROW_BYTES)
+            else:
+                if (doc_id + 1) * _ROW_BYTES > size:
+                    size = (doc_id + VECTOR_GROW_ROWS) * _ROW_BYTES
+                    f.truncate(size)     # grow in steps, zero-filled
+                data = vec.tobytes()
+            f.seek(doc_id * _ROW_BYTES)
+            f.write(data)
+
+def put_vector(cur, doc_id, counts):
+    # Writer op, usually inside another op such as saving the document; if that rolls back,
+    # so do the stats, and the matrix row is never written
+    docs, df, seq = _stats(cur)
+    rows = {}
+    docs, seq = _apply_deletes(cur, docs, df, seq, rows)
+    if _forget(cur, doc_id, df):
+        docs -= 1
+        rows[doc_id] = None
+    if counts:
+        # IDF as of now; older rows keep the weights they were written with
+        docs += 1
+        df[list(counts)] += 1
+        cur.execute(
+            "INSERT INTO vector_terms (doc_id, counts) VALUES (?, ?)",
+            (doc_id, np.array(list(counts.items()), dtype=np.int32).tobytes())
+        )
+        rows[doc_id] = _weigh(counts, df, docs)
+    _save_stats(cur, docs, df, seq)
+    if rows:
+        after_commit(_write_rows, rows)
+
+def _sync_vectors(cur):
+    docs, df, seq = _stats(cur)
+    rows = {}
+    docs, seq = _apply_deletes(cur, docs, df, seq, rows)
+    _save_stats(cur, docs, df, seq)
+    if rows:
+        after_commit(_write_rows, rows)
+
+def store_vector(doc_id, counts):
+    return get_writer().submit(put_vector, doc_id, counts)
+
+def sync_vectors():
+    # Clears rows for documents deleted since the last vector write
+    get_writer().call(_sync_vectors)
+
+
+# ---------------------------------------------------------------------------
+# Queries — the matrix is memory-mapped and scanned in blocks, so only the
+# OS page cache holds it, never this process's heap
+# ---------------------------------------------------------------------------
+
+_matrix = None
+_matrix_size = -1
+_matrix_lock = threading.Lock()
+
+def _load_matrix():
+    global _matrix, _matrix_size
+    with _matrix_lock:
+        try:
+            size = os.path.getsize(VECTOR_PATH)
+        except OSError:
+            return None
+        if size != _matrix_size:
+            # Writers only ever grow the file, so remap when its size changes
+            rows = size // _ROW_BYTES
+            _matrix = np.memmap(VECTOR_PATH, dtype=np.float32, mode="r", shape=(rows, VECTOR_DIM)) if rows else None
+            _matrix_size = size
+        return _matrix
+
+def top_k(queries, k=10, exclude=None):
+    # queries: (m, dim) float32 → per query a list of (row, score), best first
+    matrix = _load_matrix()
+    queries = np.asarray(queries, dtype=np.float32).reshape(-1, VECTOR_DIM)
+    if matrix is None or not len(queries):
+        return [[] for _ in queries]
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, matrix.shape[0], VECTOR_BLOCK_ROWS):
+        scores = queries @ matrix[start:start + VECTOR_BLOCK_ROWS].T      # (m, block)
+        if exclude is not None:
+            for q, row in enumerate(exclude):
+                if start <= row < start + scores.shape[1]:
+                    scores[q, row - start] = -np.inf
+        keep = min(k, scores.shape[1])
+        part = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_rows = np.concatenate([best_rows, part + start], axis=1)
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+        # Carry only the running top k into the next block
+        if best_rows.shape[1] > k:
+            top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(best_rows, top, axis=1)
+            best_scores = np.take_along_axis(best_scores, top, axis=1)
+
+    results = []
+    for rows, scores in zip(best_rows, best_scores):
+        order = np.argsort(-scores)
+        results.append([(int(rows[i]), float(scores[i])) for i in order if scores[i] > 0])
+    return results
+
+def vector_for(doc_id):
+    matrix = _load_matrix()
+    if matrix is None or doc_id >= matrix.shape[0]:
+        return None
+    row = np.array(matrix[doc_id])
+    return row if row.any() else None
+
+def related(doc_ids, k=10):
+    # → {doc_id: [(related id, score), ...]}; one matrix pass answers every id
+    wanted = [(doc_id, vector_for(doc_id)) for doc_id in doc_ids]
+    wanted = [(doc_id, vec) for doc_id, vec in wanted if vec is not None]
+    if not wanted:
+        return {doc_id: [] for doc_id in doc_ids}
+
+    # Over-fetch, since rows deleted or archived since the last write are dropped below
+    hits = top_k(np.stack([vec for _, vec in wanted]), k * 2 + 5, exclude=[doc_id for doc_id, _ in wanted])
+    candidates = {row for found in hits for row, _ in found}
+    conn = connect()
+    marks = ",".join("?" * len(candidates))
+    live = {row[0] for row in conn.execute(
+        f"SELECT id FROM documents WHERE archived = 0 AND id IN ({marks})", list(candidates)
+    )} if candidates else set()
+    conn.close()
+    inc("related_queries_total", len(wanted))
+
+    out = {doc_id: [] for doc_id in doc_ids}
+    for (doc_id, _), found in zip(wanted, hits):
+        out[doc_id] = [(row, score) for row, score in found if row in live][:k]
+    return out
@@ -1,44 +1,314 @@
 import os
 import time
+import signal
+import threading
+import multiprocessing
+from collections import OrderedDict
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from dotenv import load_dotenv
-from handler import process_file
 from sync import run_startup_sync
-from handler import process_file, remove_from_db
+from handler import remove_from_db, remove_folder_from_db, rename_in_db
+from utils.formats import is_supported
+from pipeline import IngestPipeline, CPU_WORKERS
+from utils.file_ops import is_own_rename
+from utils.roots import load_roots, locate
+from utils.db import migrate
+from utils.metrics import inc, set_gauge
+from utils.jobs import JobRunner, enqueue
+from utils.gpt_client import share_rate_limits
 
 load_dotenv()
-WATCH_FOLDER = os.getenv("WATCH_FOLDER")
+WATCHER_PROCESSES = int(os.getenv("WATCHER_PROCESSES", 0))   # 0 = one per root, up to the core count
+WATCHER_INGEST = os.getenv("WATCHER_INGEST", "1") != "0"      # 0 = only queue jobs, leave them to worker.py
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 20000))
+STABLE_SECONDS = float(os.getenv("STABLE_SECONDS", 2.0))
+EVENT_POLL_SECONDS = 0.5
+METRICS_EVERY_SECONDS = 30
+RESTART_DELAY_SECONDS = 5
+SHUTDOWN_GRACE_SECONDS = 30
+
+def _is_document(path):
+    return is_supported(path)
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return (st.st_size, st.st_mtime_ns)
+    except OSError:
+        return None
+
+
+class EventQueue:
+    # Sits between watchdog and the pipeline: bursts of events for one path collapse
+    # into a single entry, which is released only once size and mtime stop changing.
+
+    def __init__(self, dispatch, maxsize=EVENT_QUEUE_SIZE, settle=STABLE_SECONDS, on_overflow=None):
+        self.dispatch = dispatch
+        self.maxsize = maxsize
+        self.settle = settle
+        self.on_overflow = on_overflow
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.overflowed = False
+        self.stats = {"received": 0, "coalesced": 0, "dropped": 0, "dispatched": 0, "vanished": 0}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="event-queue", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _count(self, key):
+        self.stats[key] += 1
+        inc("watcher_events_total", kind=key)
+
+    def put(self, path):
+        now = time.monotonic()
+        with self.lock:
+            self._count("received")
+            entry = self.pending.get(path)
+            if entry is not None:
+                self._count("coalesced")
+                entry["last_event"] = now
+                return True
+            if len(self.pending) >= self.maxsize:
+                # Don't grow without bound; a rescan picks these up once we've drained
+                self._count("dropped")
+                self.overflowed = True
+                return False
+            self.pending[path] = {"last_event": now, "stat": _stat(path), "stable_since": now}
+            return True
+
+    def discard(self, path):
+        with self.lock:
+            self.pending.pop(path, None)
+
+    def depth(self):
+        return len(self.pending)
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats, depth=len(self.pending))
+
+    def _ready(self):
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for path, entry in list(self.pending.items()):
+                if now - entry["last_event"] < self.settle:
+                    continue
+                current = _stat(path)
+                if current is None:
+                    self._count("vanished")
+                    del self.pending[path]
+                    continue
+                if current != entry["stat"]:
+                    # Still being written — start the stability clock over
+                    entry["stat"] = current
+                    entry["stable_since"] = now
+                    continue
+                if now - entry["stable_since"] >= self.settle:
+                    ready.append(path)
+                    del self.pending[path]
+        return ready
+
+    def _run(self):
+        while not self.stopped.is_set():
+            time.sleep(EVENT_POLL_SECONDS)
+            for path in self._ready():
+                self._count("dispatched")
+                self.dispatch(path)
+
+            if self.overflowed and not self.pending and self.on_overflow:
+                self.overflowed = False
+                print("🔁 Event queue overflowed earlier, rescanning folder...")
+                self.on_overflow()
+
 
 class NewFileHandler(FileSystemEventHandler):
+    def __init__(self, events, roots):
+        super().__init__()
+        self.events = events
+        self.roots = roots
+
+    def _locate(self, path):
+        # Only files under one of this worker's roots (and not in a subfolder of a flat root)
+        root, filename = locate(path, self.roots)
+        if root is None or not _is_document(path):
+            return None, None
+        return root, filename
+
     def on_created(self, event):
-        if not event.is_directory and event.src_path.lower().endswith((
-            ".txt", ".pdf", ".docx", ".pptx", ".md", ".log", ".json", ".xml", ".rtf", ".html", ".eml")):
-            print(f"🆕 New file detected: {event.src_path}")
-            process_file(event.src_path, source="watcher")
+        if event.is_directory or self._locate(event.src_path)[0] is None:
+            return
+        if is_own_rename(event.src_path):
+            return
+        print(f"🆕 New file detected: {event.src_path}")
+        self.events.put(event.src_path)
+
+    def on_modified(self, event):
+        if event.is_directory or self._locate(event.src_path)[0] is None:
+            return
+        if is_own_rename(event.src_path):
+            return
+        self.events.put(event.src_path)
+
+    def on_moved(self, event):
+        src, dest = event.src_path, event.dest_path
+        if event.is_directory:
+            # Moves inside a root arrive as per-file events too; a folder leaving needs a sweep
+            src_root, folder = locate(src, self.roots)
+            if src_root is not None and locate(dest, self.roots)[0] is None:
+                remove_folder_from_db(folder, src_root.name)
+            return
+
+        self.events.discard(src)
+
+        # Our own rename_file: the pipeline already saved the row under the new name
+        if is_own_rename(src) or is_own_rename(dest):
+            return
+
+        src_root, src_name = self._locate(src)
+        dest_root, dest_name = self._locate(dest)
+        if dest_root is None:
+            if src_root is not None:
+                print(f"🗑 File moved out: {src_root.name}/{src_name}")
+                remove_from_db(src_name, src_root.name)
+            return
+
+        print(f"🔀 File moved: {src} → {dest}")
+        if src_root is not None and src_root != dest_root:
+            remove_from_db(src_name, src_root.name)
+            src_root = None
+        if src_root is None or not rename_in_db(src_name, dest_name, dest_root.name):
+            self.events.put(dest)
 
     def on_deleted(self, event):
-        if not event.is_directory and event.src_path.lower().endswith((
-            ".txt", ".pdf", ".docx", ".pptx", ".md", ".log", ".json", ".xml", ".rtf", ".html", ".eml")):
-            filename = os.path.basename(event.src_path)
-            print(f"🗑 File deleted: {filename}")
-            remove_from_db(filename)
-            
-if __name__ == "__main__":
-    if not os.path.exists(WATCH_FOLDER):
-        print(f"⚠️ I am unable to find the Watch folder!: {WATCH_FOLDER}")
-        exit(1)
+        if event.is_directory:
+            root, folder = locate(event.src_path, self.roots)
+            if root is not None:
+                remove_folder_from_db(folder, root.name)
+            return
+
+        root, filename = self._locate(event.src_path)
+        if root is None:
+            return
+        self.events.discard(event.src_path)
+        if is_own_rename(event.src_path):
+            return
+        print(f"🗑 File deleted: {root.name}/{filename}")
+        remove_from_db(filename, root.name)
+
 
-    run_startup_sync()  # 🟢 sync the folder and DB before watching
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_worker(roots, cpu_workers=CPU_WORKERS, siblings=1):
+    # One worker = one observer for its share of the roots, plus (by default) a
+    # pipeline working the shared job queue. Events only ever become durable jobs.
+    signal.signal(signal.SIGTERM, _interrupt)
+    share_rate_limits(siblings)
+    names = ", ".join(r.name for r in roots)
+
+    pipeline = runner = None
+    if WATCHER_INGEST:
+        pipeline = IngestPipeline(cpu_workers=cpu_workers)
+        runner = JobRunner(pipeline)
+        pipeline.start()
+        runner.start()
+
+    # 🟢 Queue whatever changed while we were down; jobs left over from a crash are still there
+    run_startup_sync(roots, submit=lambda path: enqueue(path, "sync"))
+
+    submit = lambda path: enqueue(path, "watcher")
+    events = EventQueue(submit, on_overflow=lambda: run_startup_sync(roots, submit=submit))
+    events.start()
 
     observer = Observer()
-    observer.schedule(NewFileHandler(), WATCH_FOLDER, recursive=False)
+    handler = NewFileHandler(events, roots)
+    for root in roots:
+        observer.schedule(handler, root.path, recursive=root.recursive)
+        print(f"👀 Watching {root.name}: {root.path}" + (" (recursive)" if root.recursive else ""))
     observer.start()
-    print(f"👀 Watching for new files in: {WATCH_FOLDER}")
 
     try:
+        last_report = time.monotonic()
         while True:
             time.sleep(1)
+            depths = pipeline.depths() if pipeline else {}
+            set_gauge("queue_depth", events.depth(), queue="events", worker=names)
+            for stage, depth in depths.items():
+                set_gauge("queue_depth", depth, queue=stage, worker=names)
+            if time.monotonic() - last_report >= METRICS_EVERY_SECONDS:
+                last_report = time.monotonic()
+                if events.depth() or any(depths.values()):
+                    print(f"📊 [{names}] Queue depth: events={events.depth()}, "
+                          + ", ".join(f"{k}={v}" for k, v in depths.items()))
     except KeyboardInterrupt:
+        # Ctrl+C and the supervisor's SIGTERM can both land; drain once, undisturbed
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
         observer.stop()
     observer.join()
+    events.stop()
+    if runner:
+        runner.stop()
+        pipeline.stop()
+
+def shard_roots(roots, shards):
+    # Round-robin keeps the shards within one root of each other
+    return [roots[i::shards] for i in range(shards) if roots[i::shards]]
+
+def supervise(roots, processes=WATCHER_PROCESSES):
+    shards = shard_roots(roots, processes or min(len(roots), os.cpu_count() or 1))
+    # Split the cores between workers so N observers don't each spawn a full pool
+    cpu_each = max(1, CPU_WORKERS // len(shards))
+
+    if len(shards) == 1:
+        run_worker(shards[0], cpu_each)
+        return
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    def spawn(i):
+        proc = multiprocessing.Process(
+            target=run_worker, args=(shards[i], cpu_each, len(shards)), name=f"watcher-{i}"
+        )
+        proc.start()
+        print(f"🧩 Started {proc.name} (pid {proc.pid}): " + ", ".join(r.name for r in shards[i]))
+        return proc
+
+    workers = [spawn(i) for i in range(len(shards))]
+    try:
+        while True:
+            time.sleep(RESTART_DELAY_SECONDS)
+            for i, proc in enumerate(workers):
+                if not proc.is_alive():
+                    # 🔁 A crashed worker only takes its own roots down; bring it back
+                    print(f"⚠️ {proc.name} exited with code {proc.exitcode}, restarting")
+                    workers[i] = spawn(i)
+    except KeyboardInterrupt:
+        # SIGTERM asks each worker to drain its pipeline; only force it if that hangs
+        print("🛑 Stopping watcher workers...")
+        for proc in workers:
+            proc.terminate()
+        deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+        for proc in workers:
+            proc.join(max(0, deadline - time.monotonic()))
+        for proc in workers:
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+
+if __name__ == "__main__":
+    try:
+        roots = load_roots()
+    except (ValueError, OSError) as e:
+        print(f"⚠️ I am unable to find the Watch folder!: {e}")
+        exit(1)
+
+    migrate()
+    supervise(roots)
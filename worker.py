@@ -0,0 +1,71 @@
+import time
+import signal
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from pipeline import IngestPipeline
+from utils.db import migrate
+from utils.jobs import JobRunner, job_counts, dead_jobs, retry_dead, prune_done
+
+load_dotenv()
+STATUS_EVERY_SECONDS = 30
+PRUNE_EVERY_SECONDS = 3600
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run():
+    # Any number of these can run, on this machine or others sharing the DB;
+    # each claims jobs atomically, so adding workers adds capacity. Set GPT_PROCESSES
+    # to how many of them (plus ingesting watchers) share the API key's limits.
+    signal.signal(signal.SIGTERM, _interrupt)
+    pipeline = IngestPipeline()
+    runner = JobRunner(pipeline)
+    pipeline.start()
+    runner.start()
+
+    try:
+        last_status = last_prune = time.monotonic()
+        while True:
+            time.sleep(1)
+            if time.monotonic() - last_status >= STATUS_EVERY_SECONDS:
+                last_status = time.monotonic()
+                print(f"📬 Jobs: {job_counts()} | in flight here: {len(runner.inflight)}")
+            if time.monotonic() - last_prune >= PRUNE_EVERY_SECONDS:
+                last_prune = time.monotonic()
+                pruned = prune_done()
+                if pruned:
+                    print(f"🧹 Pruned {pruned} finished jobs")
+    except KeyboardInterrupt:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        print("🛑 Stopping worker, finishing jobs in flight...")
+    runner.stop()
+    pipeline.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Work the ingestion job queue")
+    parser.add_argument("--status", action="store_true", help="Show job counts by state")
+    parser.add_argument("--dead", action="store_true", help="List dead-lettered jobs")
+    parser.add_argument("--retry-dead", nargs="*", type=int, metavar="ID",
+                        help="Send dead jobs back to the queue (all of them if no IDs)")
+    parser.add_argument("--prune", action="store_true", help="Delete finished jobs past retention")
+    args = parser.parse_args()
+    migrate()
+
+    if args.status:
+        for state, count in sorted(job_counts().items()):
+            print(f"{state:>8}: {count}")
+    elif args.dead:
+        for job_id, path, attempts, outcome, error, updated in dead_jobs():
+            when = datetime.fromtimestamp(updated).isoformat(timespec="seconds")
+            print(f"☠️ #{job_id} {path} — {attempts} attempts, {outcome}: {error} ({when})")
+    elif args.retry_dead is not None:
+        print(f"🔁 Requeued {retry_dead(args.retry_dead)} dead jobs")
+    elif args.prune:
+        print(f"🧹 Pruned {prune_done()} finished jobs")
+    else:
+        run()
+
+if __name__ == "__main__":
+    main()